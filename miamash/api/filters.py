@@ -0,0 +1,52 @@
+from rest_framework.filters import BaseFilterBackend
+
+from core.request_filters import filter_requests
+from core.search import search_requests
+
+from .serializers import RequestListFilterSerializer
+
+
+class RequestSearchFilter(BaseFilterBackend):
+    """
+    ?q= full-text search over request reasoning, sender / receiver username and request identity variant labels and contexts.
+    Matching requests get search_rank, RequestCursorPagination orders them best match first.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return search_requests(queryset, query)
+
+    def get_schema_operation_parameters(self, view):
+        # same format as rest_framework.filters.SearchFilter
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Words the request has to contain, every word also matches as a prefix.',
+            'schema': {'type': 'string'},
+        }]
+
+
+class RequestListFilter(BaseFilterBackend):
+    """
+    Server side filters of sent and received request lists: status, created_after / created_before,
+    sender / receiver username and has_unlinked_variants. Invalid values are answered with 400.
+    """
+    def filter_queryset(self, request, queryset, view):
+        filter_serializer = RequestListFilterSerializer(data=request.query_params)
+        filter_serializer.is_valid(raise_exception=True)
+        return filter_requests(queryset, **filter_serializer.validated_data)
+
+    def get_schema_operation_parameters(self, view):
+        # parameters from the serializer fields, in the format of rest_framework.filters.SearchFilter
+        types = {'DateTimeField': {'type': 'string', 'format': 'date-time'}, 'BooleanField': {'type': 'boolean'}}
+        parameters = []
+        for name, field in RequestListFilterSerializer().fields.items():
+            schema = types.get(type(field).__name__, {'type': 'string'})
+            if hasattr(field, 'choices'):
+                schema = {'type': 'string', 'enum': list(field.choices)}
+            parameters.append({'name': name, 'required': False, 'in': 'query', 'description': str(field.help_text), 'schema': schema})
+        return parameters
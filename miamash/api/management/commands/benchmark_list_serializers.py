@@ -0,0 +1,57 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.serializers import RequestReceiveListSerializer, RequestSendListCreateSerializer
+from core.models import Request
+
+
+class Command(BaseCommand):
+    """
+    Compares model instance and values() read paths of sent and received request list serializers, query included.
+    Benchmark rows are created in a transaction that is rolled back, so the database is left as it was.
+    """
+    help = 'Benchmark model instance and values() read paths of request list serializers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of requests in the list.')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of times each list is read and serialized.')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            sender = User.objects.create(username='benchmark-list-sender')
+            receiver = User.objects.create(username='benchmark-list-receiver')
+            Request.objects.bulk_create([
+                Request(sender=sender, receiver=receiver, request_reasoning=f'Dental office data request number {index}, please share your first name, last name and address.')
+                for index in range(options['rows'])
+            ])
+            lists = [
+                ('received', RequestReceiveListSerializer, Request.objects.filter(receiver=receiver).select_related('sender')),
+                ('sent', RequestSendListCreateSerializer, Request.objects.filter(sender=sender).select_related('receiver')),
+            ]
+            self.stdout.write(f"{'list':<10}{'rows':>8}{'instances ms':>14}{'values ms':>12}{'speedup':>10}")
+            for name, serializer_class, queryset in lists:
+                queryset = queryset.order_by('-created_at', '-id')
+                instances_data = serializer_class(list(queryset), many=True).data
+                values_data = serializer_class(list(queryset.values(*serializer_class().get_value_lookups())), many=True).data
+                if instances_data != values_data:
+                    raise CommandError(f'{name} list: values() output differs from model instance output')
+
+                # all() so every round queries the database instead of reusing the result cache
+                instances_seconds = self.measure(lambda: serializer_class(list(queryset.all()), many=True).data, options['repeat'])
+                values_seconds = self.measure(lambda: serializer_class(list(queryset.values(*serializer_class().get_value_lookups())), many=True).data, options['repeat'])
+                self.stdout.write(f"{name:<10}{options['rows']:>8}{instances_seconds * 1000:>14.1f}{values_seconds * 1000:>12.1f}{instances_seconds / values_seconds:>9.1f}x")
+            # benchmark rows are never committed
+            transaction.set_rollback(True)
+
+    def measure(self, function, repeat):
+        # seconds per call, best of three rounds so other processes disturb it less
+        rounds = []
+        for _ in range(3):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                function()
+            rounds.append((time.perf_counter() - started) / repeat)
+        return min(rounds)
@@ -0,0 +1,51 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.profile_variant_suggestions import ProfileVariantIndex
+
+
+# words labels of generated variants and requested labels are made of
+LABEL_WORDS = [
+    'first', 'last', 'middle', 'given', 'family', 'maiden', 'name', 'nickname', 'email', 'e-mail', 'address', 'phone', 'mobile',
+    'home', 'work', 'street', 'city', 'postal', 'code', 'country', 'birth', 'date', 'place', 'passport', 'number', 'tax', 'id',
+    'bank', 'account', 'iban', 'handle', 'username', 'twitter', 'github', 'linkedin', 'website', 'company', 'title', 'alias',
+]
+
+
+class Command(BaseCommand):
+    """
+    Measures profile identity variant suggestions for a user with many variants, index is built in memory without the database.
+    """
+    help = 'Benchmark profile identity variant suggestions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--variants', type=int, default=5000, help='Number of profile identity variants of the user.')
+        parser.add_argument('--labels', type=int, default=200, help='Number of distinct labels variants share, equal to --variants for every label different.')
+        parser.add_argument('--lookups', type=int, default=1000, help='Number of requested labels suggestions are made for.')
+
+    def handle(self, *args, **options):
+        # same labels every run, so runs can be compared
+        generator = random.Random(0)
+        label = lambda: ' '.join(generator.sample(LABEL_WORDS, generator.randint(1, 3))).capitalize()
+        # users have many variants under few labels, for example a lot of emails and aliases
+        labels = [label() for _ in range(options['labels'])]
+        variants = [
+            {'id': variant_id, 'label': generator.choice(labels), 'context': ' '.join(generator.sample(LABEL_WORDS, 2)), 'variant': f'value {variant_id}'}
+            for variant_id in range(1, options['variants'] + 1)
+        ]
+        lookups = [(label(), ' '.join(generator.sample(LABEL_WORDS, 2))) for _ in range(options['lookups'])]
+
+        started = time.perf_counter()
+        index = ProfileVariantIndex(variants)
+        build_ms = (time.perf_counter() - started) * 1000
+        durations = []
+        for requested_label, requested_context in lookups:
+            started = time.perf_counter()
+            index.suggest(requested_label, requested_context)
+            durations.append((time.perf_counter() - started) * 1000)
+
+        self.stdout.write(f"variants: {options['variants']}, labels: {options['labels']}, index built in {build_ms:.1f} ms")
+        self.stdout.write(f"suggest ms  mean {statistics.mean(durations):.3f}  p50 {statistics.median(durations):.3f}  p99 {statistics.quantiles(durations, n=100)[-1]:.3f}  max {max(durations):.3f}")
@@ -0,0 +1,74 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+class Command(BaseCommand):
+    """
+    Compares requests per second of sync and async read-only API views on a running server.
+    Start the server first, for example: uvicorn miamash.asgi:application --workers 1
+    """
+    help = 'Benchmark sync and async read-only API views against a running ASGI server.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User the requests are made as, should have received requests and profile identity variants.')
+        parser.add_argument('--base-url', default='http://localhost:8000', help='URL of the running server.')
+        parser.add_argument('--requests', type=int, default=1000, help='Number of requests per endpoint.')
+        parser.add_argument('--concurrency', type=int, default=50, help='Number of requests in flight at the same time.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Username: '{options['username']}' does not exist")
+        request_id = user.requests_received.order_by('-id').values_list('id', flat=True).first() # type: ignore
+        if request_id is None:
+            raise CommandError(f"Username: '{options['username']}' has no received requests")
+
+        # (name, sync url, async url), both return the same data
+        endpoints = [
+            ('profile identity variant list', reverse('api-profile-identity-variant-list-create'), reverse('api-async-profile-identity-variant-list')),
+            ('received request list', reverse('api-request-receive-list'), reverse('api-async-request-receive-list')),
+            ('received request detail', reverse('api-request-receive-detail', args=[request_id]), reverse('api-async-request-receive-detail', args=[request_id])),
+            ('request identity variant list', reverse('api-request-receive-request-identity-variant-list', args=[request_id]), reverse('api-async-request-receive-request-identity-variant-list', args=[request_id])),
+        ]
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}', 'Accept': 'application/json'}
+        results = asyncio.run(self.run_benchmark(options['base_url'], headers, endpoints, options['requests'], options['concurrency']))
+
+        self.stdout.write(f"{'endpoint':<32}{'path':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, path, requests_per_second, latencies in results:
+            p50 = statistics.median(latencies) * 1000
+            p95 = statistics.quantiles(latencies, n=20)[-1] * 1000
+            self.stdout.write(f"{name:<32}{path:<8}{requests_per_second:>10.1f}{p50:>10.1f}{p95:>10.1f}")
+
+    async def run_benchmark(self, base_url, headers, endpoints, request_count, concurrency):
+        results = []
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=60) as client:
+            for name, sync_url, async_url in endpoints:
+                for path, url in [('sync', sync_url), ('async', async_url)]:
+                    # warm up connections and caches, not measured
+                    await self.load(client, url, concurrency, concurrency)
+                    started = time.perf_counter()
+                    latencies = await self.load(client, url, request_count, concurrency)
+                    results.append((name, path, request_count / (time.perf_counter() - started), latencies))
+        return results
+
+    async def load(self, client, url, request_count, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed_get():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(f"GET {url} returned {response.status_code}")
+                return time.perf_counter() - started
+
+        return await asyncio.gather(*[timed_get() for _ in range(request_count)])
@@ -0,0 +1,76 @@
+import io
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.parsers import MessagePackParser, ORJSONParser
+from api.renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+from api.serializers import RequestReceiveListSerializer
+from core.models import Request
+
+
+class Command(BaseCommand):
+    """
+    Compares throughput of DRF JSON, orjson and MessagePack renderers and parsers on a received requests page.
+    Rows are built in memory, so no database or server is needed.
+    """
+    help = 'Benchmark JSON, orjson and MessagePack renderers and parsers on RequestReceiveListSerializer payloads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Number of requests in the payload.')
+        parser.add_argument('--repeat', type=int, default=200, help='Number of times each payload is rendered and parsed.')
+
+    def handle(self, *args, **options):
+        data = self.build_payload(options['rows'])
+        renderers = [('json', JSONRenderer(), JSONParser())]
+        if orjson is not None:
+            renderers.append(('orjson', ORJSONRenderer(), ORJSONParser()))
+        if msgpack is not None:
+            renderers.append(('msgpack', MessagePackRenderer(), MessagePackParser()))
+
+        json_bytes = JSONRenderer().render(data)
+        if orjson is not None and ORJSONRenderer().render(data) != json_bytes:
+            raise CommandError('orjson output differs from DRF JSONRenderer output')
+
+        self.stdout.write(f"{'renderer':<10}{'size KB':>10}{'render/s':>12}{'render MB/s':>14}{'parse/s':>12}{'parse MB/s':>14}")
+        for name, renderer, parser in renderers:
+            rendered = renderer.render(data)
+            render_seconds = self.measure(lambda: renderer.render(data), options['repeat'])
+            parse_seconds = self.measure(lambda: parser.parse(io.BytesIO(rendered), parser.media_type, {}), options['repeat'])
+            megabytes = len(rendered) / 1024 / 1024
+            self.stdout.write(
+                f"{name:<10}{len(rendered) / 1024:>10.1f}{1 / render_seconds:>12.1f}{megabytes / render_seconds:>14.1f}"
+                f"{1 / parse_seconds:>12.1f}{megabytes / parse_seconds:>14.1f}"
+            )
+
+    def build_payload(self, rows):
+        """
+        Page of received requests as the list view returns it, with unsaved Request and User instances.
+        """
+        now = timezone.now()
+        senders = [User(id=index, username=f'sender{index}') for index in range(1, 51)]
+        statuses = list(Request.Status.values)
+        requests = [
+            Request(
+                id=index, sender=senders[index % len(senders)], status=statuses[index % len(statuses)],
+                request_reasoning=f'Dental office data request number {index}, please share your first name, last name and address. Żółć 🦷',
+                created_at=now - timedelta(minutes=index, microseconds=index),
+            )
+            for index in range(1, rows + 1)
+        ]
+        return {'next': 'http://localhost:8000/api/request/receive/?cursor=cD0yMDI1', 'previous': None, 'results': RequestReceiveListSerializer(requests, many=True).data}
+
+    def measure(self, function, repeat):
+        # seconds per call, best of three rounds so other processes disturb it less
+        rounds = []
+        for _ in range(3):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                function()
+            rounds.append((time.perf_counter() - started) / repeat)
+        return min(rounds)
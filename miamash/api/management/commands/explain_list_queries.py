@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.http import QueryDict
+
+from api import views as api_views
+from web import views as web_views
+
+
+class Command(BaseCommand):
+    """
+    Prints the EXPLAIN plan of every list view queryset for a given user, so it can be checked
+    that the sender / receiver / status indexes from core models are used by the database.
+    """
+    help = 'Print EXPLAIN plan for the queryset of each API and web list view, as seen by given user.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='Username of the user the list querysets are built for.')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE, only supported on PostgreSQL.')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"Username: '{options['username']}' does not exist")
+
+        # nested variant lists need parent Request pk, use users latest request or a pk that does not exist
+        sent_request_id = user.requests_sent.order_by('-id').values_list('id', flat=True).first() or 0 # type: ignore
+        received_request_id = user.requests_received.order_by('-id').values_list('id', flat=True).first() or 0 # type: ignore
+
+        list_views = [
+            (api_views.ProfileIdentityVariantListCreateAPIView, {}),
+            (api_views.RequestSendListCreateAPIView, {}),
+            (api_views.RequestSendRequestIdentityVariantListCreateAPIView, {'pk': sent_request_id}),
+            (api_views.RequestReceiveListAPIView, {}),
+            (api_views.RequestReceiveRequestIdentityVariantListAPIView, {'pk': received_request_id}),
+            (web_views.ProfileIdentityVariantListView, {}),
+            (web_views.RequestSendListView, {}),
+            (web_views.RequestReceiveListView, {}),
+        ]
+
+        explain_options = {'analyze': True} if options['analyze'] else {}
+        for view_class, kwargs in list_views:
+            queryset = self.get_list_queryset(view_class, user, kwargs)
+            self.stdout.write(self.style.MIGRATE_HEADING(view_class.__name__))
+            self.stdout.write(str(queryset.query))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
+
+    def get_list_queryset(self, view_class, user, kwargs):
+        """
+        Build the queryset the same way the view does, only get_queryset needs request.user and URL kwargs.
+        """
+        view = view_class()
+        # filters and ?fields= are read from the query string, none are applied
+        view.request = SimpleNamespace(user=user, method='GET', GET=QueryDict(), query_params=QueryDict())
+        view.args = ()
+        view.kwargs = kwargs
+        queryset = view.get_queryset()
+
+        # API list views are paginated, so apply the same ordering and page slice as the cursor paginator
+        pagination_class = getattr(view, 'pagination_class', None)
+        if pagination_class is not None:
+            paginator = pagination_class()
+            ordering = paginator.ordering
+            if isinstance(ordering, str):
+                ordering = (ordering,)
+            queryset = queryset.order_by(*ordering)[:paginator.page_size + 1]
+        return queryset
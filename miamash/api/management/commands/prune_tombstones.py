@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import Tombstone
+
+
+class Command(BaseCommand):
+    """
+    Deletes tombstones older than SYNC_TOMBSTONE_RETENTION, clients with older sync tokens get 410 and do a full sync.
+    """
+    help = 'Delete delta sync tombstones older than SYNC_TOMBSTONE_RETENTION.'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - settings.SYNC_TOMBSTONE_RETENTION
+        deleted_count, _ = Tombstone.objects.filter(deleted_at__lt=cutoff).delete()
+        self.stdout.write(f"Deleted {deleted_count} tombstones older than {cutoff.isoformat()}.")
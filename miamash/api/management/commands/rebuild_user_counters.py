@@ -0,0 +1,23 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from core.counters import rebuild_user_counters
+
+
+class Command(BaseCommand):
+    """
+    Counts dashboard counters of every user again, for example after changes made with update() or bulk_create() that skip signals.
+    """
+    help = 'Rebuild denormalised dashboard counters of all users, or of given usernames.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild counters of these users.')
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('id', flat=True))
+        for user_id in user_ids:
+            rebuild_user_counters(user_id)
+        self.stdout.write(f"Rebuilt counters of {len(user_ids)} users.")
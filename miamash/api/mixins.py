@@ -0,0 +1,199 @@
+import hashlib
+from functools import cached_property
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from rest_framework import ISO_8601, serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.mixins import RetrieveModelMixin
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.settings import api_settings
+
+
+class ConditionalGetMixin:
+    """
+    Adds ETag to GET responses of generic views, and answers 304 Not Modified
+    before the queryset is serialized when client already has the current version.
+    ETag comes from one aggregate over the same queryset the view shows: max(updated_at) and row count,
+    also for related rows listed in conditional_related, so added, changed and deleted rows all change the ETag.
+    There is no Last-Modified, a timestamp in whole seconds misses deleted rows and changes within the same second.
+    """
+    # related lookups that are part of the response, for example nested variants or their profile links
+    conditional_related = []
+
+    def get_conditional_related(self):
+        return self.conditional_related
+
+    def get_conditional_queryset(self):
+        queryset = self.filter_queryset(self.get_queryset()) # type: ignore
+        # detail views only look at the object from the URL, list views can have parent pk in URL so check the view type
+        if isinstance(self, RetrieveModelMixin):
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field # type: ignore
+            queryset = queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}) # type: ignore
+        return queryset
+
+    def get_conditional_etag(self):
+        """
+        Returns ETag for current response, computed with one query.
+        """
+        aggregates = {'updated_at_max': Max('updated_at'), 'row_count': Count('id', distinct=True)}
+        for index, related in enumerate(self.get_conditional_related()):
+            aggregates[f'related_{index}_updated_at_max'] = Max(f'{related}__updated_at')
+            aggregates[f'related_{index}_row_count'] = Count(f'{related}__id', distinct=True)
+        values = self.get_conditional_queryset().aggregate(**aggregates)
+
+        # page, limit and format are part of the response too, and every user has their own data
+        version = [self.request.user.pk, self.request.get_full_path(), self.request.accepted_renderer.format] # type: ignore
+        version += [value.isoformat() if hasattr(value, 'isoformat') else value for _, value in sorted(values.items())]
+        return quote_etag(hashlib.md5(repr(version).encode(), usedforsecurity=False).hexdigest())
+
+    def get(self, request, *args, **kwargs):
+        etag = self.get_conditional_etag()
+        # 304 Not Modified if If-None-Match matches, before anything is serialized
+        not_modified_response = get_conditional_response(request._request, etag=etag)
+        if not_modified_response is not None:
+            not_modified_response['ETag'] = etag
+            return not_modified_response
+
+        response = super().get(request, *args, **kwargs) # type: ignore
+        if response.status_code == 200:
+            response['ETag'] = etag
+        return response
+
+
+def get_sparse_field_names(request, field_names):
+    """
+    Returns names of fields kept by ?fields= and ?omit= (comma separated), in serializer order,
+    or None when neither is given. Unknown names are a 400, so a typo does not silently return everything.
+    """
+    fields = request.query_params.get('fields')
+    omit = request.query_params.get('omit')
+    if request.method not in SAFE_METHODS or (fields is None and omit is None):
+        return None
+    requested = {name.strip() for name in fields.split(',') if name.strip()} if fields is not None else set(field_names)
+    omitted = {name.strip() for name in omit.split(',') if name.strip()} if omit is not None else set()
+    unknown = (requested | omitted) - set(field_names)
+    if unknown:
+        raise ValidationError({'fields' if fields is not None else 'omit': [f"Unknown fields: {', '.join(sorted(unknown))}."]})
+    return [name for name in field_names if name in requested and name not in omitted]
+
+
+class SparseFieldsetSerializerMixin:
+    """
+    Serializer leaves out fields dropped with ?fields= / ?omit= from responses of safe methods.
+    Only the serializer created by the view reads the query string, nested serializers are kept or dropped as a whole.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request') # type: ignore
+        if request is None:
+            return
+        kept = get_sparse_field_names(request, list(self.fields)) # type: ignore
+        if kept is not None:
+            for name in set(self.fields) - set(kept): # type: ignore
+                self.fields.pop(name) # type: ignore
+
+
+class SparseFieldsetMixin:
+    """
+    View skips joins, prefetches and ETag lookups behind serializer fields dropped with ?fields= / ?omit=,
+    so for example ?fields=status of a request detail reads only the request row.
+    Lookups are matched by their first part against sources of dropped fields, 'sender' for sender_username.
+    """
+    def get_dropped_relations(self):
+        if not hasattr(self, '_dropped_relations'):
+            self._dropped_relations = set()
+            serializer_class = self.get_serializer_class() if hasattr(self, 'get_serializer_class') else self.serializer_class # type: ignore
+            # fields with their sources, without request in context so nothing is dropped yet
+            fields = serializer_class().fields
+            kept = get_sparse_field_names(self.request, list(fields)) # type: ignore
+            if kept is not None:
+                sources = lambda names: {fields[name].source.split('.')[0] for name in names}
+                self._dropped_relations = sources(set(fields) - set(kept)) - sources(kept)
+        return self._dropped_relations
+
+    def is_relation_requested(self, lookup):
+        lookup = getattr(lookup, 'prefetch_through', lookup)
+        return lookup.split('__')[0] not in self.get_dropped_relations()
+
+    def select_related_requested(self, queryset, *lookups):
+        lookups = [lookup for lookup in lookups if self.is_relation_requested(lookup)]
+        # select_related() without lookups would join every foreign key
+        return queryset.select_related(*lookups) if lookups else queryset
+
+    def prefetch_related_requested(self, queryset, *lookups):
+        return queryset.prefetch_related(*[lookup for lookup in lookups if self.is_relation_requested(lookup)])
+
+    def get_conditional_related(self):
+        return [related for related in super().get_conditional_related() if self.is_relation_requested(related)] # type: ignore
+
+
+class ValuesSerializerMixin:
+    """
+    Serializer also represents rows of queryset.values(*serializer.get_value_lookups()), as list views read them:
+    dicts keyed by lookups like sender__username, so there are no model instances and no get_attribute per field.
+    Output is the same as for model instances, values that are already what a field would return are copied as they are.
+    """
+    # field types whose to_representation returns database values of their model fields unchanged
+    passthrough_field_types = (serializers.CharField, serializers.IntegerField, serializers.ChoiceField, serializers.BooleanField)
+
+    def get_value_lookups(self):
+        return [lookup for _, lookup, _ in self.value_converters]
+
+    @cached_property
+    def value_converters(self):
+        # (output name, values() lookup, to_representation or None), computed once for all rows of a list
+        converters = []
+        for field in self._readable_fields: # type: ignore
+            if type(field) in self.passthrough_field_types:
+                convert = None
+            elif isinstance(field, serializers.DateTimeField):
+                convert = self.get_datetime_converter(field)
+            else:
+                convert = field.to_representation
+            converters.append((field.field_name, field.source.replace('.', '__'), convert))
+        return converters
+
+    def get_datetime_converter(self, field):
+        # current timezone is looked up once for the list instead of once per row
+        if not hasattr(field, 'timezone'):
+            field.timezone = field.default_timezone()
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        if field.timezone is None or output_format is None or output_format.lower() != ISO_8601:
+            return field.to_representation
+
+        def convert(value):
+            # aware datetimes from the database, same string as DateTimeField.to_representation
+            value = value.astimezone(field.timezone).isoformat()
+            return value[:-6] + 'Z' if value.endswith('+00:00') else value
+        return convert
+
+    def to_representation(self, instance):
+        if not isinstance(instance, dict):
+            return super().to_representation(instance) # type: ignore
+        ret = {}
+        for name, lookup, convert in self.value_converters:
+            value = instance[lookup]
+            ret[name] = value if convert is None or value is None else convert(value)
+        return ret
+
+
+class ValuesListMixin:
+    """
+    List GET reads the page with values() of the serializer fields, one joined query without model instances,
+    serializer has to use ValuesSerializerMixin. Ordering fields of the paginator are read too, for cursor positions.
+    """
+    def get_values_queryset(self, queryset, paginator):
+        if hasattr(self, 'get_serializer'):
+            serializer = self.get_serializer() # type: ignore
+        else:
+            serializer = self.serializer_class(context={'request': self.request}) # type: ignore
+        # ?fields= / ?omit= already dropped fields from the serializer, so their columns and joins are not read
+        ordering = [order.lstrip('-') for order in paginator.get_ordering(self.request, queryset, self)] # type: ignore
+        return queryset.values(*dict.fromkeys(serializer.get_value_lookups() + ordering))
+
+    def paginate_queryset(self, queryset):
+        if self.request.method in SAFE_METHODS: # type: ignore
+            queryset = self.get_values_queryset(queryset, self.paginator) # type: ignore
+        return super().paginate_queryset(queryset) # type: ignore
@@ -0,0 +1,74 @@
+from rest_framework.pagination import CursorPagination
+
+
+class AsyncCursorPaginationMixin:
+    """
+    Adds apaginate_queryset to cursor pagination, for async views.
+    """
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Same as CursorPagination.paginate_queryset, but the page is read with aiterator so async view does not block on it.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor if self.cursor is not None else (0, False, None)
+
+        # previous page is read in reversed order
+        if reverse:
+            queryset = queryset.order_by(*[order[1:] if order.startswith('-') else f'-{order}' for order in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        # keyset condition, (cursor reversed) XOR (ordering reversed) decides the direction
+        if current_position is not None:
+            order = self.ordering[0]
+            lookup = 'lt' if self.cursor.reverse != order.startswith('-') else 'gt'
+            queryset = queryset.filter(**{f"{order.lstrip('-')}__{lookup}": current_position})
+
+        # one extra row tells if there is a following page
+        results = [instance async for instance in queryset[offset:offset + self.page_size + 1].aiterator()]
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+        return self.page
+
+
+class RequestCursorPagination(AsyncCursorPaginationMixin, CursorPagination):
+    """
+    Keyset pagination for Request lists, newest first, with opaque next/previous cursors.
+    Each page is a WHERE created_at < cursor query, so a deep page costs the same as the first one.
+    """
+    # id breaks ties between requests created at the same time
+    ordering = ('-created_at', '-id')
+    # default page size comes from REST_FRAMEWORK['PAGE_SIZE'], client can override it with ?limit=
+    page_size_query_param = 'limit'
+    max_page_size = 200
+
+    def get_ordering(self, request, queryset, view):
+        # ?q= search results, best match first
+        if 'search_rank' in queryset.query.annotations:
+            return ('-search_rank', '-id')
+        return super().get_ordering(request, queryset, view)
+
+
+class IdentityVariantCursorPagination(AsyncCursorPaginationMixin, CursorPagination):
+    """
+    Keyset pagination for ProfileIdentityVariant and RequestIdentityVariant lists, in order they were created.
+    """
+    ordering = 'id'
+    page_size_query_param = 'limit'
+    max_page_size = 200
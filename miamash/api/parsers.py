@@ -0,0 +1,38 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+from .renderers import MessagePackRenderer, ORJSONRenderer, msgpack, orjson
+
+
+class ORJSONParser(JSONParser):
+    """
+    Parses JSON request body with orjson, NaN and Infinity are rejected like in DRF strict mode.
+    Registered in REST_FRAMEWORK only when orjson is installed.
+    """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        # orjson reads UTF-8 only, other charsets go through DRF parser
+        if encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return orjson.loads(stream.read() if stream is not None else b'')
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
+
+
+class MessagePackParser(BaseParser):
+    """
+    Parses Content-Type: application/msgpack request body.
+    Registered in REST_FRAMEWORK only when msgpack is installed.
+    """
+    media_type = 'application/msgpack'
+    renderer_class = MessagePackRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read() if stream is not None else b'', raw=False, timestamp=0, strict_map_key=False)
+        # ExtraData, FormatError and StackError are ValueErrors too
+        except ValueError as exc:
+            raise ParseError('MessagePack parse error - %s' % str(exc))
@@ -10,7 +10,8 @@ class IsProfileOwner(BasePermission):
     
     def has_object_permission(self, request, view, obj):
         # in this case, obj is a ProfileIdentityVariant instance
-        return obj.user == request.user
+        # compare ids, so owner User instance does not have to be fetched
+        return obj.user_id == request.user.id
 
 class IsRequestSender(BasePermission):
     """
@@ -24,11 +25,13 @@ class IsRequestSender(BasePermission):
         # variable request is the DRF request object that has request.user - as logged in user who is making the request to access the view
         if isinstance(obj, Request):
             # if obj is a Request instance, return true if Request.sender matches the logged in user
-            return obj.sender == request.user
+            # compare ids, so sender User instance does not have to be fetched
+            return obj.sender_id == request.user.id
         
         if isinstance(obj, RequestIdentityVariant):
             # if obj is a RequestIdentityVariant instance, get parent Request to check who is sender and compare it with logged in user
-            return obj.request.sender == request.user
+            # views select_related('request'), so parent Request is already loaded and this is not an extra query
+            return obj.request.sender_id == request.user.id
 
         # there sohuld be no other cases, but if there are, return False untill added 
         return False
@@ -46,11 +49,13 @@ class IsRequestReceiver(BasePermission):
         # variable request is the DRF request object that has request.user - as logged in user who is making the request to access the view
         if isinstance(obj, Request):
             # if obj is a Request instance, return true if Request.sender matches the logged in user
-            return obj.receiver == request.user
+            # compare ids, so receiver User instance does not have to be fetched
+            return obj.receiver_id == request.user.id
         
         if isinstance(obj, RequestIdentityVariant):
             # if obj is a RequestIdentityVariant instance, get parent Request to check who is sender and compare it with logged in user
-            return obj.request.receiver == request.user
+            # views select_related('request'), so parent Request is already loaded and this is not an extra query
+            return obj.request.receiver_id == request.user.id
 
         # there sohuld be no other cases, but if there are, return False untill added 
         return False
@@ -63,7 +68,7 @@ class IsRequestAccepted(BasePermission):
         # if its Request instance 
         if isinstance(obj, Request):
             # if obj is a Request instance, return true if Request.sender matches the logged in user
-            return obj.receiver == Request.Status.ACCEPTED
+            return obj.status == Request.Status.ACCEPTED
         # if its RequestIdentityVariant instance
         if isinstance(obj, RequestIdentityVariant):
             # if obj is a RequestIdentityVariant instance, get parent Request to check who is sender and compare it with logged in user
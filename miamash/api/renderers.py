@@ -0,0 +1,51 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# both are optional, settings only register the classes of installed libraries
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Same bytes as DRF JSONRenderer, written with orjson. Datetimes, decimals, lazy strings and other values orjson
+    does not write like DRF go through DRF JSONEncoder, pretty printed output (browsable API, indent=) uses DRF renderer.
+    Registered in REST_FRAMEWORK only when orjson is installed.
+    """
+    options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=self.options)
+        except orjson.JSONEncodeError:
+            # for example integers over 64 bits, json module can write them
+            return super().render(data, accepted_media_type, renderer_context)
+        # DRF escapes line and paragraph separators, so JSON is also valid javascript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack for Accept: application/msgpack, with the same values as the JSON response,
+    datetimes are the same ISO 8601 strings and not msgpack timestamps.
+    Registered in REST_FRAMEWORK only when msgpack is installed.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder_class = JSONRenderer.encoder_class
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder_class().default, use_bin_type=True, datetime=False)
@@ -0,0 +1,25 @@
+import inspect
+
+from drf_spectacular.openapi import AutoSchema
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+
+from .mixins import SparseFieldsetSerializerMixin
+
+
+class SparseFieldsetAutoSchema(AutoSchema):
+    """
+    Documents ?fields= and ?omit= on GET operations of views whose response serializer supports sparse fieldsets.
+    """
+    def get_override_parameters(self):
+        parameters = super().get_override_parameters()
+        if self.method != 'GET':
+            return parameters
+        serializer = self.get_response_serializers()
+        serializer_class = serializer if inspect.isclass(serializer) else type(serializer)
+        if issubclass(serializer_class, SparseFieldsetSerializerMixin):
+            parameters = parameters + [
+                OpenApiParameter('fields', OpenApiTypes.STR, description='Comma separated fields to return, others are left out.'),
+                OpenApiParameter('omit', OpenApiTypes.STR, description='Comma separated fields to leave out.'),
+            ]
+        return parameters
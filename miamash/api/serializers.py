@@ -1,18 +1,75 @@
 from rest_framework import serializers
 from core.models import ProfileIdentityVariant, Request, RequestIdentityVariant
-from django.contrib.auth.models import User
+from django.db import transaction
+from core.receivers import resolve_receiver
+from core.search import schedule_search_document_update
+from core.profile_variant_import import ImportFileError, get_import_format
+from core.profile_variant_suggestions import get_profile_variant_index
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from datetime import datetime
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from .mixins import SparseFieldsetSerializerMixin, ValuesSerializerMixin
 
 # Profil Identity Variant Serializers
-class ProfileIdentityVariantSerializer(serializers.ModelSerializer):
+class ProfileIdentityVariantSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = ProfileIdentityVariant
         fields = ['id', 'label', 'context', 'variant']
         read_only_fields = ['id']
         
+def validate_profile_identity_variant_rows(rows):
+    """
+    Validates chunk of rows of a profile identity variant import like a list posted to the list endpoint,
+    used by API and web import. Returns (validated rows, None) or ([], errors of every row).
+    """
+    serializer = ProfileIdentityVariantSerializer(data=rows, many=True)
+    if serializer.is_valid():
+        return serializer.validated_data, None
+    return [], serializer.errors
+
+class ProfileIdentityVariantImportSerializer(serializers.Serializer):
+    # CSV with label, context, variant header or NDJSON with one object per line, format from file extension
+    file = serializers.FileField(help_text="CSV (.csv) or NDJSON (.ndjson, .jsonl) file of profile identity variants.")
+
+    def validate_file(self, value):
+        try:
+            get_import_format(value.name)
+        except ImportFileError as error:
+            raise serializers.ValidationError(str(error))
+        return value
+
+class ProfileIdentityVariantImportRowErrorSerializer(serializers.Serializer):
+    # line of the file where the row starts, errors by field like in other validation errors
+    row = serializers.IntegerField()
+    errors = serializers.DictField(child=serializers.ListField(child=serializers.CharField()))
+
+class ProfileIdentityVariantImportResultSerializer(serializers.Serializer):
+    created = serializers.IntegerField()
+    error_count = serializers.IntegerField()
+    # first rows with errors only, error_count has all of them
+    errors = ProfileIdentityVariantImportRowErrorSerializer(many=True)
+
+
+class OwnProfileIdentityVariantField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field that only accepts ProfileIdentityVariant ids of the logged in user.
+    Lookup is one query on (user, id) index, loading only the columns that are shown.
+    """
+    def get_queryset(self):
+        request = self.context.get('request')
+        # no logged in user (for example schema generation), then there is nothing to choose from
+        if request is None or not request.user.is_authenticated:
+            return ProfileIdentityVariant.objects.none()
+        return ProfileIdentityVariant.objects.filter(user=request.user).only('id', 'label', 'variant')
+
+    def display_value(self, instance):
+        # choices in browsable API, owner is always the logged in user so don't fetch it for every option
+        return f"{instance.label} / {instance.variant}"
 
 
 # Request Send Serializers
-class RequestSendListCreateSerializer(serializers.ModelSerializer):
+class RequestSendListCreateSerializer(SparseFieldsetSerializerMixin, ValuesSerializerMixin, serializers.ModelSerializer):
     # list usernames instead of users ids  
     receiver_username = serializers.CharField(source='receiver.username') 
     
@@ -25,29 +82,52 @@ class RequestSendListCreateSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         #  get receiver username from validated data  
         receiver_username = validated_data['receiver']['username']
-        # get user object if exists, else raise error
-        try:
-            receiver = User.objects.get(username=receiver_username)
-        except User.DoesNotExist:
+        # get user object if exists, else raise error, one lookup shared with web form, cached by username
+        receiver = resolve_receiver(receiver_username)
+        if receiver is None:
             raise serializers.ValidationError(f"Username: '{receiver_username}' does not exist")
         # to get sender use .user attribute, from DRF Request object
         # using server data for who sender is (not client data) for security  
         sender = self.context['request'].user
-        # create new Request instance
-        request_instance = Request.objects.create(
-            sender=sender,
-            receiver=receiver,
-            request_reasoning=validated_data.get('request_reasoning', '')
-        )
+        # variants are only present when RequestSendCreateSerializer is used 
+        variants_data = validated_data.pop('request_identity_variants', [])
+        # Request and its variants are saved together or not at all
+        with transaction.atomic():
+            # create new Request instance
+            request_instance = Request.objects.create(
+                sender=sender,
+                receiver=receiver,
+                request_reasoning=validated_data.get('request_reasoning', '')
+            )
+            # one insert for all variants instead of one per variant
+            RequestIdentityVariant.objects.bulk_create([RequestIdentityVariant(request=request_instance, **variant_data) for variant_data in variants_data])
+            # bulk_create sends no signals, variant labels and contexts are indexed for search here
+            if variants_data:
+                schedule_search_document_update(request_instance.id)
         # return created instance 
         return request_instance
     
-class RequestSendRequestIdentityVariantSerializer(serializers.ModelSerializer):
+class RequestSendRequestIdentityVariantListSerializer(serializers.ListSerializer):
+    # used when serializer is called with many=True, inserts whole batch with one query instead of one per variant
+    def create(self, validated_data):
+        # every item was saved with the same parent Request, so ownership is checked once for the batch
+        request_instance = validated_data[0]['request']
+        if request_instance.sender_id != self.context['request'].user.id:
+            raise serializers.ValidationError("You can only add identity variants to your own requests.")
+        # all or nothing, if one row fails none of the batch is saved
+        with transaction.atomic():
+            request_identity_variants = RequestIdentityVariant.objects.bulk_create([RequestIdentityVariant(**item) for item in validated_data])
+            # bulk_create sends no signals, variant labels and contexts are indexed for search here
+            schedule_search_document_update(request_instance.id)
+            return request_identity_variants
+
+class RequestSendRequestIdentityVariantSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user_provided_variant = serializers.CharField(source='profile_link.variant', read_only=True, allow_null=True)
     class Meta:
         model = RequestIdentityVariant
         fields = ['id', 'label', 'context', 'user_provided_variant']
         read_only_fuields = ['id', 'user_variant']
+        list_serializer_class = RequestSendRequestIdentityVariantListSerializer
     
     def create(self, validated_data):
         # ensure request belongs to the sender (current user)
@@ -56,8 +136,15 @@ class RequestSendRequestIdentityVariantSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("You can only add identity variants to your own requests.")
         return super().create(validated_data)
     
+class RequestSendCreateSerializer(RequestSendListCreateSerializer):
+    # variants can be created together with the Request, in one call
+    request_identity_variants = RequestSendRequestIdentityVariantSerializer(many=True, required=False)
+
+    class Meta(RequestSendListCreateSerializer.Meta):
+        fields = RequestSendListCreateSerializer.Meta.fields + ['request_identity_variants']
+
 
-class RequestSendDetailSerializer(serializers.ModelSerializer):
+class RequestSendDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     # make receiver username read-only not allowing to change in update
     receiver_username = serializers.CharField(source='receiver.username', read_only=True) 
     # include nested request-identity-variants related to this request
@@ -76,7 +163,7 @@ class RequestSendDetailSerializer(serializers.ModelSerializer):
 
 
 # Request Receive Serializers
-class RequestReceiveListSerializer(serializers.ModelSerializer):
+class RequestReceiveListSerializer(SparseFieldsetSerializerMixin, ValuesSerializerMixin, serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True) 
     
     class Meta:
@@ -84,28 +171,55 @@ class RequestReceiveListSerializer(serializers.ModelSerializer):
         fields = ['id', 'sender_username', 'request_reasoning', 'status', 'created_at']
         read_only_fields = ['id', 'sender_username', 'request_reasoning','status','created_at']
     
-class RequestReceiveRequestIdentityVariantSerializer(serializers.ModelSerializer):
+class RequestReceiveRequestIdentityVariantSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user_provided_variant = serializers.CharField(source='profile_link.variant', read_only=True)
     class Meta:
         model = RequestIdentityVariant
         fields = ['id', 'label', 'context', 'user_provided_variant']
         read_only_fuields = ['id', 'label', 'context']
 
-class RequestReceiveDetailSerializer(serializers.ModelSerializer):
+class ProfileIdentityVariantSuggestionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    label = serializers.CharField()
+    context = serializers.CharField()
+    variant = serializers.CharField()
+    # 0-1, how well label and context match the request identity variant
+    score = serializers.FloatField()
+
+class RequestReceiveSuggestedRequestIdentityVariantSerializer(RequestReceiveRequestIdentityVariantSerializer):
+    # receiver's profile identity variants that match label and context best, first is the best, empty until request is accepted
+    suggested_profile_identity_variants = serializers.SerializerMethodField()
+
+    class Meta(RequestReceiveRequestIdentityVariantSerializer.Meta):
+        fields = RequestReceiveRequestIdentityVariantSerializer.Meta.fields + ['suggested_profile_identity_variants']
+
+    @extend_schema_field(ProfileIdentityVariantSuggestionSerializer(many=True))
+    def get_suggested_profile_identity_variants(self, obj):
+        index = self.context.get('profile_variant_index')
+        if index is None:
+            return []
+        return ProfileIdentityVariantSuggestionSerializer([{**variant, 'score': score} for variant, score in index.suggest(obj.label, obj.context)], many=True).data
+
+class RequestReceiveDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     sender_username = serializers.CharField(source='sender.username', read_only=True) 
-    # include nested request-identity-variants related to this request
-    request_identity_variants = RequestReceiveRequestIdentityVariantSerializer(many=True, read_only=True)
+    # include nested request-identity-variants related to this request, with profile identity variants suggested for them
+    request_identity_variants = RequestReceiveSuggestedRequestIdentityVariantSerializer(many=True, read_only=True)
     
     class Meta:
         model = Request
         fields = ['id', 'sender_username', 'request_reasoning', 'status', 'created_at', 'request_identity_variants']
         read_only_fields = ['id', 'sender_username', 'created_at', 'status', 'request_identity_variants']
 
-class RequestReceiveRequestIdentityVariantDetailSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        # only accepted requests can be linked, so only they get suggestions, async view passes the index in context
+        if instance.status == Request.Status.ACCEPTED and 'request_identity_variants' in self.fields and 'profile_variant_index' not in self.context:
+            self.context['profile_variant_index'] = get_profile_variant_index(instance.receiver_id)
+        return super().to_representation(instance)
+
+class RequestReceiveRequestIdentityVariantDetailSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     user_provided_variant = serializers.CharField(source='profile_link.variant', read_only=True, allow_null=True)
-    link_to_id_profile_identity_variant = serializers.PrimaryKeyRelatedField(
+    link_to_id_profile_identity_variant = OwnProfileIdentityVariantField(
         source='profile_link',
-        queryset=ProfileIdentityVariant.objects.all(),
         allow_null=True,
         required=False
     )
@@ -115,10 +229,102 @@ class RequestReceiveRequestIdentityVariantDetailSerializer(serializers.ModelSeri
         fields = ['id', 'label', 'context', 'link_to_id_profile_identity_variant', 'user_provided_variant']
         read_only_fields = ['id', 'label', 'context', 'user_provided_variant']
         
-class RequestReceiveStatusSerializer(serializers.ModelSerializer):
+class RequestReceiveBulkLinkSerializer(serializers.Serializer):
+    # map of request identity variant id to profile identity variant id, null removes the link
+    links = serializers.DictField(child=serializers.IntegerField(allow_null=True), allow_empty=False)
+
+    def validate_links(self, value):
+        # JSON object keys are always strings, request identity variant ids are integers
+        try:
+            return {int(variant_id): profile_variant_id for variant_id, profile_variant_id in value.items()}
+        except ValueError:
+            raise serializers.ValidationError("Keys have to be request identity variant ids.")
+        
+class RequestReceiveStatusSerializer(SparseFieldsetSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Request
         fields = ['status']
         read_only_fields = ['status']
+
+class RequestReceiveBulkStatusSerializer(serializers.Serializer):
+    # ids of received requests and status all of them should be set to
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+    status = serializers.ChoiceField(choices=[Request.Status.ACCEPTED, Request.Status.DENIED])
     
 
+
+# Summary Serializers
+class SummarySerializer(SparseFieldsetSerializerMixin, serializers.Serializer):
+    # counters from core.models.UserCounters
+    pending_received = serializers.IntegerField(read_only=True)
+    accepted_received = serializers.IntegerField(read_only=True)
+    denied_received = serializers.IntegerField(read_only=True)
+    pending_sent = serializers.IntegerField(read_only=True)
+    profile_identity_variants = serializers.IntegerField(read_only=True)
+
+
+# Request list filter serializers
+class RequestListFilterSerializer(serializers.Serializer):
+    # query parameters of sent and received request lists, missing parameters are not applied
+    status = serializers.ChoiceField(choices=Request.Status.choices, required=False, help_text="Only requests with this status.")
+    created_after = serializers.DateTimeField(required=False, help_text="Only requests created at or after this time.")
+    created_before = serializers.DateTimeField(required=False, help_text="Only requests created before this time.")
+    sender = serializers.CharField(max_length=150, required=False, help_text="Only requests sent by this username.")
+    receiver = serializers.CharField(max_length=150, required=False, help_text="Only requests sent to this username.")
+    has_unlinked_variants = serializers.BooleanField(required=False, allow_null=True, default=None, help_text="Only requests that have (true) or do not have (false) identity variants without profile link.")
+
+
+# User Search Serializers
+class UserSearchQuerySerializer(serializers.Serializer):
+    prefix = serializers.CharField(max_length=150, help_text="Start of the username, case insensitive.")
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10, help_text="Maximum number of usernames returned.")
+
+class UserSearchSerializer(serializers.Serializer):
+    # usernames in alphabetical order
+    results = serializers.ListField(child=serializers.CharField(), read_only=True)
+
+
+# Delta Sync Serializers
+@extend_schema_field(OpenApiTypes.STR)
+class SyncTokenField(serializers.Field):
+    """
+    Opaque sync token, encodes the server time changes were read at.
+    """
+    def to_representation(self, value):
+        return urlsafe_base64_encode(value.isoformat().encode())
+
+    def to_internal_value(self, data):
+        try:
+            value = datetime.fromisoformat(urlsafe_base64_decode(data).decode())
+        except (ValueError, TypeError, UnicodeDecodeError):
+            raise serializers.ValidationError("Invalid sync token.")
+        # tokens are only made by server, always timezone aware
+        if value.tzinfo is None:
+            raise serializers.ValidationError("Invalid sync token.")
+        return value
+
+class ChangesQuerySerializer(serializers.Serializer):
+    # without since, all current rows are returned, to start syncing
+    since = SyncTokenField(required=False, help_text="sync_token from previous changes response.")
+
+class RequestIdentityVariantChangeSerializer(serializers.ModelSerializer):
+    # parent request, so client knows where the variant belongs
+    request_id = serializers.IntegerField(read_only=True)
+    user_provided_variant = serializers.CharField(source='profile_link.variant', read_only=True, allow_null=True)
+    class Meta:
+        model = RequestIdentityVariant
+        fields = ['id', 'request_id', 'label', 'context', 'user_provided_variant']
+        read_only_fields = fields
+
+class ChangesDeletedSerializer(serializers.Serializer):
+    # ids from tombstones of deleted rows
+    requests = serializers.ListField(child=serializers.IntegerField())
+    request_identity_variants = serializers.ListField(child=serializers.IntegerField())
+
+class ChangesSerializer(serializers.Serializer):
+    # pass as since in next call
+    sync_token = SyncTokenField()
+    requests_sent = RequestSendListCreateSerializer(many=True)
+    requests_received = RequestReceiveListSerializer(many=True)
+    request_identity_variants = RequestIdentityVariantChangeSerializer(many=True)
+    deleted = ChangesDeletedSerializer()
@@ -1,8 +1,39 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.urls import reverse 
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
-from core.models import Request, ProfileIdentityVariant, RequestIdentityVariant
+from core.models import Request, ProfileIdentityVariant, RequestIdentityVariant, Tombstone, UserCounters
+from django.core.cache import cache
+from core.lru import VersionedLRUCache
+from core.receivers import bump_receiver_version, get_receiver_version, receiver_cache, resolve_receiver
+from core.user_search import USER_SEARCH_VERSION_KEY, get_user_search_version, invalidate_user_search, prefix_upper_bound, search_usernames_query
+from core.profile_variant_cache import data_key, get_or_set_profile_variant_data, get_profile_variant_version
+from core.profile_variant_suggestions import ProfileVariantIndex, get_profile_variant_index, profile_variant_indexes
+from django.utils import timezone
+from django.utils.http import http_date
+from datetime import timedelta
+from api.serializers import SyncTokenField, RequestReceiveListSerializer, RequestSendListCreateSerializer
+from core.events import InProcessEventBroker, get_event_broker
+from unittest.mock import patch
+from rest_framework_simplejwt.tokens import RefreshToken
+from asgiref.sync import async_to_sync, sync_to_async
+import asyncio
+import csv
+import json
+import threading
+import uuid
+import msgpack
+from decimal import Decimal
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from api.renderers import ORJSONRenderer
 
 User = get_user_model() # set User model
 
@@ -192,7 +223,7 @@ class ProfileIdentityVariantsTests(APITestCase):
         # response should be 200 OK
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
 
     # stranger cannot see users profile identity variants 
     def test_stranger_cannot_see_users_identity_variants(self):
@@ -323,6 +354,7 @@ class RequestsSendTests(APITestCase):
         self.request_send_detail_url = lambda pk: reverse('api-request-send-detail', args=[pk]) 
         self.request_send_request_identity_variant_list_create_url = lambda pk: reverse('api-request-send-request-identity-variant-list-create', args=[pk])
         self.request_send_request_identity_variant_detail_url = lambda pk, request_identity_variant_pk: reverse('api-request-send-request-identity-variant-detail', args=[pk, request_identity_variant_pk])
+        self.request_send_request_identity_variant_bulk_create_url = lambda pk: reverse('api-request-send-request-identity-variant-bulk-create', args=[pk])
 
     # user can create new sent requests
     def test_user_can_create_new_sent_requests(self):
@@ -382,11 +414,11 @@ class RequestsSendTests(APITestCase):
         # response should be 200 OK
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
         # response data should have the created request
-        self.assertGreater(len(response.json()), 0)  # should have at least one request
+        self.assertGreater(len(response.json()['results']), 0)  # should have at least one request
         # check if the created request is in the response data
-        created_request = response.json()[0]
+        created_request = response.json()['results'][0]
         self.assertEqual(created_request['receiver_username'], self.valid_username2)
         self.assertEqual(created_request['request_reasoning'], 'This is dental office, we need your identity information.')
 
@@ -405,9 +437,9 @@ class RequestsSendTests(APITestCase):
         # response should be 200 OK
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
         # response data should be empty, as user3 is not sender of any requests
-        self.assertEqual(len(response.json()), 0)
+        self.assertEqual(len(response.json()['results']), 0)
 
     # stranger cannot see users sent requests
     def test_stranger_cannot_see_users_sent_requests(self):
@@ -638,11 +670,11 @@ class RequestsSendTests(APITestCase):
         # response should be 200 OK
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
         # response data should have the created request identity variant
-        self.assertGreater(len(response.json()), 0)
+        self.assertGreater(len(response.json()['results']), 0)
         # check if the created request identity variant is in the response data
-        created_request_identity_variant = response.json()[0]
+        created_request_identity_variant = response.json()['results'][0]
         self.assertEqual(created_request_identity_variant['label'], self.valid_request_identity_variant_data['label'])
         self.assertEqual(created_request_identity_variant['context'], self.valid_request_identity_variant_data['context'])      
 
@@ -663,10 +695,10 @@ class RequestsSendTests(APITestCase):
         responseGotData = self.client.get(self.request_send_request_identity_variant_list_create_url(request_id))
         # response got data sohuld be 200 OK and should contain the created request identity variant
         self.assertEqual(responseGotData.status_code, status.HTTP_200_OK)
-        self.assertIsInstance(responseGotData.json(), list)
-        self.assertGreater(len(responseGotData.json()), 0)
+        self.assertIsInstance(responseGotData.json()['results'], list)
+        self.assertGreater(len(responseGotData.json()['results']), 0)
         # check if the created request identity variant is in the response data
-        created_request_identity_variant = responseGotData.json()[0]
+        created_request_identity_variant = responseGotData.json()['results'][0]
         self.assertEqual(created_request_identity_variant['label'], self.valid_request_identity_variant_data['label'])
         self.assertEqual(created_request_identity_variant['context'], self.valid_request_identity_variant_data['context'])
         # log out user1 and log in user3
@@ -678,9 +710,9 @@ class RequestsSendTests(APITestCase):
         # response should de 200, but it should be different then responseGotData
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
         # response data should be empty, as user3 is not sender of any requests
-        self.assertEqual(len(response.json()), 0)
+        self.assertEqual(len(response.json()['results']), 0)
         # there should be no label or context in the response data
         self.assertNotIn('label', response.json())
         self.assertNotIn('context', response.json())
@@ -910,6 +942,126 @@ class RequestsSendTests(APITestCase):
         # response should be 401 Unauthorized
         self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
 
+    # user can create many request identity variants for sent request in one call
+    def test_user_can_bulk_create_request_identity_variants_for_sent_requests(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        create_response = self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2, 'request_reasoning':'Dental office data request.'})
+        request_id = create_response.json()['id']
+        variants_data = [{'label': f'Label {i}', 'context': f'Context {i}'} for i in range(5)]
+        response = self.client.post(self.request_send_request_identity_variant_bulk_create_url(request_id), variants_data, format='json')
+        # response should be 201 Created, with list of created variants that have ids
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()), 5)
+        self.assertEqual([variant['label'] for variant in response.json()], [variant['label'] for variant in variants_data])
+        self.assertTrue(all(variant['id'] for variant in response.json()))
+        # all variants are saved for that request
+        self.assertEqual(RequestIdentityVariant.objects.filter(request_id=request_id).count(), 5)
+
+    # bulk create inserts the whole batch with the same number of queries, no matter the batch size
+    def test_bulk_create_request_identity_variants_query_count_does_not_grow_with_batch(self):
+        request_instance = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.client.force_authenticate(user=self.user)
+        url = self.request_send_request_identity_variant_bulk_create_url(request_instance.pk)
+        with CaptureQueriesContext(connection) as small_batch_queries:
+            self.client.post(url, [{'label': f'Label {i}'} for i in range(2)], format='json')
+        with CaptureQueriesContext(connection) as big_batch_queries:
+            self.client.post(url, [{'label': f'Label {i}'} for i in range(30)], format='json')
+        self.assertEqual(len(small_batch_queries), len(big_batch_queries))
+        self.assertEqual(RequestIdentityVariant.objects.filter(request=request_instance).count(), 32)
+
+    # one invalid item rejects the whole batch
+    def test_bulk_create_request_identity_variants_is_all_or_nothing(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        create_response = self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2, 'request_reasoning':'Dental office data request.'})
+        request_id = create_response.json()['id']
+        # second item has no label
+        variants_data = [{'label': 'First Name'}, {'context': 'Missing label'}, {'label': 'Last Name'}]
+        response = self.client.post(self.request_send_request_identity_variant_bulk_create_url(request_id), variants_data, format='json')
+        # response should be 400 Bad Request, with errors for each item in order
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('label', response.json()[1])
+        # nothing is saved
+        self.assertEqual(RequestIdentityVariant.objects.filter(request_id=request_id).count(), 0)
+
+    # empty list is not a valid batch
+    def test_bulk_create_request_identity_variants_rejects_empty_list(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        create_response = self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2, 'request_reasoning':'Dental office data request.'})
+        request_id = create_response.json()['id']
+        response = self.client.post(self.request_send_request_identity_variant_bulk_create_url(request_id), [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # user can not bulk create request identity variants for other users sent requests
+    def test_user_cannot_bulk_create_request_identity_variants_for_other_users_sent_requests(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        create_response = self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2, 'request_reasoning':'Dental office data request.'})
+        request_id = create_response.json()['id']
+        self.client.logout()
+        # Ezma tries to add variants to user1 request
+        self.client.login(username=self.valid_username3, password=self.valid_password3)
+        response = self.client.post(self.request_send_request_identity_variant_bulk_create_url(request_id), [self.valid_request_identity_variant_data], format='json')
+        # response should be 404 Not Found, as Ezma is not sender of this request
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(RequestIdentityVariant.objects.filter(request_id=request_id).count(), 0)
+
+    # stranger can not bulk create request identity variants
+    def test_stranger_cannot_bulk_create_request_identity_variants_for_users_sent_requests(self):
+        request_instance = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        response = self.client.post(self.request_send_request_identity_variant_bulk_create_url(request_instance.pk), [self.valid_request_identity_variant_data], format='json')
+        # response should be 401 Unauthorized
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # user can create sent request together with its request identity variants
+    def test_user_can_create_sent_request_with_request_identity_variants(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        response = self.client.post(self.request_send_list_create_url, {
+            'receiver_username': self.valid_username2,
+            'request_reasoning': 'Dental office data request.',
+            'request_identity_variants': [{'label': f'Label {i}', 'context': f'Context {i}'} for i in range(3)],
+        }, format='json')
+        # response should be 201 Created, and include created variants with their ids
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.json()['request_identity_variants']), 3)
+        self.assertTrue(all(variant['id'] for variant in response.json()['request_identity_variants']))
+        # variants are saved for the created request
+        self.assertEqual(RequestIdentityVariant.objects.filter(request_id=response.json()['id']).count(), 3)
+        # list of sent requests does not embed variants
+        list_response = self.client.get(self.request_send_list_create_url)
+        self.assertNotIn('request_identity_variants', list_response.json()['results'][0])
+
+    # creating request with variants runs the same number of queries, no matter how many variants there are
+    def test_create_sent_request_with_request_identity_variants_query_count_does_not_grow(self):
+        self.client.force_authenticate(user=self.user)
+        # receiver lookup is cached after the first request, warm it up so both requests are measured the same
+        self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2}, format='json')
+        with CaptureQueriesContext(connection) as few_variants_queries:
+            self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2, 'request_identity_variants': [{'label': 'First Name'}]}, format='json')
+        with CaptureQueriesContext(connection) as many_variants_queries:
+            self.client.post(self.request_send_list_create_url, {'receiver_username': self.valid_username2, 'request_identity_variants': [{'label': f'Label {i}'} for i in range(30)]}, format='json')
+        self.assertEqual(len(few_variants_queries), len(many_variants_queries))
+
+    # invalid variant rejects the request too
+    def test_create_sent_request_with_invalid_request_identity_variant_creates_nothing(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        response = self.client.post(self.request_send_list_create_url, {
+            'receiver_username': self.valid_username2,
+            'request_identity_variants': [{'label': 'First Name'}, {'context': 'Missing label'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Request.objects.filter(sender=self.user).exists())
+        self.assertFalse(RequestIdentityVariant.objects.exists())
+
+    # unknown receiver rejects the request and its variants
+    def test_create_sent_request_with_unknown_receiver_creates_nothing(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        response = self.client.post(self.request_send_list_create_url, {
+            'receiver_username': 'Nobody',
+            'request_identity_variants': [{'label': 'First Name'}],
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Request.objects.filter(sender=self.user).exists())
+        self.assertFalse(RequestIdentityVariant.objects.exists())
+
 
 # Received 
 
@@ -1002,6 +1154,8 @@ class RequestsReceiveTests(APITestCase):
         self.request_receive_request_identity_variant_detail_url = lambda pk, request_identity_variant_pk: reverse('api-request-receive-request-identity-variant-detail', args=[pk, request_identity_variant_pk])
         self.request_receive_accept_url = lambda pk: reverse('api-request-receive-accept', args=[pk])
         self.request_receive_deny_url = lambda pk: reverse('api-request-receive-deny', args=[pk])       
+        self.request_receive_bulk_status_url = reverse('api-request-receive-bulk-status')
+        self.request_receive_request_identity_variant_bulk_link_url = lambda pk: reverse('api-request-receive-request-identity-variant-bulk-link', args=[pk])
 
     # user can see list of received requests
     def test_user_can_see_list_of_received_requests(self):
@@ -1012,11 +1166,11 @@ class RequestsReceiveTests(APITestCase):
         # response should be 200 OK
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
         # response data should have the created request
-        self.assertGreater(len(response.json()), 0)
+        self.assertGreater(len(response.json()['results']), 0)
         # check if the created request is in the response data
-        received_request = response.json()[0]
+        received_request = response.json()['results'][0]
         self.assertEqual(received_request['sender_username'], self.valid_username1)
         self.assertEqual(received_request['request_reasoning'], 'Dental office data request.')  
 
@@ -1031,8 +1185,8 @@ class RequestsReceiveTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response should be list, but it should be empy, because the only request in database is from user1 to user2
         # and user3 should not be able to see it 
-        self.assertIsInstance(response.json(), list)
-        self.assertEqual(len(response.json()), 0)
+        self.assertIsInstance(response.json()['results'], list)
+        self.assertEqual(len(response.json()['results']), 0)
 
     # stranger cannot see users received requests
     def test_stranger_cannot_see_users_received_requests(self):
@@ -1154,11 +1308,11 @@ class RequestsReceiveTests(APITestCase):
         # response should be 200 OK
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         # response data should be a list
-        self.assertIsInstance(response.json(), list)
+        self.assertIsInstance(response.json()['results'], list)
         # response data should have the created request identity variant
-        self.assertGreater(len(response.json()), 0)
+        self.assertGreater(len(response.json()['results']), 0)
         # check if the created request identity variant is in the response data
-        created_request_identity_variant = response.json()[0]
+        created_request_identity_variant = response.json()['results'][0]
         self.assertEqual(created_request_identity_variant['label'], self.request_identity_variant1.label)
         self.assertEqual(created_request_identity_variant['context'], self.request_identity_variant1.context)       
 
@@ -1171,8 +1325,8 @@ class RequestsReceiveTests(APITestCase):
         response = self.client.get(self.request_receive_request_identity_variant_list_url(1))
         # response should empty list, since there is no resources to show that user 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertIsInstance(response.json(), list)
-        self.assertEqual(len(response.json()), 0)
+        self.assertIsInstance(response.json()['results'], list)
+        self.assertEqual(len(response.json()['results']), 0)
 
     # stranger cannot see users request identity variants for received requests
     def test_stranger_cannot_see_users_request_identity_variants_for_received_requests(self):
@@ -1591,14 +1745,2054 @@ class RequestsReceiveTests(APITestCase):
         self.client.patch(self.request_receive_request_identity_variant_detail_url(1, 1), {'link_to_id_profile_identity_variant': 1})
         # get the link data that sender sees 
         response = self.client.get(self.request_receive_request_identity_variant_list_url(1))
-        shared_variant = response.json()[0].get('user_provided_variant')
+        shared_variant = response.json()['results'][0].get('user_provided_variant')
         self.assertEqual(shared_variant, self.profile_identity_variant1.variant)
         # now deny the request, data should be wiped and no longer shared 
         self.client.put(self.request_receive_deny_url(1))
         response = self.client.get(self.request_receive_request_identity_variant_list_url(1))
-        cleaned_variant = response.json()[0].get('user_provided_variant')
+        cleaned_variant = response.json()['results'][0].get('user_provided_variant')
         # now cleaned variant shoud be different then shared variant, just by denying the request
         self.assertNotEqual(shared_variant, cleaned_variant)
         # and shared cleaned_variant shoud be None
         self.assertIsNone(cleaned_variant)
-        # that means that just deying the request, destroy the link to users private information 
\ No newline at end of file
+        # that means that just deying the request, destroy the link to users private information 
+    # user can accept many received requests in one call
+    def test_user_can_bulk_accept_received_requests(self):
+        request2 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Second request.')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk, request2.pk], 'status': 'accepted'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # every id has result in the same order it was sent
+        self.assertEqual(response.json()['results'], [
+            {'id': self.request1.pk, 'updated': True, 'status': 'accepted'},
+            {'id': request2.pk, 'updated': True, 'status': 'accepted'},
+        ])
+        self.assertEqual(Request.objects.filter(receiver=self.user2, status=Request.Status.ACCEPTED).count(), 2)
+
+    # bulk deny wipes links of denied requests
+    def test_bulk_deny_wipes_links_of_denied_requests(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        self.request_identity_variant1.profile_link = self.profile_identity_variant1
+        self.request_identity_variant1.save()
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk], 'status': 'denied'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.request1.refresh_from_db()
+        self.request_identity_variant1.refresh_from_db()
+        self.assertEqual(self.request1.status, Request.Status.DENIED)
+        self.assertIsNone(self.request_identity_variant1.profile_link)
+
+    # ids of requests user did not receive are reported as not found and stay untouched
+    def test_user_cannot_bulk_change_status_of_other_users_requests(self):
+        # request from user2 to user3, user2 is sender not receiver
+        request_sent = Request.objects.create(sender=self.user2, receiver=self.user3, request_reasoning='Not received by user2.')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk, request_sent.pk, 999], 'status': 'accepted'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertTrue(results[0]['updated'])
+        self.assertFalse(results[1]['updated'])
+        self.assertFalse(results[2]['updated'])
+        request_sent.refresh_from_db()
+        self.assertEqual(request_sent.status, Request.Status.PENDING)
+
+    # status has to be accepted or denied
+    def test_bulk_status_rejects_invalid_status(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk], 'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.request_receive_bulk_status_url, {'ids': [], 'status': 'accepted'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # stranger cannot bulk change status
+    def test_stranger_cannot_bulk_change_status_of_users_requests(self):
+        response = self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk], 'status': 'accepted'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # bulk status runs the same number of queries, no matter how many requests are changed
+    def test_bulk_status_query_count_does_not_grow_with_ids(self):
+        request_ids = [Request.objects.create(sender=self.user, receiver=self.user2).pk for _ in range(20)]
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as one_request_queries:
+            self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk], 'status': 'denied'}, format='json')
+        with CaptureQueriesContext(connection) as many_requests_queries:
+            self.client.post(self.request_receive_bulk_status_url, {'ids': request_ids, 'status': 'denied'}, format='json')
+        self.assertEqual(len(one_request_queries), len(many_requests_queries))
+
+    # user can link many request identity variants with their profile identity variants in one call
+    def test_user_can_bulk_link_request_identity_variants_for_accepted_request(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        request_identity_variant2 = RequestIdentityVariant.objects.create(request=self.request1, label='Last Name')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {
+            str(self.request_identity_variant1.pk): self.profile_identity_variant1.pk,
+            str(request_identity_variant2.pk): self.profile_identity_variant2.pk,
+        }}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        shared_variants = {variant['id']: variant['user_provided_variant'] for variant in response.json()}
+        self.assertEqual(shared_variants[self.request_identity_variant1.pk], self.profile_identity_variant1.variant)
+        self.assertEqual(shared_variants[request_identity_variant2.pk], self.profile_identity_variant2.variant)
+        self.request_identity_variant1.refresh_from_db()
+        request_identity_variant2.refresh_from_db()
+        self.assertEqual(self.request_identity_variant1.profile_link, self.profile_identity_variant1)
+        self.assertEqual(request_identity_variant2.profile_link, self.profile_identity_variant2)
+
+    # null removes the link
+    def test_user_can_bulk_unlink_request_identity_variants(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        self.request_identity_variant1.profile_link = self.profile_identity_variant1
+        self.request_identity_variant1.save()
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {str(self.request_identity_variant1.pk): None}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.request_identity_variant1.refresh_from_db()
+        self.assertIsNone(self.request_identity_variant1.profile_link)
+
+    # user can not link profile identity variant of other user
+    def test_user_cannot_bulk_link_other_users_profile_identity_variants(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        other_user_profile_identity_variant = ProfileIdentityVariant.objects.create(user=self.user3, label='First Name', variant='Ezma')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {str(self.request_identity_variant1.pk): other_user_profile_identity_variant.pk}}, format='json')
+        # response should be 400 Bad Request and nothing linked
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('profile_identity_variants', response.json())
+        self.request_identity_variant1.refresh_from_db()
+        self.assertIsNone(self.request_identity_variant1.profile_link)
+
+    # user can not link variants that are not part of the request
+    def test_user_cannot_bulk_link_request_identity_variants_of_other_request(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        other_request = Request.objects.create(sender=self.user, receiver=self.user2, status=Request.Status.ACCEPTED)
+        other_request_identity_variant = RequestIdentityVariant.objects.create(request=other_request, label='First Name')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {
+            str(self.request_identity_variant1.pk): self.profile_identity_variant1.pk,
+            str(other_request_identity_variant.pk): self.profile_identity_variant1.pk,
+        }}, format='json')
+        # response should be 400 Bad Request, and none of the links are written
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('request_identity_variants', response.json())
+        self.request_identity_variant1.refresh_from_db()
+        self.assertIsNone(self.request_identity_variant1.profile_link)
+
+    # user can not bulk link for pending request
+    def test_user_cannot_bulk_link_request_identity_variants_for_pending_request(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {str(self.request_identity_variant1.pk): self.profile_identity_variant1.pk}}, format='json')
+        # response should be 403 Forbidden, as the request is pending
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    # other user can not bulk link users request identity variants
+    def test_user_cannot_bulk_link_other_users_request_identity_variants(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        self.client.login(username=self.valid_username3, password=self.valid_password3)
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {str(self.request_identity_variant1.pk): self.profile_identity_variant1.pk}}, format='json')
+        # response should be 404 Not Found, as user3 is not receiver of this request
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    # stranger can not bulk link
+    def test_stranger_cannot_bulk_link_users_request_identity_variants(self):
+        response = self.client.post(self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk), {'links': {str(self.request_identity_variant1.pk): self.profile_identity_variant1.pk}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # bulk link runs the same number of queries, no matter how many variants are linked
+    def test_bulk_link_query_count_does_not_grow_with_variants(self):
+        self.request1.status = Request.Status.ACCEPTED
+        self.request1.save()
+        variant_ids = [RequestIdentityVariant.objects.create(request=self.request1, label=f'Label {i}').pk for i in range(20)]
+        self.client.force_authenticate(user=self.user2)
+        url = self.request_receive_request_identity_variant_bulk_link_url(self.request1.pk)
+        with CaptureQueriesContext(connection) as one_link_queries:
+            self.client.post(url, {'links': {str(self.request_identity_variant1.pk): self.profile_identity_variant1.pk}}, format='json')
+        with CaptureQueriesContext(connection) as many_links_queries:
+            self.client.post(url, {'links': {str(variant_id): self.profile_identity_variant2.pk for variant_id in variant_ids}}, format='json')
+        self.assertEqual(len(one_link_queries), len(many_links_queries))
+
+    # user can not link request identity variant with profile identity variant of other user
+    def test_user_cannot_link_request_identity_variant_with_other_users_profile_identity_variant(self):
+        other_user_profile_identity_variant = ProfileIdentityVariant.objects.create(user=self.user3, label='First Name', variant='Ezma')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        self.client.put(self.request_receive_accept_url(1))
+        response = self.client.patch(self.request_receive_request_identity_variant_detail_url(1, 1), {'link_to_id_profile_identity_variant': other_user_profile_identity_variant.pk})
+        # response should be 400 Bad Request, other users variant does not exist for this user
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('link_to_id_profile_identity_variant', response.json())
+        self.request_identity_variant1.refresh_from_db()
+        self.assertIsNone(self.request_identity_variant1.profile_link)
+
+    # browsable API offers only users own profile identity variants to link
+    def test_browsable_api_link_choices_are_only_users_profile_identity_variants(self):
+        ProfileIdentityVariant.objects.create(user=self.user3, label='Secret label', variant='Ezma secret')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        self.client.put(self.request_receive_accept_url(1))
+        response = self.client.get(self.request_receive_request_identity_variant_detail_url(1, 1), HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, self.profile_identity_variant1.variant)
+        self.assertNotContains(response, 'Ezma secret')
+
+
+## PAGINATION ##
+class PaginationTests(APITestCase):
+    def setUp(self):
+        # sender and receiver of many requests
+        self.valid_username1 = 'Johny'
+        self.valid_password1 = 'test123123'
+        self.user = User.objects.create_user(
+            username=self.valid_username1,
+            email='johny@example.com',
+            password=self.valid_password1,
+        )
+        self.valid_username2 = 'Michael'
+        self.valid_password2 = 'test123123'
+        self.user2 = User.objects.create_user(
+            username=self.valid_username2,
+            email='michael@example.com',
+            password=self.valid_password2,
+        )
+
+        # create 7 requests from user1 to user2 and 7 profile identity variants for user2
+        for i in range(7):
+            Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning=f'Request {i}')
+            ProfileIdentityVariant.objects.create(user=self.user2, label=f'Label {i}', variant=f'Variant {i}')
+
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+        self.profile_identity_variant_list_create_url = reverse('api-profile-identity-variant-list-create')
+
+    # helper that walks over all pages following next cursor, and returns ids in order they were returned
+    def collect_ids(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(item['id'] for item in response.json()['results'])
+            url = response.json()['next']
+        return ids
+
+    # list response has next and previous cursors and results
+    def test_list_response_has_cursors_and_results(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.get(self.request_receive_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('next', response.json())
+        self.assertIn('previous', response.json())
+        self.assertIn('results', response.json())
+        # default page size is bigger than 7, so everything fits on one page
+        self.assertEqual(len(response.json()['results']), 7)
+        self.assertIsNone(response.json()['next'])
+        self.assertIsNone(response.json()['previous'])
+
+    # limit query parameter overrides page size
+    def test_limit_overrides_page_size(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.get(self.request_receive_list_url, {'limit': 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['results']), 3)
+        self.assertIsNotNone(response.json()['next'])
+        self.assertIsNone(response.json()['previous'])
+
+    # following next cursors returns every received request once, newest first
+    def test_received_requests_pages_cover_all_requests_newest_first(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        ids = self.collect_ids(self.request_receive_list_url + '?limit=3')
+        expected_ids = list(Request.objects.filter(receiver=self.user2).order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected_ids)
+
+    # following next cursors returns every sent request once
+    def test_sent_requests_pages_cover_all_requests(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        ids = self.collect_ids(self.request_send_list_create_url + '?limit=2')
+        self.assertEqual(sorted(ids), sorted(Request.objects.filter(sender=self.user).values_list('id', flat=True)))
+        self.assertEqual(len(ids), len(set(ids)))
+
+    # profile identity variants are paginated in id order
+    def test_profile_identity_variants_pages_are_in_id_order(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        ids = self.collect_ids(self.profile_identity_variant_list_create_url + '?limit=3')
+        self.assertEqual(ids, list(ProfileIdentityVariant.objects.filter(user=self.user2).order_by('id').values_list('id', flat=True)))
+
+    # previous cursor goes back to the page before
+    def test_previous_cursor_returns_previous_page(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        first_page = self.client.get(self.request_receive_list_url, {'limit': 3}).json()
+        second_page = self.client.get(first_page['next']).json()
+        self.assertIsNotNone(second_page['previous'])
+        back_page = self.client.get(second_page['previous']).json()
+        self.assertEqual(back_page['results'], first_page['results'])
+
+    # later page runs the same number of queries as the first page
+    def test_deep_page_costs_the_same_as_first_page(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        first_url = self.request_receive_list_url + '?limit=2'
+        # warm up session lookups
+        self.client.get(first_url)
+        with CaptureQueriesContext(connection) as first_queries:
+            first_page = self.client.get(first_url).json()
+        second_page = self.client.get(first_page['next']).json()
+        with CaptureQueriesContext(connection) as deep_queries:
+            self.client.get(second_page['next'])
+        self.assertEqual(len(first_queries), len(deep_queries))
+
+    # invalid cursor is rejected
+    def test_invalid_cursor_returns_not_found(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.get(self.request_receive_list_url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+## INDEXES ##
+class ExplainListQueriesCommandTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        request_instance = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        RequestIdentityVariant.objects.create(request=request_instance, label='First Name')
+
+    # command prints plan for every list view
+    def test_command_prints_plan_for_every_list_view(self):
+        out = StringIO()
+        call_command('explain_list_queries', 'Michael', stdout=out)
+        output = out.getvalue()
+        for view_name in ['ProfileIdentityVariantListCreateAPIView', 'RequestSendListCreateAPIView', 'RequestSendRequestIdentityVariantListCreateAPIView',
+                          'RequestReceiveListAPIView', 'RequestReceiveRequestIdentityVariantListAPIView', 'ProfileIdentityVariantListView',
+                          'RequestSendListView', 'RequestReceiveListView']:
+            self.assertIn(view_name, output)
+
+    # receive list is served by the receiver / created_at index on SQLite
+    def test_receive_list_uses_receiver_created_at_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('plan format checked only for SQLite')
+        out = StringIO()
+        call_command('explain_list_queries', 'Michael', stdout=out)
+        receive_plan = out.getvalue().split('RequestReceiveListAPIView')[1]
+        self.assertIn('request_receiver_created_idx', receive_plan)
+
+    # command fails for username that does not exist
+    def test_command_fails_for_unknown_username(self):
+        with self.assertRaises(CommandError):
+            call_command('explain_list_queries', 'Nobody', stdout=StringIO())
+
+
+## QUERY COUNT ##
+class RequestIdentityVariantDetailQueryCountTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        # accepted request with one variant linked to receivers profile variant
+        self.request1 = Request.objects.create(
+            sender=self.user,
+            receiver=self.user2,
+            request_reasoning='Dental office data request.',
+            status=Request.Status.ACCEPTED,
+        )
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+        self.profile_identity_variant2 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michał')
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(
+            request=self.request1,
+            label='First Name',
+            context='First name in Polish language.',
+            profile_link=self.profile_identity_variant1,
+        )
+        self.request_send_request_identity_variant_detail_url = reverse('api-request-send-request-identity-variant-detail', args=[self.request1.pk, self.request_identity_variant1.pk])
+        self.request_receive_request_identity_variant_detail_url = reverse('api-request-receive-request-identity-variant-detail', args=[self.request1.pk, self.request_identity_variant1.pk])
+
+    # sender variant detail GET is ETag aggregate and a single object query, permission check does not fetch parent Request or User
+    def test_sender_variant_detail_get_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.request_send_request_identity_variant_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['user_provided_variant'], self.profile_identity_variant1.variant)
+
+    # sender variant detail PUT is a select and an update
+    def test_sender_variant_detail_put_query_count(self):
+        self.client.force_authenticate(user=self.user)
+        with self.assertNumQueries(2):
+            response = self.client.put(self.request_send_request_identity_variant_detail_url, {'label': 'Last Name', 'context': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['label'], 'Last Name')
+
+    # receiver variant detail GET is ETag aggregate and a single object query, also for the accepted status check
+    def test_receiver_variant_detail_get_query_count(self):
+        self.client.force_authenticate(user=self.user2)
+        with self.assertNumQueries(2):
+            response = self.client.get(self.request_receive_request_identity_variant_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # receiver variant detail PUT is a select, profile link lookup and an update
+    def test_receiver_variant_detail_put_query_count(self):
+        self.client.force_authenticate(user=self.user2)
+        with self.assertNumQueries(3):
+            response = self.client.put(self.request_receive_request_identity_variant_detail_url, {'link_to_id_profile_identity_variant': self.profile_identity_variant2.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['user_provided_variant'], self.profile_identity_variant2.variant)
+
+
+## CONDITIONAL GET ##
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='First Name')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.request_send_detail_url = lambda pk: reverse('api-request-send-detail', args=[pk])
+        self.profile_identity_variant_list_create_url = reverse('api-profile-identity-variant-list-create')
+        self.request_receive_bulk_status_url = reverse('api-request-receive-bulk-status')
+
+    # GET response has ETag, no Last-Modified
+    def test_response_has_etag(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('ETag', response)
+        self.assertNotIn('Last-Modified', response)
+
+    # same ETag returns 304 Not Modified with only the aggregate query
+    def test_matching_etag_returns_not_modified_without_serializing(self):
+        self.client.force_authenticate(user=self.user2)
+        etag = self.client.get(self.request_receive_list_url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.request_receive_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    # If-Modified-Since alone never gives 304, a deleted row does not make anything newer
+    def test_if_modified_since_after_delete_returns_list(self):
+        request2 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Second request.')
+        self.client.force_authenticate(user=self.user2)
+        self.client.get(self.request_receive_list_url)
+        request2.delete()
+        response = self.client.get(self.request_receive_list_url, HTTP_IF_MODIFIED_SINCE=http_date())
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([request_data['id'] for request_data in response.json()['results']], [self.request1.pk])
+
+    # new received request changes the ETag
+    def test_new_request_changes_etag(self):
+        self.client.force_authenticate(user=self.user2)
+        etag = self.client.get(self.request_receive_list_url)['ETag']
+        Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Second request.')
+        response = self.client.get(self.request_receive_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    # status change through bulk update changes the ETag, even though update() skips auto_now
+    def test_bulk_status_change_changes_etag(self):
+        self.client.force_authenticate(user=self.user2)
+        etag = self.client.get(self.request_receive_list_url)['ETag']
+        self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk], 'status': 'accepted'}, format='json')
+        response = self.client.get(self.request_receive_list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # deleted profile identity variant changes the ETag
+    def test_deleted_row_changes_etag(self):
+        ProfileIdentityVariant.objects.create(user=self.user2, label='Last Name', variant='Kowalski')
+        self.client.force_authenticate(user=self.user2)
+        etag = self.client.get(self.profile_identity_variant_list_create_url)['ETag']
+        self.profile_identity_variant1.delete()
+        response = self.client.get(self.profile_identity_variant_list_create_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    # changes in nested variants and their linked profile variant change detail ETag
+    def test_nested_rows_change_detail_etag(self):
+        self.client.force_authenticate(user=self.user)
+        url = self.request_send_detail_url(self.request1.pk)
+        etag = self.client.get(url)['ETag']
+        # link variant, sender sees shared variant in nested list
+        self.request_identity_variant1.profile_link = self.profile_identity_variant1
+        self.request_identity_variant1.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+        # receiver edits their profile variant, shared value changes for sender
+        self.profile_identity_variant1.variant = 'Michał'
+        self.profile_identity_variant1.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['request_identity_variants'][0]['user_provided_variant'], 'Michał')
+
+    # ETag is different for every page
+    def test_etag_is_different_for_every_page(self):
+        Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Second request.')
+        self.client.force_authenticate(user=self.user2)
+        first_page = self.client.get(self.request_receive_list_url, {'limit': 1})
+        second_page = self.client.get(first_page.json()['next'], HTTP_IF_NONE_MATCH=first_page['ETag'])
+        self.assertEqual(second_page.status_code, status.HTTP_200_OK)
+
+    # ETag of other user does not give 304 for a request that does not exist for this user
+    def test_detail_of_other_users_request_is_still_not_found(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.request_send_detail_url(self.request1.pk))['ETag']
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_send_detail_url(self.request1.pk), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+## DELTA SYNC ##
+class ChangesTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.request2 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Gym data request.')
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='First Name')
+        self.request_identity_variant2 = RequestIdentityVariant.objects.create(request=self.request1, label='Last Name')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+
+        self.changes_url = reverse('api-changes')
+        self.request_send_detail_url = lambda pk: reverse('api-request-send-detail', args=[pk])
+        self.request_receive_accept_url = lambda pk: reverse('api-request-receive-accept', args=[pk])
+
+    # sync token for changes after now, rows written so far are made older than the clock skew the token allows for
+    def get_sync_token(self, user):
+        written_before = timezone.now() - 2 * settings.SYNC_CLOCK_SKEW
+        for model in [Request, RequestIdentityVariant, ProfileIdentityVariant]:
+            model.objects.update(updated_at=written_before)
+        Tombstone.objects.update(deleted_at=written_before)
+        self.client.force_authenticate(user=user)
+        return self.client.get(self.changes_url).json()['sync_token']
+
+    # without since all current rows of the user are returned
+    def test_full_sync_returns_all_rows(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.changes_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertIn('sync_token', data)
+        self.assertEqual(data['requests_sent'], [])
+        self.assertEqual({item['id'] for item in data['requests_received']}, {self.request1.pk, self.request2.pk})
+        self.assertEqual({item['id'] for item in data['request_identity_variants']}, {self.request_identity_variant1.pk, self.request_identity_variant2.pk})
+        self.assertEqual(data['deleted'], {'requests': [], 'request_identity_variants': []})
+
+    # nothing changed after sync token, response is empty
+    def test_no_changes_after_sync_token(self):
+        sync_token = self.get_sync_token(self.user2)
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['requests_received'], [])
+        self.assertEqual(data['request_identity_variants'], [])
+        self.assertNotEqual(data['sync_token'], sync_token)
+
+    # new request is in receivers and senders changes, not in other users
+    def test_created_request_is_returned(self):
+        sync_token = self.get_sync_token(self.user2)
+        request3 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Bank data request.')
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual([item['id'] for item in response.json()['requests_received']], [request3.pk])
+        self.client.force_authenticate(user=self.user3)
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual(response.json()['requests_sent'], [])
+        self.assertEqual(response.json()['requests_received'], [])
+
+    # status change by receiver is in senders changes
+    def test_status_change_is_returned_to_sender(self):
+        sync_token = self.get_sync_token(self.user)
+        self.client.force_authenticate(user=self.user2)
+        self.client.put(self.request_receive_accept_url(self.request1.pk))
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        requests_sent = response.json()['requests_sent']
+        self.assertEqual(len(requests_sent), 1)
+        self.assertEqual(requests_sent[0]['status'], Request.Status.ACCEPTED)
+
+    # change of linked profile variant changes shared value of request identity variant
+    def test_linked_profile_variant_change_is_returned(self):
+        self.request_identity_variant1.profile_link = self.profile_identity_variant1
+        self.request_identity_variant1.save()
+        sync_token = self.get_sync_token(self.user)
+        self.profile_identity_variant1.variant = 'Michał'
+        self.profile_identity_variant1.save()
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        request_identity_variants = response.json()['request_identity_variants']
+        self.assertEqual(len(request_identity_variants), 1)
+        self.assertEqual(request_identity_variants[0]['request_id'], self.request1.pk)
+        self.assertEqual(request_identity_variants[0]['user_provided_variant'], 'Michał')
+
+    # deleting linked profile variant unlinks request identity variant, that is a change too
+    def test_deleted_linked_profile_variant_is_returned(self):
+        self.request_identity_variant1.profile_link = self.profile_identity_variant1
+        self.request_identity_variant1.save()
+        sync_token = self.get_sync_token(self.user)
+        self.profile_identity_variant1.delete()
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        request_identity_variants = response.json()['request_identity_variants']
+        self.assertEqual([item['id'] for item in request_identity_variants], [self.request_identity_variant1.pk])
+        self.assertIsNone(request_identity_variants[0]['user_provided_variant'])
+
+    # deleted request is returned as tombstone to sender and receiver, with its variants
+    def test_deleted_request_is_returned_as_tombstone(self):
+        sync_token = self.get_sync_token(self.user)
+        self.client.delete(self.request_send_detail_url(self.request1.pk))
+        self.assertTrue(Tombstone.objects.filter(object_type=Tombstone.ObjectType.REQUEST, object_id=self.request1.pk).exists())
+        for user in [self.user, self.user2]:
+            self.client.force_authenticate(user=user)
+            deleted = self.client.get(self.changes_url, {'since': sync_token}).json()['deleted']
+            self.assertEqual(deleted['requests'], [self.request1.pk])
+        # other users do not see it
+        self.client.force_authenticate(user=self.user3)
+        deleted = self.client.get(self.changes_url, {'since': sync_token}).json()['deleted']
+        self.assertEqual(deleted['requests'], [])
+
+    # deleted request identity variant is returned as tombstone
+    def test_deleted_request_identity_variant_is_returned_as_tombstone(self):
+        sync_token = self.get_sync_token(self.user2)
+        request_identity_variant_id = self.request_identity_variant1.pk
+        self.request_identity_variant1.delete()
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual(response.json()['deleted']['request_identity_variants'], [request_identity_variant_id])
+        self.client.force_authenticate(user=self.user3)
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual(response.json()['deleted']['request_identity_variants'], [])
+
+    # tombstones older than the token are not returned
+    def test_tombstones_before_sync_token_are_not_returned(self):
+        self.request_identity_variant1.delete()
+        sync_token = self.get_sync_token(self.user2)
+        response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual(response.json()['deleted']['request_identity_variants'], [])
+
+    # row stamped before the sync read but committed after it is returned next time
+    def test_row_committed_after_sync_read_is_returned(self):
+        sync_token = self.get_sync_token(self.user2)
+        # updated_at is taken before commit, so a slow transaction makes the row visible with an older time
+        stamped_before_read = timezone.now() - settings.SYNC_CLOCK_SKEW / 2
+        Request.objects.filter(pk=self.request1.pk).update(status=Request.Status.ACCEPTED, updated_at=stamped_before_read)
+        request_identity_variant_id = self.request_identity_variant1.pk
+        self.request_identity_variant1.delete()
+        Tombstone.objects.update(deleted_at=stamped_before_read)
+        data = self.client.get(self.changes_url, {'since': sync_token}).json()
+        self.assertEqual([(item['id'], item['status']) for item in data['requests_received']], [(self.request1.pk, Request.Status.ACCEPTED)])
+        self.assertEqual(data['deleted']['request_identity_variants'], [request_identity_variant_id])
+
+    # changes are read with a fixed number of queries, however many rows changed
+    def test_changes_query_count_does_not_depend_on_row_count(self):
+        sync_token = self.get_sync_token(self.user2)
+        for i in range(5):
+            request_instance = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning=f'Request {i}.')
+            RequestIdentityVariant.objects.create(request=request_instance, label='First Name', profile_link=self.profile_identity_variant1)
+        request2_id = self.request2.pk
+        self.request2.delete()
+        # tombstones, sent, received and variants
+        with self.assertNumQueries(4):
+            response = self.client.get(self.changes_url, {'since': sync_token})
+        self.assertEqual(len(response.json()['requests_received']), 5)
+        self.assertEqual(len(response.json()['request_identity_variants']), 5)
+        self.assertEqual(response.json()['deleted']['requests'], [request2_id])
+
+    # invalid token is a validation error
+    def test_invalid_sync_token(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.changes_url, {'since': 'not-a-token'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # token older than tombstone retention needs a full sync
+    def test_expired_sync_token(self):
+        self.client.force_authenticate(user=self.user2)
+        old_time = timezone.now() - timedelta(days=365)
+        response = self.client.get(self.changes_url, {'since': SyncTokenField().to_representation(old_time)})
+        self.assertEqual(response.status_code, status.HTTP_410_GONE)
+
+    # prune command deletes only old tombstones
+    def test_prune_tombstones_command(self):
+        old_variant_id, new_variant_id = self.request_identity_variant1.pk, self.request_identity_variant2.pk
+        self.request_identity_variant1.delete()
+        self.request_identity_variant2.delete()
+        Tombstone.objects.filter(object_id=old_variant_id).update(deleted_at=timezone.now() - timedelta(days=365))
+        call_command('prune_tombstones', stdout=StringIO())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [new_variant_id])
+
+    # not logged in user can not sync
+    def test_unauthenticated_user_can_not_get_changes(self):
+        response = self.client.get(self.changes_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+## REQUEST EVENT STREAM ##
+class InProcessEventBrokerTests(APITestCase):
+    # event published from another thread reaches the users subscription
+    async def test_published_event_reaches_subscription(self):
+        broker = InProcessEventBroker()
+        subscription = broker.subscribe(1)
+        thread = threading.Thread(target=broker.publish, args=(1, {'type': 'request.created'}))
+        thread.start()
+        thread.join()
+        event = await asyncio.wait_for(subscription.get(), timeout=1)
+        self.assertEqual(event, {'type': 'request.created'})
+        subscription.close()
+
+    # other users events are not delivered
+    async def test_other_users_event_is_not_delivered(self):
+        broker = InProcessEventBroker()
+        subscription = broker.subscribe(1)
+        broker.publish(2, {'type': 'request.created'})
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(subscription.get(), timeout=0.1)
+        subscription.close()
+
+    # closed subscription is removed from broker
+    async def test_closed_subscription_is_removed(self):
+        broker = InProcessEventBroker()
+        subscription = broker.subscribe(1)
+        subscription.close()
+        self.assertEqual(broker._subscriptions, {})
+
+    # slow subscriber does not grow the queue without limit
+    async def test_full_queue_drops_new_events(self):
+        broker = InProcessEventBroker()
+        broker.queue_size = 2
+        subscription = broker.subscribe(1)
+        for i in range(5):
+            broker.publish(1, {'type': 'request.created', 'i': i})
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.queue.qsize(), 2)
+        subscription.close()
+
+
+class RequestEventPublishTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+        self.request_send_detail_url = lambda pk: reverse('api-request-send-detail', args=[pk])
+        self.request_receive_accept_url = lambda pk: reverse('api-request-receive-accept', args=[pk])
+        self.request_receive_deny_url = lambda pk: reverse('api-request-receive-deny', args=[pk])
+        self.request_receive_bulk_status_url = reverse('api-request-receive-bulk-status')
+
+    # (user id, event type, request id) of every published event
+    def published_events(self, publish):
+        return [(args[0], args[1]['type'], args[1]['request']['id']) for args, _ in publish.call_args_list]
+
+    # created request is published to its receiver after commit
+    def test_created_request_is_published_to_receiver(self):
+        self.client.force_authenticate(user=self.user)
+        with patch.object(get_event_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.request_send_list_create_url, {'receiver_username': 'Michael', 'request_reasoning': 'Gym data request.'}, format='json')
+        self.assertEqual(self.published_events(publish), [(self.user2.id, 'request.created', response.json()['id'])])
+
+    # accepted and denied request is published to its sender
+    def test_status_change_is_published_to_sender(self):
+        self.client.force_authenticate(user=self.user2)
+        with patch.object(get_event_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.request_receive_accept_url(self.request1.pk))
+            self.client.put(self.request_receive_deny_url(self.request1.pk))
+        self.assertEqual(self.published_events(publish), [
+            (self.user.id, 'request.status_changed', self.request1.pk),
+            (self.user.id, 'request.status_changed', self.request1.pk),
+        ])
+        self.assertEqual(publish.call_args_list[-1][0][1]['request']['status'], Request.Status.DENIED)
+
+    # saving request without status change does not publish
+    def test_update_without_status_change_is_not_published(self):
+        self.client.force_authenticate(user=self.user)
+        with patch.object(get_event_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(self.request_send_detail_url(self.request1.pk), {'request_reasoning': 'Changed.'}, format='json')
+        publish.assert_not_called()
+
+    # bulk status change publishes every changed request, update() does not send signals
+    def test_bulk_status_change_is_published_to_senders(self):
+        request2 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Gym data request.')
+        self.client.force_authenticate(user=self.user2)
+        with patch.object(get_event_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk, request2.pk], 'status': 'accepted'}, format='json')
+        self.assertEqual(sorted(self.published_events(publish)), [
+            (self.user.id, 'request.status_changed', self.request1.pk),
+            (self.user.id, 'request.status_changed', request2.pk),
+        ])
+
+
+class RequestEventStreamTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request_event_stream_url = reverse('api-request-event-stream')
+
+    # stream sends events published for the user, authenticated with JWT
+    async def test_stream_sends_users_events(self):
+        access_token = str(RefreshToken.for_user(self.user2).access_token)
+        response = await self.async_client.get(self.request_event_stream_url, headers={'Authorization': f'Bearer {access_token}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = response.streaming_content
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+
+        event = {'type': 'request.created', 'request': {'id': 1}}
+        await sync_to_async(get_event_broker().publish)(self.user2.id, event)
+        chunk = await asyncio.wait_for(anext(events), timeout=1)
+        self.assertEqual(chunk, f"event: request.created\ndata: {json.dumps(event)}\n\n".encode())
+        await events.aclose()
+
+    # not logged in user can not open the stream
+    async def test_unauthenticated_user_can_not_open_stream(self):
+        response = await self.async_client.get(self.request_event_stream_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+## ASYNC READ-ONLY VIEWS ##
+class AsyncReadOnlyViewsTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.request2 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Gym data request.')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+        self.profile_identity_variant2 = ProfileIdentityVariant.objects.create(user=self.user2, label='Last Name', variant='Kowalski')
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='First Name', profile_link=self.profile_identity_variant1)
+        self.request_identity_variant2 = RequestIdentityVariant.objects.create(request=self.request1, label='Last Name')
+
+        self.auth_headers = lambda user: {'Authorization': f'Bearer {RefreshToken.for_user(user).access_token}'}
+
+    # GET async view, with JWT of given user if any
+    def async_get(self, url, user=None, data=None):
+        headers = self.auth_headers(user) if user is not None else {}
+        async def get():
+            return await self.async_client.get(url, data, headers=headers)
+        return async_to_sync(get)()
+
+    # async view returns same data as sync view
+    def assert_same_as_sync(self, sync_url_name, async_url_name, args=None, data=None):
+        self.client.force_authenticate(user=self.user2)
+        sync_response = self.client.get(reverse(sync_url_name, args=args), data)
+        async_response = self.async_get(reverse(async_url_name, args=args), self.user2, data)
+        self.assertEqual(async_response.status_code, status.HTTP_200_OK)
+        # pagination links point to own URL, compare the rest
+        sync_data, async_data = sync_response.json(), async_response.json()
+        for key in ['next', 'previous']:
+            if isinstance(sync_data, dict) and key in sync_data:
+                self.assertEqual(sync_data.pop(key) is None, async_data.pop(key) is None)
+        self.assertEqual(async_data, sync_data)
+
+    # async profile identity variant list is the same as sync one
+    def test_async_profile_identity_variant_list(self):
+        self.assert_same_as_sync('api-profile-identity-variant-list-create', 'api-async-profile-identity-variant-list')
+
+    # async received request list is the same as sync one
+    def test_async_request_receive_list(self):
+        self.assert_same_as_sync('api-request-receive-list', 'api-async-request-receive-list')
+
+    # async received request detail is the same as sync one, with nested variants
+    def test_async_request_receive_detail(self):
+        self.assert_same_as_sync('api-request-receive-detail', 'api-async-request-receive-detail', args=[self.request1.pk])
+
+    # async request identity variant list is the same as sync one
+    def test_async_request_receive_request_identity_variant_list(self):
+        self.assert_same_as_sync('api-request-receive-request-identity-variant-list', 'api-async-request-receive-request-identity-variant-list', args=[self.request1.pk])
+
+    # async list pages with cursor the same way as sync list
+    def test_async_list_cursor_pagination(self):
+        async_response = self.async_get(reverse('api-async-request-receive-list'), self.user2, {'limit': 1})
+        first_page = async_response.json()
+        self.assertEqual([item['id'] for item in first_page['results']], [self.request2.pk])
+        self.assertIsNone(first_page['previous'])
+        second_page = self.async_get(first_page['next'], self.user2).json()
+        self.assertEqual([item['id'] for item in second_page['results']], [self.request1.pk])
+        self.assertIsNone(second_page['next'])
+        back_page = self.async_get(second_page['previous'], self.user2).json()
+        self.assertEqual([item['id'] for item in back_page['results']], [self.request2.pk])
+
+    # user can not see received request of other user
+    def test_async_request_receive_detail_of_other_user_is_not_found(self):
+        response = self.async_get(reverse('api-async-request-receive-detail', args=[self.request1.pk]), self.user)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    # user only sees own profile identity variants
+    def test_async_profile_identity_variant_list_of_other_user_is_empty(self):
+        response = self.async_get(reverse('api-async-profile-identity-variant-list'), self.user3)
+        self.assertEqual(response.json()['results'], [])
+
+    # not logged in user gets 401
+    def test_async_views_require_authentication(self):
+        response = self.async_get(reverse('api-async-request-receive-list'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # async view answers errors with the same status, body and WWW-Authenticate as sync view
+    def assert_same_error_as_sync(self, sync_url_name, async_url_name, data=None, headers=None):
+        sync_response = self.client.get(reverse(sync_url_name), data, headers=headers)
+        async def get():
+            return await self.async_client.get(reverse(async_url_name), data, headers=headers)
+        async_response = async_to_sync(get)()
+        self.assertGreaterEqual(async_response.status_code, 400)
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.json(), sync_response.json())
+        self.assertEqual(async_response.get('WWW-Authenticate'), sync_response.get('WWW-Authenticate'))
+
+    # invalid filter and unknown sparse field are field errors, not nested under detail
+    def test_async_validation_errors_are_same_as_sync(self):
+        headers = self.auth_headers(self.user2)
+        self.assert_same_error_as_sync('api-request-receive-list', 'api-async-request-receive-list', {'created_after': 'garbage'}, headers)
+        self.assert_same_error_as_sync('api-request-receive-list', 'api-async-request-receive-list', {'fields': 'nope'}, headers)
+
+    # missing and invalid credentials give the same 401 as sync view
+    def test_async_authentication_errors_are_same_as_sync(self):
+        self.assert_same_error_as_sync('api-request-receive-list', 'api-async-request-receive-list')
+        self.assert_same_error_as_sync('api-request-receive-list', 'api-async-request-receive-list', headers={'Authorization': 'Bearer not-a-token'})
+
+    # detail with nested variants is read with fixed number of queries: user, request, variants
+    def test_async_request_receive_detail_query_count(self):
+        RequestIdentityVariant.objects.create(request=self.request1, label='Email', profile_link=self.profile_identity_variant2)
+        with self.assertNumQueries(3):
+            response = self.async_get(reverse('api-async-request-receive-detail', args=[self.request1.pk]), self.user2)
+        self.assertEqual(len(response.json()['request_identity_variants']), 3)
+
+
+## SUMMARY COUNTERS ##
+class SummaryTests(APITestCase):
+    def setUp(self):
+        # cached counters of previous tests could belong to same user ids
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.request2 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Gym data request.')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+
+        self.summary_url = reverse('api-summary')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+        self.request_send_detail_url = lambda pk: reverse('api-request-send-detail', args=[pk])
+        self.request_receive_accept_url = lambda pk: reverse('api-request-receive-accept', args=[pk])
+        self.request_receive_deny_url = lambda pk: reverse('api-request-receive-deny', args=[pk])
+        self.request_receive_bulk_status_url = reverse('api-request-receive-bulk-status')
+        self.profile_identity_variant_detail_url = lambda pk: reverse('api-profile-identity-variant-detail', args=[pk])
+
+    # summary of given user, counters are invalidated on commit
+    def get_summary(self, user):
+        self.client.force_authenticate(user=user)
+        return self.client.get(self.summary_url).json()
+
+    # summary shows counts of both sides of requests
+    def test_summary_counts(self):
+        self.assertEqual(self.get_summary(self.user2), {
+            'pending_received': 2, 'accepted_received': 0, 'denied_received': 0, 'pending_sent': 0, 'profile_identity_variants': 1,
+        })
+        self.assertEqual(self.get_summary(self.user), {
+            'pending_received': 0, 'accepted_received': 0, 'denied_received': 0, 'pending_sent': 2, 'profile_identity_variants': 0,
+        })
+
+    # accept and deny move counts between statuses, for receiver and sender
+    def test_status_changes_update_counts(self):
+        self.client.force_authenticate(user=self.user2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.request_receive_accept_url(self.request1.pk))
+            self.client.put(self.request_receive_deny_url(self.request2.pk))
+        summary = self.get_summary(self.user2)
+        self.assertEqual((summary['pending_received'], summary['accepted_received'], summary['denied_received']), (0, 1, 1))
+        self.assertEqual(self.get_summary(self.user)['pending_sent'], 0)
+
+    # bulk status change updates counts too, only for requests whose status changed
+    def test_bulk_status_change_updates_counts(self):
+        self.client.force_authenticate(user=self.user2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(self.request_receive_accept_url(self.request1.pk))
+            self.client.post(self.request_receive_bulk_status_url, {'ids': [self.request1.pk, self.request2.pk], 'status': 'accepted'}, format='json')
+        summary = self.get_summary(self.user2)
+        self.assertEqual((summary['pending_received'], summary['accepted_received']), (0, 2))
+        self.assertEqual(self.get_summary(self.user)['pending_sent'], 0)
+
+    # created and deleted requests and profile identity variants change counts
+    def test_create_and_delete_update_counts(self):
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.request_send_list_create_url, {'receiver_username': 'Michael', 'request_reasoning': 'Bank data request.'}, format='json')
+            self.client.delete(self.request_send_detail_url(self.request1.pk))
+        self.assertEqual(self.get_summary(self.user)['pending_sent'], 2)
+        self.client.force_authenticate(user=self.user2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(self.profile_identity_variant_detail_url(self.profile_identity_variant1.pk))
+        summary = self.get_summary(self.user2)
+        self.assertEqual((summary['pending_received'], summary['profile_identity_variants']), (2, 0))
+
+    # cached summary is served without queries
+    def test_summary_is_cached(self):
+        self.get_summary(self.user2)
+        with self.assertNumQueries(0):
+            self.client.get(self.summary_url)
+
+    # cache is dropped when counters change
+    def test_cache_is_invalidated_on_change(self):
+        self.get_summary(self.user2)
+        with self.captureOnCommitCallbacks(execute=True):
+            Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Bank data request.')
+        self.assertEqual(self.get_summary(self.user2)['pending_received'], 3)
+
+    # summary costs one query however many requests user has
+    def test_summary_query_count_does_not_depend_on_request_count(self):
+        Request.objects.bulk_create([Request(sender=self.user, receiver=self.user2) for _ in range(20)])
+        cache.clear()
+        self.client.force_authenticate(user=self.user2)
+        with self.assertNumQueries(1):
+            self.client.get(self.summary_url)
+
+    # user without counters row gets it counted again
+    def test_missing_counters_are_rebuilt(self):
+        UserCounters.objects.filter(user=self.user2).delete()
+        self.assertEqual(self.get_summary(self.user2)['pending_received'], 2)
+        self.assertTrue(UserCounters.objects.filter(user=self.user2).exists())
+
+    # rebuild command fixes counters that drifted
+    def test_rebuild_user_counters_command(self):
+        UserCounters.objects.filter(user=self.user2).update(pending_received=100)
+        call_command('rebuild_user_counters', 'Michael', stdout=StringIO())
+        self.assertEqual(UserCounters.objects.get(user=self.user2).pending_received, 2)
+
+    # not logged in user can not see summary
+    def test_unauthenticated_user_can_not_see_summary(self):
+        response = self.client.get(self.summary_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+## PROFILE IDENTITY VARIANT LIST CACHE ##
+class ProfileIdentityVariantListCacheTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user, label='First Name', variant='John')
+        self.profile_identity_variant2 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+
+        self.profile_identity_variant_list_create_url = reverse('api-profile-identity-variant-list-create')
+        self.profile_identity_variant_detail_url = lambda pk: reverse('api-profile-identity-variant-detail', args=[pk])
+
+    # labels in list of given user
+    def get_labels(self, user):
+        self.client.force_authenticate(user=user)
+        return [item['label'] for item in self.client.get(self.profile_identity_variant_list_create_url).json()['results']]
+
+    # second load of the list is served from cache, without queries
+    def test_list_is_served_from_cache(self):
+        self.get_labels(self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.profile_identity_variant_list_create_url)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.profile_identity_variant1.pk])
+
+    # matching ETag of cached list is answered without queries
+    def test_not_modified_without_queries(self):
+        self.client.force_authenticate(user=self.user)
+        etag = self.client.get(self.profile_identity_variant_list_create_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.profile_identity_variant_list_create_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    # create, update and delete through API change the cached list
+    def test_api_writes_invalidate_list(self):
+        self.get_labels(self.user)
+        response = self.client.post(self.profile_identity_variant_list_create_url, {'label': 'Last Name', 'variant': 'Smith'}, format='json')
+        self.assertEqual(self.get_labels(self.user), ['First Name', 'Last Name'])
+        self.client.patch(self.profile_identity_variant_detail_url(response.json()['id']), {'label': 'Surname'}, format='json')
+        self.assertEqual(self.get_labels(self.user), ['First Name', 'Surname'])
+        self.client.delete(self.profile_identity_variant_detail_url(self.profile_identity_variant1.pk))
+        self.assertEqual(self.get_labels(self.user), ['Surname'])
+
+    # change committed after another request cached the list, is not hidden by that cached list
+    def test_version_is_bumped_again_after_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            ProfileIdentityVariant.objects.create(user=self.user, label='Last Name', variant='Smith')
+        version = get_profile_variant_version(self.user.id)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(get_profile_variant_version(self.user.id), version)
+
+    # every user gets only their own list, also when both are cached
+    def test_cached_list_is_not_served_to_other_user(self):
+        self.assertEqual(self.get_labels(self.user), ['First Name'])
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.profile_identity_variant_list_create_url)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.profile_identity_variant2.pk])
+
+    # change of one users variants does not change cached list of another user
+    def test_write_only_invalidates_own_list(self):
+        version = get_profile_variant_version(self.user2.id)
+        ProfileIdentityVariant.objects.create(user=self.user, label='Last Name', variant='Smith')
+        self.assertEqual(get_profile_variant_version(self.user2.id), version)
+
+    # cached value that belongs to another user is never returned, even under own key
+    def test_cached_data_of_other_user_is_ignored(self):
+        cache.set(data_key(self.user2.id, ('web-list',)), {'user_id': self.user.id, 'data': ['leaked']})
+        self.assertEqual(get_or_set_profile_variant_data(self.user2.id, ('web-list',), lambda: ['fresh']), ['fresh'])
+
+    # new user with id of deleted user does not get list cached for deleted user
+    def test_new_user_gets_new_version(self):
+        version = get_profile_variant_version(self.user2.id)
+        self.user2.delete()
+        user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        self.assertNotEqual(get_profile_variant_version(user3.id), version)
+
+
+## RECEIVER RESOLVER ##
+class ReceiverResolverTests(APITestCase):
+    def setUp(self):
+        receiver_cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+
+    # send request to given username
+    def send_request(self, receiver_username):
+        return self.client.post(self.request_send_list_create_url, {'receiver_username': receiver_username, 'request_reasoning': 'Dental office data request.'}, format='json')
+
+    # receiver is looked up once, then served from cache, response still has receiver username
+    def test_receiver_lookup_is_cached(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as first:
+            self.send_request('Michael')
+        with CaptureQueriesContext(connection) as second:
+            response = self.send_request('Michael')
+        user_queries = lambda queries: [query for query in queries if 'FROM "auth_user"' in query['sql']]
+        self.assertEqual(len(user_queries(first)), 1)
+        self.assertEqual(user_queries(second), [])
+        self.assertEqual(response.json()['receiver_username'], 'Michael')
+        self.assertEqual(Request.objects.filter(receiver=self.user2).count(), 2)
+
+    # unknown receiver gives the same error as before
+    def test_unknown_receiver_error(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.send_request('Nobody')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), ["Username: 'Nobody' does not exist"])
+
+    # renamed receiver is not found by old username anymore
+    def test_rename_invalidates_cached_receiver(self):
+        self.client.force_authenticate(user=self.user)
+        self.send_request('Michael')
+        self.user2.username = 'Mike'
+        self.user2.save()
+        self.assertEqual(self.send_request('Michael').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.send_request('Mike').status_code, status.HTTP_201_CREATED)
+
+    # deleted receiver is not found anymore
+    def test_delete_invalidates_cached_receiver(self):
+        self.client.force_authenticate(user=self.user)
+        self.send_request('Michael')
+        self.user2.delete()
+        self.assertEqual(self.send_request('Michael').status_code, status.HTTP_400_BAD_REQUEST)
+
+    # rename and sign up of the same username in another process, whose signal only changes the shared version
+    def test_rename_in_other_process_is_not_served(self):
+        self.client.force_authenticate(user=self.user)
+        self.send_request('Michael')
+        User.objects.filter(pk=self.user2.pk).update(username='Mike')
+        bump_receiver_version()
+        user3 = User.objects.create_user(username='Michael', email='michael2@example.com', password='test123123')
+        response = self.send_request('Michael')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Request.objects.get(pk=response.json()['id']).receiver, user3)
+
+    # login and password change do not rename anyone, cached receivers stay valid
+    def test_save_without_rename_keeps_cached_receivers(self):
+        version = get_receiver_version()
+        self.client.login(username='Michael', password='test123123')
+        self.user2.set_password('test456456')
+        self.user2.save()
+        User.objects.get(pk=self.user2.pk).save()
+        self.assertEqual(get_receiver_version(), version)
+        # saving a user with only id loaded does not look like a rename either
+        User.objects.only('id').get(pk=self.user2.pk).save()
+        self.assertEqual(get_receiver_version(), version)
+        self.user2.username = 'Mike'
+        self.user2.save()
+        self.assertNotEqual(get_receiver_version(), version)
+
+    # receiver has the stored username
+    def test_resolved_receiver_has_stored_username(self):
+        self.assertEqual(resolve_receiver('Michael').username, 'Michael')
+        self.assertEqual(resolve_receiver('Michael').id, self.user2.id)
+
+    # cache keeps only most recently used usernames
+    def test_cache_is_bounded_lru(self):
+        cache = VersionedLRUCache(max_size=2)
+        cache.set('a', 1, (1, 'a'))
+        cache.set('b', 1, (2, 'b'))
+        cache.get('a', 1)
+        cache.set('c', 1, (3, 'c'))
+        self.assertEqual((cache.get('a', 1), cache.get('b', 1), cache.get('c', 1)), ((1, 'a'), None, (3, 'c')))
+        self.assertEqual(len(cache), 2)
+
+    # entries of another version are looked up again
+    def test_cache_entries_of_old_version_are_stale(self):
+        cache = VersionedLRUCache(max_size=2)
+        cache.set('a', 1, (1, 'a'))
+        self.assertIsNone(cache.get('a', 2))
+
+
+class UserSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        for username in ['Michael', 'michelle', 'Mick', 'Mia', 'Anna']:
+            User.objects.create_user(username=username, email=f'{username}@example.com', password='test123123')
+        self.user_search_url = reverse('api-user-search')
+
+    # search is only for logged in users
+    def test_search_requires_authentication(self):
+        response = self.client.get(self.user_search_url, {'prefix': 'mi'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    # usernames starting with prefix, case insensitive, alphabetical, up to limit
+    def test_search_by_prefix(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.user_search_url, {'prefix': 'MIC'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'results': ['Michael', 'michelle', 'Mick']})
+        response = self.client.get(self.user_search_url, {'prefix': 'mi', 'limit': 2})
+        self.assertEqual(response.json(), {'results': ['Mia', 'Michael']})
+        response = self.client.get(self.user_search_url, {'prefix': 'x'})
+        self.assertEqual(response.json(), {'results': []})
+
+    # prefix is required and limit is bounded
+    def test_search_invalid_query(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.user_search_url).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'mi', 'limit': 51}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    # LIKE wildcards in prefix are plain characters
+    def test_search_wildcards_are_literal(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': '%'}).json(), {'results': []})
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'm_'}).json(), {'results': []})
+
+    # same prefix is answered from cache, new user and rename invalidate it, login does not
+    def test_search_is_cached_and_invalidated(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.user_search_url, {'prefix': 'mi'})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.user_search_url, {'prefix': 'MI'})
+        self.assertEqual([query for query in queries if 'FROM "auth_user"' in query['sql']], [])
+        self.assertEqual(len(response.json()['results']), 4)
+
+        self.client.login(username='Johny', password='test123123')
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.user_search_url, {'prefix': 'mi'})
+        self.assertEqual([query for query in queries if 'FROM "auth_user"' in query['sql']], [])
+
+        # new user is found by prefixes not cached yet, cached ones find it after USER_SEARCH_CACHE_TIMEOUT
+        User.objects.create_user(username='Miles', email='miles@example.com', password='test123123')
+        self.assertNotIn('Miles', self.client.get(self.user_search_url, {'prefix': 'mi'}).json()['results'])
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'mil'}).json(), {'results': ['Miles']})
+        # password change is a plain save() too
+        johny = User.objects.get(username='Johny')
+        johny.set_password('test456456')
+        johny.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.user_search_url, {'prefix': 'mi'})
+        self.assertEqual([query for query in queries if 'FROM "core_usernamesearchkey"' in query['sql']], [])
+        anna = User.objects.get(username='Anna')
+        anna.username = 'Mina'
+        anna.save()
+        self.assertIn('Mina', self.client.get(self.user_search_url, {'prefix': 'mi'}).json()['results'])
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'an'}).json(), {'results': []})
+        # deactivated user is not suggested from cache either
+        mina = User.objects.get(username='Mina')
+        mina.is_active = False
+        mina.save()
+        self.assertNotIn('Mina', self.client.get(self.user_search_url, {'prefix': 'mi'}).json()['results'])
+
+    # evicted version starts from a new value, results cached under an old one are not served again
+    def test_search_version_after_eviction(self):
+        version = get_user_search_version()
+        cache.delete(USER_SEARCH_VERSION_KEY)
+        self.assertNotEqual(get_user_search_version(), version)
+        invalidate_user_search()
+        self.assertIsNotNone(cache.get(USER_SEARCH_VERSION_KEY))
+
+    # non-ASCII usernames are found case insensitively, SQLite lower() would only lower ASCII
+    def test_search_non_ascii_username(self):
+        User.objects.create_user(username='Émile', email='emile@example.com', password='test123123')
+        User.objects.create_user(username='Ölaf', email='olaf@example.com', password='test123123')
+        self.client.force_authenticate(user=self.user)
+        for prefix in ['é', 'É', 'émi', 'ÉMI']:
+            self.assertEqual(self.client.get(self.user_search_url, {'prefix': prefix}).json(), {'results': ['Émile']})
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'ö'}).json(), {'results': ['Ölaf']})
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'e'}).json(), {'results': []})
+
+    # prefix ending in the last code point has no next prefix, it is not an error
+    def test_search_prefix_with_last_code_point(self):
+        User.objects.create_user(username='a\U0010ffffb', email='last@example.com', password='test123123')
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': '\U0010ffff'}).json(), {'results': []})
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'a\U0010ffff'}).json(), {'results': ['a\U0010ffffb']})
+        self.assertEqual(prefix_upper_bound('a\U0010ffff'), 'b')
+        self.assertIsNone(prefix_upper_bound('\U0010ffff'))
+        self.assertEqual(prefix_upper_bound('a\ud7ff'), 'a\ue000')
+
+    # inactive users are not suggested
+    def test_search_skips_inactive_users(self):
+        User.objects.filter(username='Mia').update(is_active=False)
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(self.user_search_url, {'prefix': 'mia'}).json(), {'results': []})
+
+    # query is a range scan over search key index from core migration 0011, read in index order without sorting
+    def test_search_uses_prefix_index(self):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('prefix index is only created on SQLite and PostgreSQL')
+        plan = search_usernames_query('mi', 10).explain()
+        self.assertIn('core_username_search_key_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        self.assertNotIn('Sort', plan)
+
+
+class RequestSearchTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        # search index is updated after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+            self.request2 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Gym membership data, gym visits and gym payments.')
+            self.request3 = Request.objects.create(sender=self.user, receiver=self.user3, request_reasoning='Gym data request.')
+            self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='Patient Number', context='Dental card')
+
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+        self.async_request_receive_list_url = reverse('api-async-request-receive-list')
+
+    # ids of received requests matching q
+    def search_received(self, q, user=None):
+        self.client.force_authenticate(user=user or self.user2)
+        response = self.client.get(self.request_receive_list_url, {'q': q})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [item['id'] for item in response.json()['results']]
+
+    # reasoning, sender username and variant label / context are searched, every word has to match
+    def test_search_received_requests(self):
+        self.assertEqual(self.search_received('dental'), [self.request1.pk])
+        self.assertEqual(self.search_received('anna'), [self.request2.pk])
+        self.assertEqual(self.search_received('patient card'), [self.request1.pk])
+        self.assertEqual(self.search_received('dental gym'), [])
+
+    # words are matched as prefixes and without case
+    def test_search_prefix(self):
+        self.assertEqual(self.search_received('DENT'), [self.request1.pk])
+
+    # better match is first, without q the newest is first
+    def test_search_is_ranked(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            request4 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Gym data request.')
+        self.assertEqual(self.search_received('gym'), [self.request2.pk, request4.pk])
+        self.assertEqual(self.search_received(''), [request4.pk, self.request2.pk, self.request1.pk])
+
+    # query syntax of the database is plain text
+    def test_search_syntax_is_literal(self):
+        self.assertEqual(self.search_received('"dental'), [self.request1.pk])
+        self.assertEqual(self.search_received('dental OR gym'), [])
+        self.assertEqual(self.search_received('*'), [])
+
+    # ranked results are paginated with the cursor
+    def test_search_pagination(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Gym data request.')
+        self.client.force_authenticate(user=self.user2)
+        ids = []
+        response = self.client.get(self.request_receive_list_url, {'q': 'gym', 'limit': 2})
+        while True:
+            data = response.json()
+            ids += [item['id'] for item in data['results']]
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+        self.assertEqual(ids[0], self.request2.pk)
+
+    # changed reasoning, variants, usernames and deleted requests are indexed again
+    def test_search_index_follows_changes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request1.request_reasoning = 'Dentist data request.'
+            self.request1.save()
+        self.assertEqual(self.search_received('office'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request_identity_variant1.delete()
+        self.assertEqual(self.search_received('patient'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user3.username = 'Annabelle'
+            self.user3.save()
+        self.assertEqual(self.search_received('annabelle'), [self.request2.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.request2.delete()
+        self.assertEqual(self.search_received('annabelle'), [])
+
+    # password change and other plain saves keep the username, requests of the user are not indexed again
+    def test_save_without_rename_does_not_reindex_requests(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.user2.set_password('test456456')
+            self.user2.save()
+            user2 = User.objects.get(pk=self.user2.pk)
+            user2.first_name = 'Michael'
+            user2.save()
+        self.assertEqual(callbacks, [])
+
+    # variants created together with the request are searchable too
+    def test_search_request_created_with_variants(self):
+        self.client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(self.request_send_list_create_url, {'receiver_username': 'Michael', 'request_reasoning': 'Bank data request.', 'request_identity_variants': [{'label': 'IBAN', 'context': 'Savings account'}]}, format='json')
+        self.assertEqual(self.search_received('savings'), [response.json()['id']])
+
+    # sent list and async received list are searched the same way
+    def test_search_sent_and_async_lists(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.request_send_list_create_url, {'q': 'gym'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.request3.pk])
+
+        async def get_async():
+            return await self.async_client.get(self.async_request_receive_list_url, {'q': 'gym'}, headers={'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'})
+        response = async_to_sync(get_async)()
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.request2.pk])
+
+    # other users requests are never found
+    def test_search_only_own_requests(self):
+        self.assertEqual(self.search_received('dental', user=self.user3), [])
+
+
+class RequestListFilterTests(APITestCase):
+    def setUp(self):
+        receiver_cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.request2 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Gym data request.', status=Request.Status.ACCEPTED)
+        self.request3 = Request.objects.create(sender=self.user, receiver=self.user3, request_reasoning='Bank data request.')
+        # created_at is auto_now_add, older requests are set with update
+        Request.objects.filter(pk=self.request1.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+        RequestIdentityVariant.objects.create(request=self.request1, label='First Name', profile_link=self.profile_identity_variant1)
+        RequestIdentityVariant.objects.create(request=self.request2, label='Last Name')
+
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+        self.async_request_receive_list_url = reverse('api-async-request-receive-list')
+
+    # ids of listed requests for given filters
+    def get_ids(self, url, user, params):
+        self.client.force_authenticate(user=user)
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.json()['results']}
+
+    # received requests by status, sender and variants without profile link
+    def test_filter_received_requests(self):
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {'status': 'pending'}), {self.request1.pk})
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {'sender': 'Anna'}), {self.request2.pk})
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {'sender': 'Nobody'}), set())
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {'has_unlinked_variants': 'true'}), {self.request2.pk})
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {'has_unlinked_variants': 'false'}), {self.request1.pk})
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {}), {self.request1.pk, self.request2.pk})
+
+    # sent requests by receiver and date range, created_after inclusive, created_before exclusive
+    def test_filter_sent_requests(self):
+        self.assertEqual(self.get_ids(self.request_send_list_create_url, self.user, {'receiver': 'Anna'}), {self.request3.pk})
+        week_ago = (timezone.now() - timedelta(days=7)).isoformat()
+        self.assertEqual(self.get_ids(self.request_send_list_create_url, self.user, {'created_after': week_ago}), {self.request3.pk})
+        self.assertEqual(self.get_ids(self.request_send_list_create_url, self.user, {'created_before': week_ago}), {self.request1.pk})
+        self.assertEqual(self.get_ids(self.request_send_list_create_url, self.user, {'created_before': week_ago, 'status': 'accepted'}), set())
+
+    # filters combine with ?q= search
+    def test_filter_with_search(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            request4 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Dental clinic data request.')
+        self.assertEqual(self.get_ids(self.request_receive_list_url, self.user2, {'q': 'dental', 'sender': 'Anna'}), {request4.pk})
+
+    # invalid filter values are a 400 with field errors
+    def test_invalid_filters(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_list_url, {'status': 'lost', 'created_after': 'yesterday'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(set(response.json()), {'status', 'created_after'})
+
+    # async received list takes the same filters
+    def test_filter_async_received_requests(self):
+        async def get_async(params):
+            return await self.async_client.get(self.async_request_receive_list_url, params, headers={'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'})
+        response = async_to_sync(get_async)({'status': 'accepted'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.request2.pk])
+        response = async_to_sync(get_async)({'status': 'lost'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # async received list resolves sender / receiver usernames outside the event loop, also when they are not cached yet
+    def test_filter_async_received_requests_by_username(self):
+        async def get_async(params):
+            return await self.async_client.get(self.async_request_receive_list_url, params, headers={'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'})
+        for params, expected_ids in [
+            ({'sender': 'Anna'}, [self.request2.pk]),
+            ({'sender': 'Nobody'}, []),
+            ({'receiver': 'Michael'}, [self.request2.pk, self.request1.pk]),
+            ({'receiver': 'Anna'}, []),
+        ]:
+            receiver_cache.clear()
+            response = async_to_sync(get_async)(params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual([item['id'] for item in response.json()['results']], expected_ids)
+
+    # pending filter of a receiver is served by the (receiver, status, created_at) index
+    def test_status_filter_uses_index(self):
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.request_receive_list_url, {'status': 'pending'})
+        list_query = next(query['sql'] for query in queries if 'ORDER BY' in query['sql'] and 'FROM "core_request"' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {list_query}')
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        if connection.vendor == 'sqlite':
+            self.assertIn('request_recv_status_idx', plan)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+        RequestIdentityVariant.objects.create(request=self.request1, label='First Name', profile_link=self.profile_identity_variant1)
+        RequestIdentityVariant.objects.create(request=self.request1, label='Last Name')
+
+        self.request_send_detail_url = reverse('api-request-send-detail', args=[self.request1.pk])
+        self.request_receive_detail_url = reverse('api-request-receive-detail', args=[self.request1.pk])
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.async_request_receive_detail_url = reverse('api-async-request-receive-detail', args=[self.request1.pk])
+        self.summary_url = reverse('api-summary')
+
+    # status check reads only the request row, ETag aggregate and object query without joins
+    def test_fields_status_is_single_row_query(self):
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.request_receive_detail_url, {'fields': 'status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {'status': 'pending'})
+        self.assertEqual(len(queries), 2)
+        for query in queries:
+            self.assertNotIn('JOIN', query['sql'])
+            self.assertNotIn('core_requestidentityvariant', query['sql'])
+
+    # full detail prefetches variants with profile links instead of a query per variant
+    def test_full_detail_prefetches_variants(self):
+        self.client.force_authenticate(user=self.user2)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.request_receive_detail_url)
+        self.assertEqual([variant['label'] for variant in response.json()['request_identity_variants']], ['First Name', 'Last Name'])
+        self.assertEqual(response.json()['request_identity_variants'][0]['user_provided_variant'], 'Michal')
+        self.assertEqual(response.json()['sender_username'], 'Johny')
+
+    # omit drops nested variants and their prefetch, sender is still joined
+    def test_omit_nested_variants(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.request_send_detail_url, {'omit': 'request_identity_variants,request_reasoning'})
+        self.assertEqual(set(response.json()), {'id', 'receiver_username', 'status', 'created_at'})
+        self.assertEqual(response.json()['receiver_username'], 'Michael')
+        self.assertEqual(len(queries), 2)
+        self.assertFalse(any('core_requestidentityvariant' in query['sql'] for query in queries))
+
+    # list rows without counterparty username do not join users
+    def test_fields_on_list(self):
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.request_receive_list_url, {'fields': 'id,status'})
+        self.assertEqual(response.json()['results'], [{'id': self.request1.pk, 'status': 'pending'}])
+        self.assertFalse(any('auth_user' in query['sql'] for query in queries if 'core_request' in query['sql']))
+
+    # unknown field names are an error, not a silent full response
+    def test_unknown_fields(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_detail_url, {'fields': 'status,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json(), {'fields': ['Unknown fields: secret.']})
+        response = self.client.get(self.request_receive_detail_url, {'omit': 'secret'})
+        self.assertEqual(response.json(), {'omit': ['Unknown fields: secret.']})
+
+    # writes ignore fields, input and response are complete
+    def test_fields_ignored_on_write(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.patch(f'{self.request_send_detail_url}?fields=status', {'request_reasoning': 'Dentist data request.'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['request_reasoning'], 'Dentist data request.')
+        self.assertIn('request_identity_variants', response.json())
+
+    # sparse responses have their own ETag
+    def test_fields_have_own_etag(self):
+        self.client.force_authenticate(user=self.user2)
+        full_etag = self.client.get(self.request_receive_detail_url)['ETag']
+        sparse_etag = self.client.get(self.request_receive_detail_url, {'fields': 'status'})['ETag']
+        self.assertNotEqual(full_etag, sparse_etag)
+
+    # summary and async views take fields too
+    def test_fields_on_summary_and_async_detail(self):
+        self.client.force_authenticate(user=self.user2)
+        self.assertEqual(self.client.get(self.summary_url, {'fields': 'pending_received'}).json(), {'pending_received': 1})
+
+        async def get_async():
+            return await self.async_client.get(self.async_request_receive_detail_url, {'fields': 'id,status'}, headers={'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'})
+        self.assertEqual(async_to_sync(get_async)().json(), {'id': self.request1.pk, 'status': 'pending'})
+
+
+class RendererParserTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request. Żółć 🦷 \u2028 "quoted" \\ <tag>')
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+
+    # orjson writes the same bytes as DRF JSONRenderer, datetimes too
+    def test_orjson_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'Żółć 🦷 \u2028 \u2029 \x00\x1f\x7f "quoted" \\ </script>',
+            'created_at': timezone.now().replace(microsecond=123456),
+            'date': timezone.now().date(),
+            'decimal': Decimal('1.50'),
+            'lazy': gettext_lazy('Pending'),
+            'numbers': [0, -1, 2 ** 63 - 1, 2 ** 70, True, None],
+            1: 'integer key',
+            'nested': {'tuple': (1, 2), 'uuid': uuid.UUID(int=1)},
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render(data, 'application/json; indent=4'), JSONRenderer().render(data, 'application/json; indent=4'))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    # API responses are rendered with orjson by default
+    def test_api_uses_orjson(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_list_url)
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+        self.assertTrue(response.json()['results'][0]['created_at'].endswith('Z'))
+
+    # MessagePack is chosen with Accept header and has the same values as JSON
+    def test_msgpack_response(self):
+        self.client.force_authenticate(user=self.user2)
+        json_response = self.client.get(self.request_receive_list_url)
+        response = self.client.get(self.request_receive_list_url, HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content), json_response.json())
+        self.assertNotEqual(response['ETag'], json_response['ETag'])
+
+    # MessagePack and orjson request bodies are parsed
+    def test_msgpack_and_json_request_body(self):
+        self.client.force_authenticate(user=self.user)
+        body = msgpack.packb({'receiver_username': 'Michael', 'request_reasoning': 'Gym data request.'})
+        response = self.client.post(self.request_send_list_create_url, body, content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(self.request_send_list_create_url, '{"receiver_username": "Michael", "request_reasoning": "Bank data request."}', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Request.objects.filter(sender=self.user).count(), 3)
+
+    # broken bodies are a 400 parse error
+    def test_invalid_request_body(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.request_send_list_create_url, '{"receiver_username": NaN}', content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.json()['detail'].startswith('JSON parse error'))
+        response = self.client.post(self.request_send_list_create_url, b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(response.json()['detail'].startswith('MessagePack parse error'))
+
+    # browsable API still renders
+    def test_browsable_api(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_list_url, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, 'Dental office data request.')
+
+    # benchmark command renders a page with every renderer
+    def test_benchmark_renderers_command(self):
+        out = StringIO()
+        call_command('benchmark_renderers', rows=10, repeat=1, stdout=out)
+        self.assertIn('orjson', out.getvalue())
+        self.assertIn('msgpack', out.getvalue())
+
+
+class ValuesReadPathTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.')
+        self.request2 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Bank account data request.', status='accepted')
+        self.request_send_list_create_url = reverse('api-request-send-list-create')
+        self.request_receive_list_url = reverse('api-request-receive-list')
+        self.async_request_receive_list_url = reverse('api-async-request-receive-list')
+
+    # values() rows serialize to the same data as model instances
+    def test_values_rows_match_instances(self):
+        for serializer_class, queryset in [
+            (RequestReceiveListSerializer, Request.objects.select_related('sender')),
+            (RequestSendListCreateSerializer, Request.objects.select_related('receiver')),
+        ]:
+            queryset = queryset.order_by('-created_at', '-id')
+            values_data = serializer_class(list(queryset.values(*serializer_class().get_value_lookups())), many=True).data
+            self.assertEqual(values_data, serializer_class(list(queryset), many=True).data)
+            self.assertTrue(values_data[0]['created_at'].endswith('Z'))
+
+    # list response is read with values() in one joined query, same data as before
+    def test_list_is_values_query(self):
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.request_receive_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        expected = RequestReceiveListSerializer([self.request2, self.request1], many=True).data
+        self.assertEqual(response.json()['results'], json.loads(json.dumps(expected)))
+        list_queries = [query['sql'] for query in queries if 'LIMIT' in query['sql']]
+        self.assertEqual(len(list_queries), 1)
+        self.assertIn('JOIN', list_queries[0])
+
+    # ?fields= leaves out the sender join from the values() query
+    def test_sparse_fields_skip_join(self):
+        self.client.force_authenticate(user=self.user2)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.request_receive_list_url, {'fields': 'id,status'})
+        self.assertEqual(response.json()['results'], [{'id': self.request2.pk, 'status': 'accepted'}, {'id': self.request1.pk, 'status': 'pending'}])
+        for query in queries:
+            self.assertNotIn('JOIN', query['sql'])
+
+    # cursor positions still come from values() rows
+    def test_cursor_pagination(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.request_send_list_create_url, {'limit': 1})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.request2.pk])
+        response = self.client.get(response.json()['next'])
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.request1.pk])
+        self.assertIsNone(response.json()['next'])
+
+    # POST response is still serialized from the created instance
+    def test_create_response(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post(self.request_send_list_create_url, {'receiver_username': 'Michael', 'request_reasoning': 'Gym data request.', 'request_identity_variants': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['receiver_username'], 'Michael')
+
+    # async list returns the same page as the sync one
+    def test_async_list_matches_sync(self):
+        self.client.force_authenticate(user=self.user2)
+        sync_data = self.client.get(self.request_receive_list_url).json()
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'}
+
+        async def get():
+            return await self.async_client.get(self.async_request_receive_list_url, headers=headers)
+        response = async_to_sync(get)()
+        self.assertEqual(response.json()['results'], sync_data['results'])
+
+    # benchmark checks both paths return the same data and leaves no rows behind
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_list_serializers', rows=5, repeat=1, stdout=out)
+        self.assertIn('received', out.getvalue())
+        self.assertIn('sent', out.getvalue())
+        self.assertFalse(User.objects.filter(username__startswith='benchmark-list-').exists())
+
+
+class RequestExportTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request, "urgent"\nsecond line.')
+        self.request2 = Request.objects.create(sender=self.user2, receiver=self.user, request_reasoning='Bank account data request.', status='accepted')
+        # not a request of Johny, never in Johny's export
+        self.request3 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Gym data request.')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='First Name', profile_link=self.profile_identity_variant1)
+        self.request_identity_variant2 = RequestIdentityVariant.objects.create(request=self.request1, label='Last Name', context='As in passport.')
+        self.export_ndjson_url = reverse('api-request-export-ndjson')
+        self.export_csv_url = reverse('api-request-export-csv')
+
+    def read_lines(self, response):
+        return b''.join(response.streaming_content).decode().splitlines()
+
+    # every sent and received request with variants and linked profile variants, one JSON object per line
+    def test_ndjson_export(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.export_ndjson_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson; charset=utf-8')
+        self.assertIn('filename="requests.ndjson"', response['Content-Disposition'])
+        rows = [json.loads(line) for line in self.read_lines(response)]
+        self.assertEqual([row['id'] for row in rows], [self.request1.pk, self.request2.pk])
+        self.assertEqual(rows[0]['direction'], 'sent')
+        self.assertEqual(rows[0]['request_reasoning'], self.request1.request_reasoning)
+        self.assertEqual(rows[0]['request_identity_variants'], [
+            {'id': self.request_identity_variant1.pk, 'label': 'First Name', 'context': '', 'user_provided_variant': 'Michal'},
+            {'id': self.request_identity_variant2.pk, 'label': 'Last Name', 'context': 'As in passport.', 'user_provided_variant': None},
+        ])
+        self.assertEqual(rows[1]['direction'], 'received')
+        self.assertEqual(rows[1]['sender_username'], 'Michael')
+        self.assertEqual(rows[1]['status'], 'accepted')
+        self.assertEqual(rows[1]['request_identity_variants'], [])
+
+    # one CSV line per variant, request without variants still has a line
+    def test_csv_export(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(self.export_csv_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        rows = list(csv.DictReader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([(row['request_id'], row['label']) for row in rows], [
+            (str(self.request1.pk), 'First Name'), (str(self.request1.pk), 'Last Name'), (str(self.request2.pk), ''),
+        ])
+        self.assertEqual(rows[0]['request_reasoning'], self.request1.request_reasoning)
+        self.assertEqual(rows[0]['user_provided_variant'], 'Michal')
+        self.assertEqual(rows[2]['direction'], 'received')
+
+    # text of the other user that starts like a spreadsheet formula is escaped in CSV, NDJSON keeps it as it is
+    def test_csv_export_escapes_formulas(self):
+        request4 = Request.objects.create(sender=self.user2, receiver=self.user, request_reasoning='=HYPERLINK("http://example.com","Open")')
+        RequestIdentityVariant.objects.create(request=request4, label='+Phone', context='-1 as in passport')
+        RequestIdentityVariant.objects.create(request=request4, label='@Handle', context='\tTab')
+        self.client.force_authenticate(user=self.user)
+        rows = list(csv.DictReader(StringIO(b''.join(self.client.get(self.export_csv_url).streaming_content).decode())))
+        rows = [row for row in rows if row['request_id'] == str(request4.pk)]
+        self.assertEqual([row['request_reasoning'] for row in rows], ['\'=HYPERLINK("http://example.com","Open")'] * 2)
+        self.assertEqual([(row['label'], row['context']) for row in rows], [("'+Phone", "'-1 as in passport"), ("'@Handle", "'\tTab")])
+        self.assertEqual(rows[0]['sender_username'], 'Michael')
+        rows = [json.loads(line) for line in self.read_lines(self.client.get(self.export_ndjson_url))]
+        self.assertEqual(rows[-1]['request_reasoning'], request4.request_reasoning)
+
+    # requests are read in chunks with variants prefetched per chunk, not a query per request
+    def test_export_reads_in_chunks(self):
+        Request.objects.bulk_create([Request(sender=self.user, receiver=self.user3, request_reasoning=f'Request {index}.') for index in range(5)])
+        self.client.force_authenticate(user=self.user)
+        with patch('core.export.EXPORT_CHUNK_SIZE', 3):
+            response = self.client.get(self.export_ndjson_url)
+            with CaptureQueriesContext(connection) as queries:
+                lines = self.read_lines(response)
+        self.assertEqual(len(lines), 7)
+        # one requests query read 3 rows at a time, variants prefetched once per chunk
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(sum('core_requestidentityvariant' in query['sql'] for query in queries), 3)
+
+    # errors are JSON even when export format is asked for
+    def test_export_requires_authentication(self):
+        response = self.client.get(self.export_csv_url, HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    # under ASGI lines are streamed from an async iterator instead of read into a list first
+    def test_async_export(self):
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'}
+
+        async def get():
+            response = await self.async_client.get(self.export_ndjson_url, headers=headers)
+            self.assertTrue(response.is_async)
+            return [json.loads(line) async for line in response.streaming_content]
+        rows = async_to_sync(get)()
+        self.assertEqual([(row['id'], row['direction']) for row in rows], [(self.request1.pk, 'received'), (self.request2.pk, 'sent'), (self.request3.pk, 'received')])
+
+
+class ProfileIdentityVariantImportTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user, label='First Name', variant='John')
+        self.profile_identity_variant_import_url = reverse('api-profile-identity-variant-import')
+        self.profile_identity_variant_list_create_url = reverse('api-profile-identity-variant-list-create')
+        self.summary_url = reverse('api-summary')
+
+    def upload(self, name, content):
+        self.client.force_authenticate(user=self.user)
+        return self.client.post(self.profile_identity_variant_import_url, {'file': SimpleUploadedFile(name, content.encode() if isinstance(content, str) else content)}, format='multipart')
+
+    # CSV rows are created for the logged in user, counters and cached list are updated although bulk_create sends no signals
+    def test_csv_import(self):
+        # list and summary are cached before the import
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.profile_identity_variant_list_create_url)
+        self.client.get(self.summary_url)
+        # spreadsheet export with BOM
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.upload('variants.csv', '\ufefflabel,context,variant\nEmail,"Work, main",john@example.com\nNickname,,Johnny\n')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json(), {'created': 2, 'error_count': 0, 'errors': []})
+        results = self.client.get(self.profile_identity_variant_list_create_url).json()['results']
+        self.assertEqual([(item['label'], item['context'], item['variant']) for item in results], [
+            ('First Name', '', 'John'), ('Email', 'Work, main', 'john@example.com'), ('Nickname', '', 'Johnny'),
+        ])
+        self.assertEqual(self.client.get(self.summary_url).json()['profile_identity_variants'], 3)
+
+    # NDJSON rows, extra keys are ignored and blank lines skipped
+    def test_ndjson_import(self):
+        response = self.upload('variants.ndjson', '{"label": "Email", "variant": "john@example.com", "id": 999}\n\n{"label": "Handle", "context": "Forum", "variant": "@johny"}\n')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.json()['created'], 2)
+        self.assertEqual(list(ProfileIdentityVariant.objects.filter(user=self.user).order_by('id').values_list('label', 'context', 'variant')), [
+            ('First Name', '', 'John'), ('Email', '', 'john@example.com'), ('Handle', 'Forum', '@johny'),
+        ])
+
+    # invalid rows are reported by line and nothing is created
+    def test_row_errors(self):
+        response = self.upload('variants.ndjson', '{"label": "Email", "variant": "john@example.com"}\nnot json\n{"label": "Email"}\n{"label": "' + 'x' * 51 + '", "variant": "a"}\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['created'], 0)
+        self.assertEqual(response.json()['error_count'], 3)
+        self.assertEqual([(error['row'], list(error['errors'])) for error in response.json()['errors']], [(2, ['row']), (3, ['variant']), (4, ['label'])])
+        self.assertEqual(ProfileIdentityVariant.objects.filter(user=self.user).count(), 1)
+
+    # row numbers of CSV are lines where rows start, also after quoted line breaks
+    def test_csv_row_numbers(self):
+        response = self.upload('variants.csv', 'label,context,variant\nAddress,"Line one\nline two",Main Street 1\nEmail,,\n')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.json()['errors'], [{'row': 4, 'errors': {'variant': ['This field may not be blank.']}}])
+
+    # only the first errors are listed, all of them are counted
+    def test_reported_errors_are_limited(self):
+        with patch('core.profile_variant_import.MAX_REPORTED_ERRORS', 2):
+            response = self.upload('variants.csv', 'label,variant\nEmail,\nPhone,\nHandle,\n')
+        self.assertEqual(response.json()['error_count'], 3)
+        self.assertEqual(len(response.json()['errors']), 2)
+
+    # rows are validated and inserted a chunk at a time
+    def test_import_in_chunks(self):
+        content = 'label,variant\n' + ''.join(f'Email,john{index}@example.com\n' for index in range(5))
+        with patch('core.profile_variant_import.IMPORT_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            response = self.upload('variants.csv', content)
+        self.assertEqual(response.json()['created'], 5)
+        self.assertEqual(sum(query['sql'].startswith('INSERT INTO "core_profileidentityvariant"') for query in queries), 3)
+
+    # files that can not be read are a file error
+    def test_unreadable_files(self):
+        for name, content, message in [
+            ('variants.txt', 'label,variant\n', 'Upload a .csv, .ndjson, .jsonl file.'),
+            ('variants.csv', 'name,value\nEmail,john@example.com\n', 'CSV header is missing columns: label, variant.'),
+            ('variants.csv', 'label,variant\nEmail,\xff\n'.encode('latin-1'), 'File is not UTF-8 encoded.'),
+        ]:
+            response = self.upload(name, content)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(response.json(), {'file': [message]})
+        self.assertEqual(ProfileIdentityVariant.objects.filter(user=self.user).count(), 1)
+
+    # import needs a logged in user
+    def test_stranger_cannot_import(self):
+        response = self.client.post(self.profile_identity_variant_import_url, {'file': SimpleUploadedFile('variants.csv', b'label,variant\nEmail,a\n')}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ProfileVariantSuggestionTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        profile_variant_indexes.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.first_name = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michael')
+        self.polish_first_name = ProfileIdentityVariant.objects.create(user=self.user2, label='Firstname', context='Polish', variant='Michał')
+        self.last_name = ProfileIdentityVariant.objects.create(user=self.user2, label='Last Name', variant='Smith')
+        self.phone = ProfileIdentityVariant.objects.create(user=self.user2, label='Phone', variant='123 456 789')
+        # variant of another user, never suggested
+        ProfileIdentityVariant.objects.create(user=self.user, label='First Name', variant='John')
+        self.request1 = Request.objects.create(sender=self.user, receiver=self.user2, request_reasoning='Dental office data request.', status='accepted')
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='first-name', context='In Polish')
+        self.request_identity_variant2 = RequestIdentityVariant.objects.create(request=self.request1, label='Passport number')
+        self.request_receive_detail_url = reverse('api-request-receive-detail', args=[self.request1.pk])
+        self.async_request_receive_detail_url = reverse('api-async-request-receive-detail', args=[self.request1.pk])
+
+    def suggested_ids(self, label, context=''):
+        return [variant['id'] for variant, _ in get_profile_variant_index(self.user2.id).suggest(label, context)]
+
+    # similar labels are suggested best first, spelling, case, accents and punctuation do not matter
+    def test_similar_labels_are_suggested(self):
+        self.assertEqual(self.suggested_ids('First name'), [self.first_name.pk, self.polish_first_name.pk, self.last_name.pk])
+        self.assertEqual(self.suggested_ids('FIRST-NAME'), self.suggested_ids('first name'))
+        self.assertEqual(self.suggested_ids('Phóne'), [self.phone.pk])
+        self.assertEqual(self.suggested_ids('Passport number'), [])
+
+    # context decides between variants with equally similar labels
+    def test_context_ranks_variants(self):
+        self.assertEqual(self.suggested_ids('Firstname', 'polish')[:2], [self.polish_first_name.pk, self.first_name.pk])
+        self.assertEqual(self.suggested_ids('Firstname')[:2], [self.first_name.pk, self.polish_first_name.pk])
+
+    # words are matched too, when label has more words than the variant
+    def test_word_match(self):
+        index = ProfileVariantIndex([{'id': 1, 'label': 'Email', 'context': '', 'variant': 'a@example.com'}, {'id': 2, 'label': 'Phone', 'context': '', 'variant': '1'}])
+        self.assertEqual([(variant['id'], score) for variant, score in index.suggest('Work email')], [(1, 0.4)])
+
+    # only as many as limit, variants with the same label are scored once and the oldest come first
+    def test_limit(self):
+        index = ProfileVariantIndex([{'id': variant_id, 'label': 'Email', 'context': '', 'variant': f'{variant_id}@example.com'} for variant_id in range(1, 11)])
+        self.assertEqual([variant['id'] for variant, _ in index.suggest('email', limit=3)], [1, 2, 3])
+
+    # index is built once and kept until variants of the user change
+    def test_index_is_cached_until_variants_change(self):
+        index = get_profile_variant_index(self.user2.id)
+        self.assertEqual(len(index), 4)
+        with self.assertNumQueries(0):
+            self.assertIs(get_profile_variant_index(self.user2.id), index)
+        email = ProfileIdentityVariant.objects.create(user=self.user2, label='Email', variant='michael@example.com')
+        self.assertEqual(self.suggested_ids('E-mail'), [email.pk])
+        email.label = 'Nickname'
+        email.save()
+        self.assertEqual(self.suggested_ids('E-mail'), [])
+        self.phone.delete()
+        self.assertEqual(self.suggested_ids('Phone'), [])
+
+    # bulk import sends no signals, index is rebuilt anyway
+    def test_index_is_rebuilt_after_import(self):
+        get_profile_variant_index(self.user2.id)
+        self.client.force_authenticate(user=self.user2)
+        self.client.post(reverse('api-profile-identity-variant-import'), {'file': SimpleUploadedFile('variants.csv', b'label,variant\nEmail,michael@example.com\n')}, format='multipart')
+        self.assertEqual(len(self.suggested_ids('Email')), 1)
+
+    # accepted request detail has suggestions for every request identity variant
+    def test_receive_detail_suggestions(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        variants = response.json()['request_identity_variants']
+        self.assertEqual(variants[0]['suggested_profile_identity_variants'][0], {
+            'id': self.polish_first_name.pk, 'label': 'Firstname', 'context': 'Polish', 'variant': 'Michał', 'score': 0.9,
+        })
+        self.assertEqual([variant['id'] for variant in variants[0]['suggested_profile_identity_variants']], [self.polish_first_name.pk, self.first_name.pk, self.last_name.pk])
+        self.assertEqual(variants[1]['suggested_profile_identity_variants'], [])
+
+    # pending request can not be linked, so it has no suggestions and the index is not built
+    def test_pending_request_has_no_suggestions(self):
+        self.request1.status = 'pending'
+        self.request1.save()
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_detail_url)
+        self.assertEqual(response.json()['request_identity_variants'][0]['suggested_profile_identity_variants'], [])
+        self.assertEqual(len(profile_variant_indexes), 0)
+
+    # ETag changes when profile identity variants change, as suggestions do
+    def test_etag_follows_profile_variants(self):
+        self.client.force_authenticate(user=self.user2)
+        response = self.client.get(self.request_receive_detail_url)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(self.request_receive_detail_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_304_NOT_MODIFIED)
+        ProfileIdentityVariant.objects.create(user=self.user2, label='Passport Number', variant='AB123')
+        response = self.client.get(self.request_receive_detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['request_identity_variants'][1]['suggested_profile_identity_variants'][0]['variant'], 'AB123')
+
+    # async detail has the same suggestions, index is built outside the event loop
+    def test_async_receive_detail_suggestions(self):
+        self.client.force_authenticate(user=self.user2)
+        sync_data = self.client.get(self.request_receive_detail_url).json()
+        profile_variant_indexes.clear()
+        headers = {'Authorization': f'Bearer {RefreshToken.for_user(self.user2).access_token}'}
+
+        async def get():
+            return await self.async_client.get(self.async_request_receive_detail_url, headers=headers)
+        response = async_to_sync(get)()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), sync_data)
+
+    # benchmark builds an index in memory and measures suggestions
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_profile_variant_suggestions', variants=50, labels=10, lookups=20, stdout=out)
+        self.assertIn('suggest ms', out.getvalue())
@@ -10,22 +10,47 @@ urlpatterns = [
 
     # profile identity variant management 
     path('profile/identity-variant/', ProfileIdentityVariantListCreateAPIView.as_view(), name='api-profile-identity-variant-list-create'),
+    path('profile/identity-variant/import/', ProfileIdentityVariantImportAPIView.as_view(), name='api-profile-identity-variant-import'),
     path('profile/identity-variant/<int:pk>/', ProfileIdentityVariantDetailAPIView.as_view(), name='api-profile-identity-variant-detail'),
 
     # send requests management
     path('request/send/', RequestSendListCreateAPIView.as_view(), name='api-request-send-list-create'),
     path('request/send/<int:pk>/', RequestSendDetailAPIView.as_view(), name='api-request-send-detail'),
     path('request/send/<int:pk>/request-identity-variant/', RequestSendRequestIdentityVariantListCreateAPIView.as_view(), name='api-request-send-request-identity-variant-list-create'),
+    path('request/send/<int:pk>/request-identity-variant/bulk/', RequestSendRequestIdentityVariantBulkCreateAPIView.as_view(), name='api-request-send-request-identity-variant-bulk-create'),
     path('request/send/<int:pk>/request-identity-variant/<int:request_identity_variant_pk>/', RequestSendRequestIdentityVariantDetailAPIView.as_view(), name='api-request-send-request-identity-variant-detail'),
 
     # received requests management
     path('request/receive/', RequestReceiveListAPIView.as_view(), name='api-request-receive-list'),
+    path('request/receive/bulk-status/', RequestReceiveBulkStatusAPIView.as_view(), name='api-request-receive-bulk-status'),
     path('request/receive/<int:pk>/', RequestReceiveDetailAPIView.as_view(), name='api-request-receive-detail'),
     path('request/receive/<int:pk>/request-identity-variant/', RequestReceiveRequestIdentityVariantListAPIView.as_view(), name='api-request-receive-request-identity-variant-list'),
+    path('request/receive/<int:pk>/request-identity-variant/bulk-link/', RequestReceiveRequestIdentityVariantBulkLinkAPIView.as_view(), name='api-request-receive-request-identity-variant-bulk-link'),
     path('request/receive/<int:pk>/request-identity-variant/<int:request_identity_variant_pk>/', RequestReceiveRequestIdentityVariantDetailAPIView.as_view(), name='api-request-receive-request-identity-variant-detail'),
     path('request/receive/<int:pk>/accept/', RequestReceiveAcceptAPIView.as_view(), name='api-request-receive-accept'),
     path('request/receive/<int:pk>/deny/', RequestReceiveDenyAPIView.as_view(), name='api-request-receive-deny'),
 
+    # async read-only versions of receive and profile identity variant list endpoints, for ASGI
+    path('async/profile/identity-variant/', AsyncProfileIdentityVariantListAPIView.as_view(), name='api-async-profile-identity-variant-list'),
+    path('async/request/receive/', AsyncRequestReceiveListAPIView.as_view(), name='api-async-request-receive-list'),
+    path('async/request/receive/<int:pk>/', AsyncRequestReceiveDetailAPIView.as_view(), name='api-async-request-receive-detail'),
+    path('async/request/receive/<int:pk>/request-identity-variant/', AsyncRequestReceiveRequestIdentityVariantListAPIView.as_view(), name='api-async-request-receive-request-identity-variant-list'),
+
+    # counts of requests and profile identity variants for dashboard
+    path('summary/', SummaryAPIView.as_view(), name='api-summary'),
+
+    # username autocomplete
+    path('users/search/', UserSearchAPIView.as_view(), name='api-user-search'),
+
+    # delta sync of sent and received requests
+    path('changes/', ChangesAPIView.as_view(), name='api-changes'),
+    # push of new and status-changed requests, Server-Sent Events
+    path('events/', request_event_stream, name='api-request-event-stream'),
+
+    # streamed export of all sent and received requests
+    path('export/requests.ndjson', RequestExportNDJSONAPIView.as_view(), name='api-request-export-ndjson'),
+    path('export/requests.csv', RequestExportCSVAPIView.as_view(), name='api-request-export-csv'),
+
     # API documentation
     path('schema/', SpectacularAPIView.as_view(), name='schema'),
     path('schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
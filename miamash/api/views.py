@@ -1,25 +1,90 @@
-from rest_framework import generics
+from rest_framework import generics, serializers
+from rest_framework.response import Response
+from rest_framework import status
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
 from core.models import * 
 from .serializers import *
 from .permissions import *
+from .pagination import RequestCursorPagination, IdentityVariantCursorPagination
+from .mixins import ConditionalGetMixin, SparseFieldsetMixin, ValuesListMixin
+from .filters import RequestListFilter, RequestSearchFilter
+from django.utils import timezone
+from drf_spectacular.utils import extend_schema
+from core.events import get_event_broker, publish_request_status_changed
+from core.profile_variant_cache import get_or_set_profile_variant_data, get_profile_variant_version
+from django.utils.http import quote_etag
+import hashlib
+from core.counters import add_request_deltas, apply_counter_deltas, get_user_counters, new_counter_deltas
+from core.user_search import search_usernames
+from functools import partial
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import APIException, AuthenticationFailed, NotAuthenticated, NotFound, PermissionDenied
+from rest_framework.views import APIView
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Prefetch
+from django.views import View
+import asyncio
+import json
+from itertools import islice
+from django.core.handlers.asgi import ASGIRequest
+from drf_spectacular.types import OpenApiTypes
+from core.export import export_csv_lines, export_ndjson_lines
+from core.profile_variant_import import ImportFileError, import_profile_identity_variants
+from core.profile_variant_suggestions import get_profile_variant_index
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import SAFE_METHODS
 
 
 # Profile Identity Variant views 
-class ProfileIdentityVariantListCreateAPIView(generics.ListCreateAPIView):
+class ProfileIdentityVariantListCreateAPIView(ConditionalGetMixin, generics.ListCreateAPIView):
     """
     User can see their profile identity variants and create new ones.
     """
     serializer_class = ProfileIdentityVariantSerializer
     permission_classes = [IsProfileOwner]
+    pagination_class = IdentityVariantCursorPagination
 
     # for list query where logged in user is the owner only 
     def get_queryset(self):
         return ProfileIdentityVariant.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        # serialised page is cached per user, URL and list version, version changes on every create, update and delete
+        data = get_or_set_profile_variant_data(request.user.id, ('api-list', request.build_absolute_uri()), lambda: super(ProfileIdentityVariantListCreateAPIView, self).list(request, *args, **kwargs).data)
+        return Response(data)
+
+    def get_conditional_etag(self):
+        # ETag from cached list version, so 304 needs no query
+        version = [self.request.user.pk, self.request.build_absolute_uri(), self.request.accepted_renderer.format, get_profile_variant_version(self.request.user.pk)] # type: ignore
+        return quote_etag(hashlib.md5(repr(version).encode(), usedforsecurity=False).hexdigest())
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
-class ProfileIdentityVariantDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class ProfileIdentityVariantImportAPIView(generics.GenericAPIView):
+    """
+    User can create many profile identity variants at once by uploading CSV or NDJSON file.
+    Nothing is created when a row is not valid, response lists row errors instead.
+    """
+    serializer_class = ProfileIdentityVariantImportSerializer
+    permission_classes = [IsProfileOwner]
+    parser_classes = [MultiPartParser]
+
+    @extend_schema(responses={201: ProfileIdentityVariantImportResultSerializer, 400: ProfileIdentityVariantImportResultSerializer})
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            created, error_count, errors = import_profile_identity_variants(request.user, serializer.validated_data['file'], validate_profile_identity_variant_rows)
+        except ImportFileError as error:
+            raise serializers.ValidationError({'file': [str(error)]})
+        result = ProfileIdentityVariantImportResultSerializer({'created': created, 'error_count': error_count, 'errors': errors}).data
+        return Response(result, status=status.HTTP_400_BAD_REQUEST if error_count else status.HTTP_201_CREATED)
+
+class ProfileIdentityVariantDetailAPIView(ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     User can see, edit and delete their profile identity variants.
     """
@@ -33,107 +98,210 @@ class ProfileIdentityVariantDetailAPIView(generics.RetrieveUpdateDestroyAPIView)
 
 # Request Send views 
 
-class RequestSendListCreateAPIView(generics.ListCreateAPIView):
+class RequestSendListCreateAPIView(ValuesListMixin, SparseFieldsetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     """
     User can see sent-requests and create new ones.
     """
     serializer_class = RequestSendListCreateSerializer
     permission_classes = [IsRequestSender]
+    pagination_class = RequestCursorPagination
+    filter_backends = [RequestListFilter, RequestSearchFilter]
 
     # for list query where logged in user is the sender only 
     def get_queryset(self):
-        return Request.objects.filter(sender=self.request.user)
+        # join receiver, serializer shows receiver username for every row
+        return self.select_related_requested(Request.objects.filter(sender=self.request.user), 'receiver')
+
+    # create also accepts nested request identity variants, list stays without them
+    def get_serializer_class(self):
+        if self.request.method == 'POST':
+            return RequestSendCreateSerializer
+        return RequestSendListCreateSerializer
 
     def perform_create(self, serializer):
         serializer.save(sender=self.request.user)
 
-class RequestSendDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class RequestSendDetailAPIView(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     User can see, edit and delete their sent-requests.
     """
     serializer_class = RequestSendDetailSerializer
     permission_classes = [IsRequestSender]
+    # nested rows that are part of the response, for ETag
+    conditional_related = ['request_identity_variants', 'request_identity_variants__profile_link']
 
     # for detail query where logged in user is the sender only 
     def get_queryset(self):
-        return Request.objects.filter(sender=self.request.user)
+        # receiver and nested variants with their profile links are loaded with two queries, unless left out with ?fields= / ?omit=
+        queryset = self.select_related_requested(Request.objects.filter(sender=self.request.user), 'receiver')
+        return self.prefetch_related_requested(queryset, Prefetch('request_identity_variants', queryset=RequestIdentityVariant.objects.select_related('profile_link')))
 
-class RequestSendRequestIdentityVariantListCreateAPIView(generics.ListCreateAPIView):
+class RequestSendRequestIdentityVariantListCreateAPIView(SparseFieldsetMixin, ConditionalGetMixin, generics.ListCreateAPIView):
     """
     User can see and create request identity variants for their sent-requests.
     """
     serializer_class = RequestSendRequestIdentityVariantSerializer
     permission_classes = [IsRequestSender]
+    # nested rows that are part of the response, for ETag
+    conditional_related = ['request', 'profile_link']
+    pagination_class = IdentityVariantCursorPagination
 
     def get_queryset(self):
         request_id = self.kwargs['pk']
-        return RequestIdentityVariant.objects.filter(request__id=request_id, request__sender=self.request.user)
+        # join profile_link, serializer shows shared variant for every row
+        return self.select_related_requested(RequestIdentityVariant.objects.filter(request__id=request_id, request__sender=self.request.user), 'profile_link')
 
     def perform_create(self, serializer):
         request_id = self.kwargs['pk']
         request_instance = generics.get_object_or_404(Request, id=request_id, sender=self.request.user)
         serializer.save(request=request_instance)
 
-class RequestSendRequestIdentityVariantDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class RequestSendRequestIdentityVariantBulkCreateAPIView(generics.CreateAPIView):
+    """
+    User can create many request identity variants for their sent-request in one call, by posting a list.
+    """
+    serializer_class = RequestSendRequestIdentityVariantSerializer
+    permission_classes = [IsRequestSender]
+
+    def get_serializer(self, *args, **kwargs):
+        # always validate a list, empty list is not a valid batch
+        kwargs['many'] = True
+        kwargs['allow_empty'] = False
+        return super().get_serializer(*args, **kwargs)
+
+    def perform_create(self, serializer):
+        # one parent lookup for the whole batch
+        request_id = self.kwargs['pk']
+        request_instance = generics.get_object_or_404(Request, id=request_id, sender=self.request.user)
+        serializer.save(request=request_instance)
+
+class RequestSendRequestIdentityVariantDetailAPIView(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     User can see, edit and delete request identity variants for their sent-requests.
     """
     serializer_class = RequestSendRequestIdentityVariantSerializer
     permission_classes = [IsRequestSender]
+    # nested rows that are part of the response, for ETag
+    conditional_related = ['request', 'profile_link']
     lookup_url_kwarg = 'request_identity_variant_pk'
 
     def get_queryset(self):
         request_id = self.kwargs['pk']
-        return RequestIdentityVariant.objects.filter(request__id=request_id, request__sender=self.request.user)
+        # join parent Request for permission check and profile_link for shared variant, so object is one query
+        return self.select_related_requested(RequestIdentityVariant.objects.filter(request__id=request_id, request__sender=self.request.user), 'request', 'profile_link')
 
 
 
 # Request Receive views
 
-class RequestReceiveListAPIView(generics.ListAPIView):
+class RequestReceiveListAPIView(ValuesListMixin, SparseFieldsetMixin, ConditionalGetMixin, generics.ListAPIView):
     """
     User can see received requests.
     """
     serializer_class = RequestReceiveListSerializer
     permission_classes = [IsRequestReceiver]
+    pagination_class = RequestCursorPagination
+    filter_backends = [RequestListFilter, RequestSearchFilter]
 
     # for list query where logged in user is the receiver only 
     def get_queryset(self):
-        return Request.objects.filter(receiver=self.request.user)
+        # join sender, serializer shows sender username for every row
+        return self.select_related_requested(Request.objects.filter(receiver=self.request.user), 'sender')
     
-class RequestReceiveDetailAPIView(generics.RetrieveAPIView):
+class RequestReceiveDetailAPIView(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveAPIView):
     """
     User can see details of a received request.
     """
     serializer_class = RequestReceiveDetailSerializer
     permission_classes = [IsRequestReceiver]
+    # nested rows that are part of the response, for ETag
+    conditional_related = ['request_identity_variants', 'request_identity_variants__profile_link']
 
     # for detail query where logged in user is the receiver only 
     def get_queryset(self):
-        return Request.objects.filter(receiver=self.request.user)
-
-class RequestReceiveRequestIdentityVariantListAPIView(generics.ListAPIView):
+        # sender and nested variants with their profile links are loaded with two queries, unless left out with ?fields= / ?omit=
+        queryset = self.select_related_requested(Request.objects.filter(receiver=self.request.user), 'sender')
+        return self.prefetch_related_requested(queryset, Prefetch('request_identity_variants', queryset=RequestIdentityVariant.objects.select_related('profile_link')))
+
+    def get_conditional_etag(self):
+        etag = super().get_conditional_etag()
+        # suggested profile identity variants change with variants of the user, known only by their list version
+        if self.is_relation_requested('request_identity_variants'):
+            version = [etag, get_profile_variant_version(self.request.user.pk)]
+            return quote_etag(hashlib.md5(repr(version).encode(), usedforsecurity=False).hexdigest())
+        return etag
+
+class RequestReceiveRequestIdentityVariantListAPIView(SparseFieldsetMixin, ConditionalGetMixin, generics.ListAPIView):
     """
     User can see request identity variants for their received requests.
     """
     serializer_class = RequestReceiveRequestIdentityVariantSerializer
     permission_classes = [IsRequestReceiver]
+    # nested rows that are part of the response, for ETag
+    conditional_related = ['request', 'profile_link']
+    pagination_class = IdentityVariantCursorPagination
 
     def get_queryset(self):
         request_id = self.kwargs['pk']
-        return RequestIdentityVariant.objects.filter(request__id=request_id, request__receiver=self.request.user)
+        # join profile_link, serializer shows shared variant for every row
+        return self.select_related_requested(RequestIdentityVariant.objects.filter(request__id=request_id, request__receiver=self.request.user), 'profile_link')
     
-class RequestReceiveRequestIdentityVariantDetailAPIView(generics.RetrieveUpdateAPIView):
+class RequestReceiveRequestIdentityVariantDetailAPIView(SparseFieldsetMixin, ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     """
     User can see and edit request identity variants for their received requests.
     """
     serializer_class = RequestReceiveRequestIdentityVariantDetailSerializer
     permission_classes = [IsRequestReceiver, IsRequestAccepted]
+    # nested rows that are part of the response, for ETag
+    conditional_related = ['request', 'profile_link']
     lookup_url_kwarg = 'request_identity_variant_pk'
 
     def get_queryset(self):
         request_id = self.kwargs['pk']
-        return RequestIdentityVariant.objects.filter(request__id=request_id, request__receiver=self.request.user)
+        # join parent Request for permission checks and profile_link for shared variant, so object is one query
+        return self.select_related_requested(RequestIdentityVariant.objects.filter(request__id=request_id, request__receiver=self.request.user), 'request', 'profile_link')
+
+class RequestReceiveRequestIdentityVariantBulkLinkAPIView(generics.GenericAPIView):
+    """
+    User can link many request identity variants of their accepted received request with their profile identity variants in one call.
+    """
+    serializer_class = RequestReceiveBulkLinkSerializer
+    permission_classes = [IsRequestReceiver, IsRequestAccepted]
+
+    def get_queryset(self):
+        return Request.objects.filter(receiver=self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        # 404 if user is not receiver, 403 if request is not accepted
+        request_instance = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        links = serializer.validated_data['links']
+
+        # variants have to belong to this request
+        request_identity_variants = list(RequestIdentityVariant.objects.filter(request=request_instance, id__in=links.keys()))
+        missing_variant_ids = set(links) - {variant.id for variant in request_identity_variants}
+        # profile variants have to belong to the user, checked for all of them with one query
+        profile_variant_ids = {profile_variant_id for profile_variant_id in links.values() if profile_variant_id is not None}
+        profile_variants = ProfileIdentityVariant.objects.filter(user=request.user).in_bulk(profile_variant_ids)
+        missing_profile_variant_ids = profile_variant_ids - set(profile_variants)
+
+        errors = {}
+        if missing_variant_ids:
+            errors['request_identity_variants'] = [f"Request identity variant with id {variant_id} does not exist in this request." for variant_id in sorted(missing_variant_ids)]
+        if missing_profile_variant_ids:
+            errors['profile_identity_variants'] = [f"Profile identity variant with id {profile_variant_id} does not exist." for profile_variant_id in sorted(missing_profile_variant_ids)]
+        if errors:
+            raise serializers.ValidationError(errors)
+
+        # write all links with one query
+        now = timezone.now()
+        for variant in request_identity_variants:
+            variant.profile_link = profile_variants.get(links[variant.id])
+            # bulk_update skips auto_now, so set updated_at explicitly
+            variant.updated_at = now
+        RequestIdentityVariant.objects.bulk_update(request_identity_variants, ['profile_link', 'updated_at'])
+        return Response(RequestReceiveRequestIdentityVariantSerializer(request_identity_variants, many=True).data)
 
 class RequestReceiveAcceptAPIView(generics.UpdateAPIView):
     """
@@ -144,11 +312,17 @@ class RequestReceiveAcceptAPIView(generics.UpdateAPIView):
     lookup_url_kwarg = 'pk'
 
     def get_queryset(self):
-        return Request.objects.filter(receiver=self.request.user)
+        queryset = Request.objects.filter(receiver=self.request.user)
+        # status read by get_object() stays locked until commit, so counters of concurrent status changes do not drift
+        return queryset if self.request.method in SAFE_METHODS else queryset.select_for_update()
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
 
     def perform_update(self, serializer):
-        request_instance = self.get_object()
-        serializer.save(request=request_instance, status=Request.Status.ACCEPTED)
+        # serializer.instance is the object update() already fetched, no need to get_object() again
+        serializer.save(status=Request.Status.ACCEPTED)
 
 class RequestReceiveDenyAPIView(generics.UpdateAPIView):
     """
@@ -159,12 +333,425 @@ class RequestReceiveDenyAPIView(generics.UpdateAPIView):
     lookup_url_kwarg = 'pk'
 
     def get_queryset(self):
-        return Request.objects.filter(receiver=self.request.user)
+        queryset = Request.objects.filter(receiver=self.request.user)
+        # status read by get_object() stays locked until commit, so counters of concurrent status changes do not drift
+        return queryset if self.request.method in SAFE_METHODS else queryset.select_for_update()
+
+    @transaction.atomic
+    def update(self, request, *args, **kwargs):
+        return super().update(request, *args, **kwargs)
 
     def perform_update(self, serializer):
-        request_instance = self.get_object()
+        # serializer.instance is the object update() already fetched, no need to get_object() again
+        request_instance = serializer.instance
         # if request was previously accepted, wipe out the links first 
         if request_instance.status == Request.Status.ACCEPTED:
-            RequestIdentityVariant.objects.filter(request=request_instance).update(profile_link=None)
+            # update() skips auto_now, so set updated_at explicitly
+            RequestIdentityVariant.objects.filter(request=request_instance).update(profile_link=None, updated_at=timezone.now())
         # then set the status to DENIED
-        serializer.save(request=request_instance, status=Request.Status.DENIED)
+        serializer.save(status=Request.Status.DENIED)
+
+class RequestReceiveBulkStatusAPIView(generics.GenericAPIView):
+    """
+    User can accept or deny many of their received requests in one call.
+    Response has result for every id, ids that are not users received requests are reported as not found.
+    """
+    serializer_class = RequestReceiveBulkStatusSerializer
+    permission_classes = [IsRequestReceiver]
+
+    def get_queryset(self):
+        return Request.objects.filter(receiver=self.request.user)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # keep order client sent, but drop duplicates
+        ids = list(dict.fromkeys(serializer.validated_data['ids']))
+        new_status = serializer.validated_data['status']
+
+        with transaction.atomic():
+            # only requests user received, others are reported back as not found
+            # rows stay locked until commit, so a concurrent accept / deny of the same ids waits and reads the new status,
+            # counters and events are then based on the status that is actually replaced
+            found_requests = list(self.get_queryset().filter(id__in=ids).select_for_update().only('id', 'sender_id', 'receiver_id', 'status', 'created_at'))
+            found_ids = {request_instance.id for request_instance in found_requests}
+            # update() skips auto_now, so set updated_at explicitly, after waiting for the locks so it is close to commit
+            now = timezone.now()
+            # denied requests should not share data anymore, wipe the links of all of them with one update
+            if new_status == Request.Status.DENIED:
+                RequestIdentityVariant.objects.filter(request__receiver=request.user, request_id__in=found_ids).update(profile_link=None, updated_at=now)
+            # one UPDATE ... WHERE id IN (...) AND receiver = user
+            self.get_queryset().filter(id__in=found_ids).update(status=new_status, updated_at=now)
+            # update() does not send save signals, so update dashboard counters and tell senders about the new status here
+            counter_deltas = new_counter_deltas()
+            for request_instance in found_requests:
+                if request_instance.status == new_status:
+                    continue
+                add_request_deltas(counter_deltas, request_instance, request_instance.status, -1)
+                add_request_deltas(counter_deltas, request_instance, new_status, 1)
+                request_instance.status = new_status
+                transaction.on_commit(partial(publish_request_status_changed, request_instance))
+            apply_counter_deltas(counter_deltas)
+
+        results = [
+            {'id': request_id, 'updated': True, 'status': new_status} if request_id in found_ids
+            else {'id': request_id, 'updated': False, 'detail': 'Not found.'}
+            for request_id in ids
+        ]
+        return Response({'results': results})
+
+
+# Summary views
+
+class SummaryAPIView(generics.GenericAPIView):
+    """
+    User can see counts of their received requests by status, sent requests awaiting response and profile identity variants.
+    """
+    serializer_class = SummarySerializer
+    pagination_class = None
+
+    def get(self, request, *args, **kwargs):
+        # denormalised counters, from cache or one query however many requests user has
+        return Response(self.get_serializer(get_user_counters(request.user.id)).data)
+
+
+# User search views
+
+class UserSearchAPIView(generics.GenericAPIView):
+    """
+    User can get usernames starting with a prefix, to autocomplete receiver of a request.
+    """
+    serializer_class = UserSearchSerializer
+    pagination_class = None
+
+    @extend_schema(parameters=[UserSearchQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query_serializer = UserSearchQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        # indexed prefix scan that stops after limit rows, cached per prefix
+        usernames = search_usernames(query_serializer.validated_data['prefix'], query_serializer.validated_data['limit'])
+        return Response(self.get_serializer({'results': usernames}).data)
+
+
+# Delta sync views
+
+class ChangesAPIView(generics.GenericAPIView):
+    """
+    User can get sent and received requests and their request identity variants that were created, updated or deleted after a sync token.
+    Without since all current rows are returned, response has sync_token to use as since in the next call.
+    """
+    serializer_class = ChangesSerializer
+    pagination_class = None
+
+    @extend_schema(parameters=[ChangesQuerySerializer])
+    def get(self, request, *args, **kwargs):
+        query_serializer = ChangesQuerySerializer(data=request.query_params)
+        query_serializer.is_valid(raise_exception=True)
+        since = query_serializer.validated_data.get('since')
+
+        # updated_at and deleted_at are stamped before their transaction commits, so a row can become visible after the read
+        # with an older time, token is SYNC_CLOCK_SKEW before the read and such rows are sent next time, client applies rows again
+        sync_time = timezone.now()
+        sync_token = sync_time - settings.SYNC_CLOCK_SKEW
+        # tombstones older than retention are pruned, client has to start again with full sync
+        if since is not None and since < sync_time - settings.SYNC_TOMBSTONE_RETENTION:
+            return Response({'detail': 'Sync token expired, sync again without since.'}, status=status.HTTP_410_GONE)
+
+        user = request.user
+        user_requests = Request.objects.filter(Q(sender=user) | Q(receiver=user))
+        requests_sent = Request.objects.filter(sender=user).select_related('receiver')
+        requests_received = Request.objects.filter(receiver=user).select_related('sender')
+        request_identity_variants = RequestIdentityVariant.objects.filter(request__in=user_requests.values('id')).select_related('profile_link')
+        deleted = {'requests': [], 'request_identity_variants': []}
+
+        if since is not None:
+            # >= so rows written in the same microsecond as previous token are not lost, client applies them again
+            requests_sent = requests_sent.filter(updated_at__gte=since)
+            requests_received = requests_received.filter(updated_at__gte=since)
+            # shared value changes when receiver edits the linked profile variant
+            request_identity_variants = request_identity_variants.filter(Q(updated_at__gte=since) | Q(profile_link__updated_at__gte=since))
+            # Request tombstones keep sender and receiver, variant tombstones are matched through requests user still has
+            tombstones = Tombstone.objects.filter(deleted_at__gte=since).filter(
+                Q(sender_id=user.id) | Q(receiver_id=user.id) |
+                Q(object_type=Tombstone.ObjectType.REQUEST_IDENTITY_VARIANT, request_id__in=user_requests.values('id'))
+            )
+            for object_type, object_id in tombstones.values_list('object_type', 'object_id'):
+                key = 'requests' if object_type == Tombstone.ObjectType.REQUEST else 'request_identity_variants'
+                deleted[key].append(object_id)
+
+        serializer = self.get_serializer({
+            'sync_token': sync_token,
+            'requests_sent': requests_sent,
+            'requests_received': requests_received,
+            'request_identity_variants': request_identity_variants,
+            'deleted': deleted,
+        })
+        return Response(serializer.data)
+
+
+# Export views
+
+class RequestExportAPIView(generics.GenericAPIView):
+    """
+    Base of exports of every sent and received request of logged in user, streamed row by row instead of built in memory.
+    """
+    pagination_class = None
+    content_type = None
+    filename = None
+    # export lines read from the database per thread switch under ASGI
+    async_batch_size = 500
+
+    def perform_content_negotiation(self, request, force=False):
+        # export is not rendered, errors are JSON whatever the Accept header asks for
+        return super().perform_content_negotiation(request, force=True)
+
+    def get_lines(self, user):
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        lines = self.get_lines(request.user)
+        # ASGI would read a sync iterator into one list before sending it, so lines are read in batches in the sync thread
+        if isinstance(request._request, ASGIRequest):
+            lines = iterate_in_thread(lines, self.async_batch_size)
+        response = StreamingHttpResponse(lines, content_type=self.content_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.filename}"'
+        return response
+
+class RequestExportNDJSONAPIView(RequestExportAPIView):
+    """
+    User can download all their sent and received requests with request identity variants and linked profile variants,
+    one JSON object per request per line.
+    """
+    content_type = 'application/x-ndjson; charset=utf-8'
+    filename = 'requests.ndjson'
+
+    @extend_schema(operation_id='export_requests_ndjson', responses={(200, 'application/x-ndjson'): OpenApiTypes.STR})
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_lines(self, user):
+        return export_ndjson_lines(user)
+
+class RequestExportCSVAPIView(RequestExportAPIView):
+    """
+    User can download all their sent and received requests as CSV, one line per request identity variant.
+    """
+    content_type = 'text/csv; charset=utf-8'
+    filename = 'requests.csv'
+
+    @extend_schema(operation_id='export_requests_csv', responses={(200, 'text/csv'): OpenApiTypes.STR})
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    def get_lines(self, user):
+        return export_csv_lines(user)
+
+async def iterate_in_thread(iterable, batch_size):
+    # sync iterable as async iterator, database is read in the sync thread a batch at a time
+    iterator = iter(iterable)
+    next_batch = sync_to_async(lambda: list(islice(iterator, batch_size)))
+    while batch := await next_batch():
+        for item in batch:
+            yield item
+
+
+# Request event stream
+
+def authenticate_api_request(api_request):
+    """
+    Authenticates DRF request with API authentication classes, so JWT, session and token all work.
+    Raises AuthenticationFailed if sent credentials are not valid, NotAuthenticated if there are none.
+    """
+    if not api_request.user.is_authenticated:
+        raise NotAuthenticated
+
+def get_exception_response(exc, api_request):
+    """
+    JSON response of APIException with the same body, status and headers as DRF exception_handler gives in sync views:
+    field errors as they are, other errors under detail, WWW-Authenticate of the first authentication class.
+    """
+    headers = {}
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        # same as APIView.handle_exception, 403 when no authentication class has a WWW-Authenticate header
+        authenticate_header = APIView().get_authenticate_header(api_request)
+        if authenticate_header:
+            headers['WWW-Authenticate'] = authenticate_header
+        else:
+            exc.status_code = status.HTTP_403_FORBIDDEN
+    if getattr(exc, 'wait', None):
+        headers['Retry-After'] = str(int(exc.wait))
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return JsonResponse(data, status=exc.status_code, headers=headers, safe=False)
+
+async def request_event_stream(request):
+    """
+    Server-Sent Events stream for logged in user: request.created when a request is sent to the user,
+    request.status_changed when a request the user sent is accepted or denied.
+    Stream closes after EVENT_STREAM_TIMEOUT seconds and client reconnects, missed changes can be read from /api/changes/.
+    Async view, served without blocking a worker thread under ASGI.
+    """
+    api_request = APIView().initialize_request(request)
+    try:
+        # authentication can read token, session and user from database, so it runs in a thread
+        await sync_to_async(authenticate_api_request)(api_request)
+    except APIException as exc:
+        return get_exception_response(exc, api_request)
+
+    # subscribe before the response is returned, so no event is missed between connecting and first read
+    subscription = get_event_broker().subscribe(api_request.user.id)
+    response = StreamingHttpResponse(stream_events(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # do not let proxies buffer the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+async def stream_events(subscription):
+    loop = asyncio.get_running_loop()
+    closes_at = loop.time() + settings.EVENT_STREAM_TIMEOUT
+    try:
+        # client waits this long before it reconnects
+        yield 'retry: 3000\n\n'
+        while loop.time() < closes_at:
+            timeout = min(settings.EVENT_STREAM_HEARTBEAT, closes_at - loop.time())
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                # comment line keeps the connection open through proxies
+                yield ': keep-alive\n\n'
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    finally:
+        subscription.close()
+
+
+# Async read-only views
+
+class AsyncReadOnlyAPIView(SparseFieldsetMixin, View):
+    """
+    Base of async read-only API views, with the same authentication, permission classes and serializers as sync views.
+    Rows are read with Django async ORM, so under ASGI the view runs on the event loop instead of a worker thread.
+    JSON only, no browsable API and no ETag.
+    """
+    serializer_class = None
+    permission_classes = []
+
+    async def get(self, request, *args, **kwargs):
+        api_request = APIView().initialize_request(request)
+        try:
+            # authentication can read token, session and user from database, so it runs in a thread
+            await sync_to_async(authenticate_api_request)(api_request)
+            # get_queryset uses self.request.user like in sync views
+            self.request = api_request
+            await self.acheck_permissions(api_request)
+            data = await self.aget_data(api_request)
+        except APIException as exc:
+            # same error responses as sync views
+            return get_exception_response(exc, api_request)
+        return JsonResponse(data, safe=False)
+
+    async def acheck_permissions(self, request, obj=None):
+        # permission classes only compare ids of loaded rows, so checking them does not query the database
+        for permission in [permission_class() for permission_class in self.permission_classes]:
+            if not permission.has_permission(request, self):
+                raise PermissionDenied
+            if obj is not None and not permission.has_object_permission(request, self, obj):
+                raise PermissionDenied
+
+    def get_queryset(self):
+        raise NotImplementedError
+
+    async def aget_data(self, request):
+        raise NotImplementedError
+
+class AsyncListAPIView(AsyncReadOnlyAPIView):
+    """
+    Async list view, paginated with the same cursor pagination as sync list views.
+    """
+    pagination_class = None
+    filter_backends = []
+
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    async def aget_data(self, request):
+        paginator = self.pagination_class()
+        # filter backends can read from the database or cache while building the queryset, sender / receiver usernames
+        # are resolved to ids for example, so they run in the sync thread, the page is read on the event loop
+        queryset = await sync_to_async(self.filter_queryset)(self.get_queryset())
+        # list views with ValuesListMixin read the page as dicts
+        if hasattr(self, 'get_values_queryset'):
+            queryset = self.get_values_queryset(queryset, paginator)
+        page = await paginator.apaginate_queryset(queryset, request, view=self)
+        # rows are loaded with everything serializer needs, so serializing does not query
+        serializer = self.serializer_class(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data).data
+
+class AsyncRetrieveAPIView(AsyncReadOnlyAPIView):
+    """
+    Async detail view, object is looked up by pk from URL.
+    """
+    async def aget_data(self, request):
+        try:
+            instance = await self.get_queryset().aget(pk=self.kwargs['pk'])
+        except ObjectDoesNotExist:
+            raise NotFound
+        await self.acheck_permissions(request, instance)
+        return self.serializer_class(instance, context=await self.aget_serializer_context(request, instance)).data
+
+    async def aget_serializer_context(self, request, instance):
+        return {'request': request}
+
+class AsyncProfileIdentityVariantListAPIView(AsyncListAPIView):
+    """
+    Async version of ProfileIdentityVariantListCreateAPIView list.
+    """
+    serializer_class = ProfileIdentityVariantSerializer
+    permission_classes = [IsProfileOwner]
+    pagination_class = IdentityVariantCursorPagination
+
+    def get_queryset(self):
+        return ProfileIdentityVariant.objects.filter(user=self.request.user)
+
+class AsyncRequestReceiveListAPIView(ValuesListMixin, AsyncListAPIView):
+    """
+    Async version of RequestReceiveListAPIView.
+    """
+    serializer_class = RequestReceiveListSerializer
+    permission_classes = [IsRequestReceiver]
+    pagination_class = RequestCursorPagination
+    filter_backends = [RequestListFilter, RequestSearchFilter]
+
+    def get_queryset(self):
+        return self.select_related_requested(Request.objects.filter(receiver=self.request.user), 'sender')
+
+class AsyncRequestReceiveDetailAPIView(AsyncRetrieveAPIView):
+    """
+    Async version of RequestReceiveDetailAPIView.
+    """
+    serializer_class = RequestReceiveDetailSerializer
+    permission_classes = [IsRequestReceiver]
+
+    def get_queryset(self):
+        # nested variants are prefetched by aget, so serializer does not query on the event loop
+        queryset = self.select_related_requested(Request.objects.filter(receiver=self.request.user), 'sender')
+        return self.prefetch_related_requested(queryset, Prefetch('request_identity_variants', queryset=RequestIdentityVariant.objects.select_related('profile_link')))
+
+    async def aget_serializer_context(self, request, instance):
+        context = await super().aget_serializer_context(request, instance)
+        # suggestion index can need a query, so it is built in a thread instead of by the serializer on the event loop
+        if instance.status == Request.Status.ACCEPTED and self.is_relation_requested('request_identity_variants'):
+            context['profile_variant_index'] = await sync_to_async(get_profile_variant_index)(instance.receiver_id)
+        return context
+
+class AsyncRequestReceiveRequestIdentityVariantListAPIView(AsyncListAPIView):
+    """
+    Async version of RequestReceiveRequestIdentityVariantListAPIView.
+    """
+    serializer_class = RequestReceiveRequestIdentityVariantSerializer
+    permission_classes = [IsRequestReceiver]
+    pagination_class = IdentityVariantCursorPagination
+
+    def get_queryset(self):
+        return self.select_related_requested(RequestIdentityVariant.objects.filter(request__id=self.kwargs['pk'], request__receiver=self.request.user), 'profile_link')
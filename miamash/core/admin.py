@@ -4,4 +4,6 @@ from .models import *
 admin.site.register(ProfileIdentityVariant)
 admin.site.register(Request)
 admin.site.register(RequestIdentityVariant)
-
+admin.site.register(Tombstone)
+admin.site.register(UserCounters)
+admin.site.register(UsernameSearchKey)
@@ -0,0 +1,72 @@
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .models import ProfileIdentityVariant, Request, UserCounters
+
+
+# cached counters are dropped on every change, timeout only limits how stale other processes with own local cache can be
+COUNTERS_CACHE_TIMEOUT = 300
+COUNTER_FIELDS = ['pending_received', 'accepted_received', 'denied_received', 'pending_sent', 'profile_identity_variants']
+
+
+def counters_cache_key(user_id):
+    return f'user-counters:{user_id}'
+
+def new_counter_deltas():
+    # user id -> counter field -> change
+    return defaultdict(Counter)
+
+def add_request_deltas(deltas, request_instance, status, sign):
+    """
+    Adds +1 / -1 of request with given status to deltas of its receiver and sender.
+    """
+    deltas[request_instance.receiver_id][f'{status}_received'] += sign
+    if status == Request.Status.PENDING:
+        deltas[request_instance.sender_id]['pending_sent'] += sign
+
+def apply_counter_deltas(deltas):
+    """
+    Applies deltas with one UPDATE per user, F() expressions so concurrent changes are not lost.
+    Cached counters are dropped after commit, so nobody caches the old value again before it is visible.
+    """
+    changed_user_ids = []
+    for user_id, fields in deltas.items():
+        changes = {field: F(field) + change for field, change in fields.items() if change}
+        if changes:
+            UserCounters.objects.filter(user_id=user_id).update(**changes)
+            changed_user_ids.append(user_id)
+    if changed_user_ids:
+        transaction.on_commit(lambda: cache.delete_many([counters_cache_key(user_id) for user_id in changed_user_ids]))
+
+def rebuild_user_counters(user_id):
+    """
+    Counts everything again from Request and ProfileIdentityVariant tables, for users without counters or to fix drift.
+    """
+    received = Request.objects.filter(receiver_id=user_id).aggregate(**{
+        f'{status}_received': Count('id', filter=Q(status=status)) for status in Request.Status.values
+    })
+    values = {
+        **received,
+        'pending_sent': Request.objects.filter(sender_id=user_id, status=Request.Status.PENDING).count(),
+        'profile_identity_variants': ProfileIdentityVariant.objects.filter(user_id=user_id).count(),
+    }
+    UserCounters.objects.update_or_create(user_id=user_id, defaults=values)
+    transaction.on_commit(lambda: cache.delete(counters_cache_key(user_id)))
+    return values
+
+def get_user_counters(user_id):
+    """
+    Returns dict of counters for the user, from cache or with one query.
+    """
+    key = counters_cache_key(user_id)
+    counters = cache.get(key)
+    if counters is None:
+        counters = UserCounters.objects.filter(user_id=user_id).values(*COUNTER_FIELDS).first()
+        if counters is None:
+            # user created without signals, for example with bulk_create or loaddata
+            counters = rebuild_user_counters(user_id)
+        cache.set(key, counters, COUNTERS_CACHE_TIMEOUT)
+    return counters
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class BaseEventBroker:
+    """
+    Interface of the broker that delivers request events to users connected to the event stream.
+    publish() is called from sync code (views, signals), subscribe() from the async stream view.
+    """
+    def publish(self, user_id, event):
+        raise NotImplementedError
+
+    def subscribe(self, user_id):
+        """
+        Returns subscription with async get(), that waits for next event of the user, and close().
+        User is subscribed when this returns, so no event published after it is missed.
+        """
+        raise NotImplementedError
+
+
+class InProcessEventSubscription:
+    def __init__(self, broker, user_id, queue_size):
+        self.broker = broker
+        self.user_id = user_id
+        # queue belongs to event loop of the stream that subscribed
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def put(self, event):
+        # slow client that fell behind loses new events, it can catch up with /api/changes/
+        if not self.queue.full():
+            self.queue.put_nowait(event)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessEventBroker(BaseEventBroker):
+    """
+    Broker for a single server process, events only reach streams opened in the same process.
+    """
+    queue_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user id -> set of subscriptions of every open stream of that user
+        self._subscriptions = {}
+
+    def publish(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            # publish runs in a worker thread, queue can only be used from its event loop
+            if not subscription.loop.is_closed():
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+
+    def subscribe(self, user_id):
+        subscription = InProcessEventSubscription(self, user_id, self.queue_size)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            user_subscriptions = self._subscriptions.get(subscription.user_id, set())
+            user_subscriptions.discard(subscription)
+            if not user_subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+
+@lru_cache(maxsize=None)
+def get_event_broker():
+    """
+    Returns the broker from EVENT_BROKER setting, one instance per process.
+    """
+    return import_string(settings.EVENT_BROKER)()
+
+def request_event_data(request_instance):
+    # only columns of the row itself, so building an event never needs a query
+    return {
+        'id': request_instance.id,
+        'sender_id': request_instance.sender_id,
+        'receiver_id': request_instance.receiver_id,
+        'status': request_instance.status,
+        'created_at': request_instance.created_at.isoformat(),
+    }
+
+def publish_request_created(request_instance):
+    # new request is pushed to its receiver
+    get_event_broker().publish(request_instance.receiver_id, {'type': 'request.created', 'request': request_event_data(request_instance)})
+
+def publish_request_status_changed(request_instance):
+    # accepted / denied request is pushed to its sender
+    get_event_broker().publish(request_instance.sender_id, {'type': 'request.status_changed', 'request': request_event_data(request_instance)})
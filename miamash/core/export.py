@@ -0,0 +1,85 @@
+import csv
+import json
+
+from django.db.models import Prefetch, Q
+
+from .models import Request, RequestIdentityVariant
+
+
+# requests read per query, variants and their profile links are prefetched once per chunk
+EXPORT_CHUNK_SIZE = 1000
+CSV_HEADER = [
+    'request_id', 'direction', 'sender_username', 'receiver_username', 'status', 'request_reasoning', 'created_at',
+    'request_identity_variant_id', 'label', 'context', 'user_provided_variant',
+]
+# first characters spreadsheets read as start of a formula
+CSV_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def export_requests(user):
+    """
+    Yields every sent and received request of user, oldest first, with sender, receiver, variants and linked profile variants loaded.
+    Rows are read EXPORT_CHUNK_SIZE at a time, so memory does not grow with the number of requests.
+    """
+    variants = RequestIdentityVariant.objects.select_related('profile_link').order_by('id')
+    queryset = (
+        Request.objects.filter(Q(sender=user) | Q(receiver=user))
+        .select_related('sender', 'receiver')
+        .prefetch_related(Prefetch('request_identity_variants', queryset=variants))
+        .order_by('id')
+    )
+    return queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def export_request_data(request_instance, user):
+    # same values the request detail endpoints show, plus who is on which side
+    return {
+        'id': request_instance.id,
+        'direction': 'sent' if request_instance.sender_id == user.id else 'received',
+        'sender_username': request_instance.sender.username,
+        'receiver_username': request_instance.receiver.username,
+        'status': request_instance.status,
+        'request_reasoning': request_instance.request_reasoning,
+        'created_at': request_instance.created_at.isoformat(),
+        'request_identity_variants': [
+            {
+                'id': variant.id,
+                'label': variant.label,
+                'context': variant.context,
+                'user_provided_variant': variant.profile_link.variant if variant.profile_link else None,
+            }
+            for variant in request_instance.request_identity_variants.all()
+        ],
+    }
+
+def export_ndjson_lines(user):
+    # one JSON object per request per line
+    for request_instance in export_requests(user):
+        yield json.dumps(export_request_data(request_instance, user), ensure_ascii=False) + '\n'
+
+
+def escape_csv_cell(value):
+    # text written by the other user is shown as text, not run as a formula, when the file is opened in a spreadsheet
+    if isinstance(value, str) and value.startswith(CSV_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class EchoBuffer:
+    # csv.writer writes into this and gets the formatted line back, nothing is kept
+    def write(self, value):
+        return value
+
+
+def export_csv_lines(user):
+    """
+    Yields CSV header and one line per request identity variant, request columns are repeated on each of them.
+    Request without variants has one line with empty variant columns. Text cells that start like a formula get a ' in front.
+    """
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(CSV_HEADER)
+    for request_instance in export_requests(user):
+        data = export_request_data(request_instance, user)
+        request_columns = [data[key] for key in ['id', 'direction', 'sender_username', 'receiver_username', 'status', 'request_reasoning', 'created_at']]
+        for variant in data['request_identity_variants'] or [None]:
+            variant_columns = [variant['id'], variant['label'], variant['context'], variant['user_provided_variant']] if variant else [None] * 4
+            yield writer.writerow([escape_csv_cell(value) for value in request_columns + variant_columns])
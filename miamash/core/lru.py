@@ -0,0 +1,37 @@
+import threading
+from collections import OrderedDict
+
+
+class VersionedLRUCache:
+    """
+    Bounded LRU map local to the process, every value is kept with the version it was computed for.
+    Versions live in the shared cache and change with the data, so a value of an old version is never returned,
+    in any process. Used for receiver usernames (core.receivers) and profile variant indexes (core.profile_variant_suggestions).
+    """
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # key -> (version, value), oldest used first
+        self._entries = OrderedDict()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, version, value):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
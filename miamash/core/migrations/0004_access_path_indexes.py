@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_requestidentityvariant_request'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profileidentityvariant',
+            index=models.Index(fields=['user', 'id'], name='profvariant_user_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['receiver', 'status', 'created_at'], name='request_recv_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['receiver', 'created_at'], name='request_receiver_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['sender', 'created_at'], name='request_sender_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestidentityvariant',
+            index=models.Index(fields=['request', 'id'], name='reqvariant_request_id_idx'),
+        ),
+    ]
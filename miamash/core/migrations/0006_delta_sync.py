@@ -0,0 +1,45 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_type', models.CharField(choices=[('request', 'Request'), ('request_identity_variant', 'Request Identity Variant')], max_length=30)),
+                ('object_id', models.BigIntegerField()),
+                ('request_id', models.BigIntegerField()),
+                ('sender_id', models.BigIntegerField(blank=True, null=True)),
+                ('receiver_id', models.BigIntegerField(blank=True, null=True)),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['sender', 'updated_at'], name='request_sender_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['receiver', 'updated_at'], name='request_receiver_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['sender_id', 'deleted_at'], name='tombstone_sender_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['receiver_id', 'deleted_at'], name='tombstone_recv_deleted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tombstone',
+            index=models.Index(fields=['request_id', 'deleted_at'], name='tombstone_request_deleted_idx'),
+        ),
+    ]
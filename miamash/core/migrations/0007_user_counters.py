@@ -0,0 +1,45 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_counters_of_existing_users(apps, schema_editor):
+    # counts of users that existed before counters, new users get their row from a signal
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Request = apps.get_model('core', 'Request')
+    ProfileIdentityVariant = apps.get_model('core', 'ProfileIdentityVariant')
+    UserCounters = apps.get_model('core', 'UserCounters')
+
+    counters = {user_id: UserCounters(user_id=user_id) for user_id in User.objects.values_list('id', flat=True)}
+    for receiver_id, status, count in Request.objects.values_list('receiver_id', 'status').annotate(count=models.Count('id')):
+        setattr(counters[receiver_id], f'{status}_received', count)
+    for sender_id, count in Request.objects.filter(status='pending').values_list('sender_id').annotate(count=models.Count('id')):
+        counters[sender_id].pending_sent = count
+    for user_id, count in ProfileIdentityVariant.objects.values_list('user_id').annotate(count=models.Count('id')):
+        counters[user_id].profile_identity_variants = count
+    UserCounters.objects.bulk_create(counters.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0006_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserCounters',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='counters', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('pending_received', models.IntegerField(default=0)),
+                ('accepted_received', models.IntegerField(default=0)),
+                ('denied_received', models.IntegerField(default=0)),
+                ('pending_sent', models.IntegerField(default=0)),
+                ('profile_identity_variants', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_counters_of_existing_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+INDEX_NAME = 'core_user_username_lower_idx'
+
+
+def create_username_prefix_index(apps, schema_editor):
+    # auth_user belongs to django.contrib.auth, so the index is created here with SQL
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # pattern ops, so LIKE 'prefix%' uses the index with any database collation
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON auth_user (lower(username) text_pattern_ops)')
+    elif vendor == 'sqlite':
+        # binary collation, range scan lower(username) >= 'prefix' AND < next prefix uses it
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON auth_user (lower(username))')
+
+def drop_username_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0007_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_username_prefix_index, drop_username_prefix_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:49
+
+from django.db import migrations, models
+
+from core.search import FTS_TABLE, SEARCH_INDEX, update_search_documents
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # expression index, search_requests() queries the same to_tsvector expression
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON core_request USING gin (to_tsvector('simple', search_document))")
+    elif vendor == 'sqlite':
+        # standalone FTS5 table instead of triggers on core_request, SQLite drops triggers when Django rebuilds a table
+        schema_editor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(search_document, tokenize='unicode61 remove_diacritics 2')")
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {SEARCH_INDEX}')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+def build_search_documents_of_existing_requests(apps, schema_editor):
+    # new and changed requests are indexed by signals in core/signals.py
+    Request = apps.get_model('core', 'Request')
+    RequestIdentityVariant = apps.get_model('core', 'RequestIdentityVariant')
+    request_ids = list(Request.objects.using(schema_editor.connection.alias).values_list('id', flat=True))
+    update_search_documents(request_ids, Request, RequestIdentityVariant, using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_username_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='request',
+            name='search_document',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+        migrations.RunPython(build_search_documents_of_existing_requests, migrations.RunPython.noop),
+    ]
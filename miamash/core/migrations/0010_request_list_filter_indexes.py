@@ -0,0 +1,21 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_request_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='request',
+            index=models.Index(fields=['sender', 'status', 'created_at'], name='request_sender_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='requestidentityvariant',
+            index=models.Index(condition=models.Q(('profile_link__isnull', True)), fields=['request'], name='reqvariant_unlinked_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.23 on 2026-10-18 15:17
+
+import unicodedata
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+INDEX_NAME = 'core_username_search_key_idx'
+# lower(username) index of migration 0008, search reads UsernameSearchKey now
+OLD_INDEX_NAME = 'core_user_username_lower_idx'
+
+
+def create_search_keys_of_existing_users(apps, schema_editor):
+    # keys of users that existed before, new and renamed users get theirs from a signal, same form as core.user_search.username_search_key
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UsernameSearchKey = apps.get_model('core', 'UsernameSearchKey')
+    keys = (UsernameSearchKey(user_id=user_id, key=unicodedata.normalize('NFKC', username).lower()) for user_id, username in User.objects.values_list('id', 'username').iterator())
+    UsernameSearchKey.objects.bulk_create(keys, batch_size=1000)
+
+def create_username_search_key_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        # "C" collation compares code points, so range key >= 'prefix' AND < next prefix and ORDER BY key both use the index,
+        # search compares in the same collation
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON core_usernamesearchkey ((key COLLATE "C"))')
+    elif vendor == 'sqlite':
+        # binary collation by default, which compares code points too
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON core_usernamesearchkey (key)')
+    if vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {OLD_INDEX_NAME}')
+
+def drop_username_search_key_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {OLD_INDEX_NAME} ON auth_user (lower(username) text_pattern_ops)')
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {OLD_INDEX_NAME} ON auth_user (lower(username))')
+    if vendor in ('postgresql', 'sqlite'):
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0010_request_list_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsernameSearchKey',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='username_search_key', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('key', models.CharField(max_length=300)),
+            ],
+        ),
+        migrations.RunPython(create_search_keys_of_existing_users, migrations.RunPython.noop),
+        migrations.RunPython(create_username_search_key_index, drop_username_search_key_index),
+    ]
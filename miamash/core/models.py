@@ -6,6 +6,13 @@ class ProfileIdentityVariant(models.Model):
     label = models.CharField(max_length=50)
     context = models.TextField(blank=True)
     variant = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # owner's variant list, paginated by id
+            models.Index(fields=['user', 'id'], name='profvariant_user_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} / {self.label} / {self.variant}"
@@ -18,6 +25,7 @@ class Request(models.Model):
     # request info 
     request_reasoning = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     # set status, predefine choices 
     class Status(models.TextChoices):
@@ -26,6 +34,30 @@ class Request(models.Model):
         DENIED = 'denied', 'Denied'
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
 
+    # text of reasoning, usernames and variant labels / contexts for ?q= search, kept up to date by core/search.py
+    search_document = models.TextField(blank=True, default='', editable=False)
+
+    # composite indexes for the sender / receiver list access paths, newest first
+    class Meta:
+        indexes = [
+            models.Index(fields=['receiver', 'status', 'created_at'], name='request_recv_status_idx'),
+            models.Index(fields=['receiver', 'created_at'], name='request_receiver_created_idx'),
+            models.Index(fields=['sender', 'created_at'], name='request_sender_created_idx'),
+            # sent list filtered by status, like request_recv_status_idx for received list
+            models.Index(fields=['sender', 'status', 'created_at'], name='request_sender_status_idx'),
+            # delta sync, rows changed after a sync token
+            models.Index(fields=['sender', 'updated_at'], name='request_sender_updated_idx'),
+            models.Index(fields=['receiver', 'updated_at'], name='request_receiver_updated_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # status as it is in the database, so save signals can tell when status changed
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+
     def __str__(self):
         return f"[{self.pk}] FROM:{self.sender.username} / TO:{self.receiver.username} / {self.request_reasoning}"
 
@@ -34,9 +66,75 @@ class RequestIdentityVariant(models.Model):
     label = models.CharField(max_length=50)
     context = models.TextField(blank=True)
     profile_link = models.ForeignKey(ProfileIdentityVariant,null=True, blank=True, on_delete=models.SET_NULL) 
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # variants of one request, paginated by id
+            models.Index(fields=['request', 'id'], name='reqvariant_request_id_idx'),
+            # ?has_unlinked_variants= filter of request lists, only variants still waiting for a profile link
+            models.Index(fields=['request'], condition=models.Q(profile_link__isnull=True), name='reqvariant_unlinked_idx'),
+        ]
 
     def __str__(self):
         return f"{self.label} / {self.context} / {self.profile_link}"
-    
 
 
+class Tombstone(models.Model):
+    """
+    Record of a deleted Request or RequestIdentityVariant, so delta sync can tell clients what to remove.
+    Rows are written by post_delete signals in core/signals.py.
+    """
+    class ObjectType(models.TextChoices):
+        REQUEST = 'request', 'Request'
+        REQUEST_IDENTITY_VARIANT = 'request_identity_variant', 'Request Identity Variant'
+    object_type = models.CharField(max_length=30, choices=ObjectType.choices)
+    object_id = models.BigIntegerField()
+
+    # plain ids instead of foreign keys, tombstone has to outlive the request and its users
+    # sender and receiver are set for Request tombstones, variant tombstones are matched through request_id
+    request_id = models.BigIntegerField()
+    sender_id = models.BigIntegerField(null=True, blank=True)
+    receiver_id = models.BigIntegerField(null=True, blank=True)
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # tombstones after a sync token, for one user
+            models.Index(fields=['sender_id', 'deleted_at'], name='tombstone_sender_deleted_idx'),
+            models.Index(fields=['receiver_id', 'deleted_at'], name='tombstone_recv_deleted_idx'),
+            models.Index(fields=['request_id', 'deleted_at'], name='tombstone_request_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.object_type} [{self.object_id}] deleted at {self.deleted_at}"
+
+class UserCounters(models.Model):
+    """
+    Denormalised request and profile identity variant counts of one user, shown on dashboard and /api/summary/.
+    Kept up to date by signals in core/signals.py and by bulk paths that skip signals, read through core/counters.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='counters')
+    # received requests by status
+    pending_received = models.IntegerField(default=0)
+    accepted_received = models.IntegerField(default=0)
+    denied_received = models.IntegerField(default=0)
+    # sent requests receiver did not answer yet
+    pending_sent = models.IntegerField(default=0)
+    profile_identity_variants = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user.username} / pending received: {self.pending_received} / pending sent: {self.pending_sent}"
+
+class UsernameSearchKey(models.Model):
+    """
+    Username of one user lowered in Python, for username prefix search in core/user_search.py.
+    SQLite lower() only lowers ASCII letters, so the key is stored instead of indexing lower(username),
+    and non-ASCII usernames are found case insensitively on every database. Kept up to date by signals in core/signals.py.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='username_search_key')
+    # lowering can make a username longer, 'İ' is two characters in lower case
+    key = models.CharField(max_length=300)
+
+    def __str__(self):
+        return f"{self.user_id} / {self.key}"
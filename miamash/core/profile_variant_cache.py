@@ -0,0 +1,59 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# cached lists are replaced by a new version on every change, timeout only frees memory of unused lists
+PROFILE_VARIANT_CACHE_TIMEOUT = 3600
+
+
+def get_profile_variant_cache():
+    # alias from CACHES, so backend can be changed in settings
+    return caches[settings.PROFILE_VARIANT_CACHE]
+
+def version_key(user_id):
+    return f'profile-variants-version:{user_id}'
+
+def get_profile_variant_version(user_id):
+    cache = get_profile_variant_cache()
+    version = cache.get(version_key(user_id))
+    if version is None:
+        # start from current time, not 1, so an evicted version never points to lists cached before eviction
+        cache.add(version_key(user_id), time.time_ns(), None)
+        version = cache.get(version_key(user_id))
+    return version
+
+def bump_profile_variant_version(user_id):
+    """
+    Makes all cached profile identity variant lists of the user stale, now and again after commit,
+    so a list read by another request before the change is committed is not kept either.
+    """
+    def bump():
+        cache = get_profile_variant_cache()
+        try:
+            cache.incr(version_key(user_id))
+        except ValueError:
+            cache.add(version_key(user_id), time.time_ns(), None)
+    bump()
+    transaction.on_commit(bump)
+
+def data_key(user_id, key_parts):
+    key_hash = hashlib.md5(repr(key_parts).encode(), usedforsecurity=False).hexdigest()
+    return f'profile-variants:{user_id}:{get_profile_variant_version(user_id)}:{key_hash}'
+
+def get_or_set_profile_variant_data(user_id, key_parts, compute):
+    """
+    Returns data of the user cached under key_parts and current version, or computes and caches it.
+    Key starts with user id, and cached value carries user id too, so data of another user is never returned.
+    """
+    cache = get_profile_variant_cache()
+    key = data_key(user_id, key_parts)
+    cached = cache.get(key)
+    if cached is not None and cached['user_id'] == user_id:
+        return cached['data']
+    data = compute()
+    cache.set(key, {'user_id': user_id, 'data': data}, PROFILE_VARIANT_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,119 @@
+import codecs
+import csv
+import json
+import os
+from itertools import islice
+
+from django.db import transaction
+
+from .counters import apply_counter_deltas
+from .models import ProfileIdentityVariant
+from .profile_variant_cache import bump_profile_variant_version
+
+
+# rows validated and inserted at a time, memory stays the same whatever the file size
+IMPORT_CHUNK_SIZE = 1000
+# row errors returned to the user, the rest are only counted
+MAX_REPORTED_ERRORS = 100
+IMPORT_FIELDS = ['label', 'context', 'variant']
+# file extension -> format
+IMPORT_FORMATS = {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+
+
+class ImportFileError(Exception):
+    """
+    Upload can not be read at all, for example unknown format, missing CSV header or not UTF-8.
+    """
+
+
+def get_import_format(file_name):
+    import_format = IMPORT_FORMATS.get(os.path.splitext(file_name or '')[1].lower())
+    if import_format is None:
+        raise ImportFileError(f"Upload a {', '.join(IMPORT_FORMATS)} file.")
+    return import_format
+
+def read_lines(file):
+    # uploaded file is read line by line from memory or its temporary file, BOM of spreadsheet exports is skipped
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    for line in file:
+        try:
+            yield decoder.decode(line)
+        except UnicodeDecodeError:
+            raise ImportFileError('File is not UTF-8 encoded.')
+
+def read_csv_rows(file):
+    """
+    Yields (row number, dict of IMPORT_FIELDS) of CSV with header, row number is the line where the row starts.
+    """
+    reader = csv.DictReader(read_lines(file))
+    try:
+        header = reader.fieldnames or []
+    except csv.Error as error:
+        raise ImportFileError(f'CSV header can not be read: {error}.')
+    missing = [field for field in ['label', 'variant'] if field not in header]
+    if missing:
+        raise ImportFileError(f"CSV header is missing columns: {', '.join(missing)}.")
+    line_number = reader.line_num + 1
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as error:
+            raise ImportFileError(f'CSV can not be read at line {reader.line_num}: {error}.')
+        # columns the file does not have are left out, so serializer / form defaults apply
+        yield line_number, {field: row[field] for field in IMPORT_FIELDS if row.get(field) is not None}
+        line_number = reader.line_num + 1
+
+def read_ndjson_rows(file):
+    """
+    Yields (line number, dict) of every non-empty line, dict is None when the line is not a JSON object.
+    """
+    for line_number, line in enumerate(read_lines(file), start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            data = None
+        yield line_number, {field: data[field] for field in IMPORT_FIELDS if field in data} if isinstance(data, dict) else None
+
+def import_profile_identity_variants(user, file, validate_rows):
+    """
+    Reads CSV or NDJSON upload as a stream and creates profile identity variants of user, IMPORT_CHUNK_SIZE rows at a time.
+    validate_rows(rows) returns (validated rows, row errors), row errors is None when every row is valid,
+    otherwise a list with errors dict of every row, empty for valid rows, same as serializer with many=True.
+    All or nothing: after the first invalid row, the rest is only validated and nothing is saved.
+    Returns (created count, error count, first MAX_REPORTED_ERRORS errors as {'row': number, 'errors': dict}).
+    """
+    reader = read_csv_rows if get_import_format(file.name) == 'csv' else read_ndjson_rows
+    rows = reader(file)
+    created = 0
+    error_count = 0
+    errors = []
+    with transaction.atomic():
+        while chunk := list(islice(rows, IMPORT_CHUNK_SIZE)):
+            chunk_errors = [{'row': ['Row is not a JSON object.']} if data is None else {} for _, data in chunk]
+            validated_rows, row_errors = validate_rows([data for _, data in chunk if data is not None])
+            if row_errors is not None:
+                # errors of parsed rows in place of their empty dicts
+                parsed_errors = iter(row_errors)
+                chunk_errors = [next(parsed_errors) if data is not None else row_error for (_, data), row_error in zip(chunk, chunk_errors)]
+            for (row_number, _), row_error in zip(chunk, chunk_errors):
+                if row_error:
+                    error_count += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append({'row': row_number, 'errors': row_error})
+            if error_count:
+                continue
+            ProfileIdentityVariant.objects.bulk_create([ProfileIdentityVariant(user_id=user.id, **data) for data in validated_rows])
+            created += len(validated_rows)
+
+        if error_count:
+            transaction.set_rollback(True)
+            return 0, error_count, errors
+        if created:
+            # bulk_create sends no signals, counters and cached lists are updated here
+            apply_counter_deltas({user.id: {'profile_identity_variants': created}})
+            bump_profile_variant_version(user.id)
+    return created, 0, []
@@ -0,0 +1,117 @@
+import heapq
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+from .lru import VersionedLRUCache
+from .models import ProfileIdentityVariant
+from .profile_variant_cache import get_profile_variant_version
+
+
+# labels at least this similar are suggested, same as default similarity threshold of PostgreSQL pg_trgm
+SIMILARITY_THRESHOLD = 0.3
+# part of the score that comes from words of requested context, label decides the rest
+CONTEXT_WEIGHT = 0.2
+SUGGESTION_LIMIT = 5
+
+
+def normalize_tokens(text):
+    # lower case words without accents, so 'Given-Name' and 'given name' are the same
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    return re.findall(r'[^\W_]+', ''.join(char for char in text if not unicodedata.combining(char)))
+
+def label_trigrams(tokens):
+    # pg_trgm style trigrams of the words written together, so 'First Name' and 'Firstname' are the same
+    padded = f"  {''.join(tokens)} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)} if tokens else set()
+
+
+class ProfileVariantIndex:
+    """
+    In-memory index of profile identity variants of one user, for suggesting which of them matches a requested label and context.
+    Distinct normalised labels are in an inverted index of their words and one of their trigrams, so only labels
+    sharing a word or enough trigrams with the requested label are scored, and variants with the same label are scored once.
+    """
+    def __init__(self, variants):
+        # id -> {'id', 'label', 'context', 'variant'}
+        self.variants = {}
+        # distinct labels: (words, number of trigrams, [(variant id, words of label and context)] in order variants were created)
+        self.labels = []
+        label_numbers = {}
+        self.token_postings = defaultdict(list)
+        self.trigram_postings = defaultdict(list)
+        for variant in variants:
+            words = normalize_tokens(variant['label'])
+            number = label_numbers.get(tuple(words))
+            if number is None:
+                number = label_numbers[tuple(words)] = len(self.labels)
+                trigrams = label_trigrams(words)
+                self.labels.append((frozenset(words), len(trigrams), []))
+                for token in set(words):
+                    self.token_postings[token].append(number)
+                for trigram in trigrams:
+                    self.trigram_postings[trigram].append(number)
+            self.labels[number][2].append((variant['id'], frozenset(words) | frozenset(normalize_tokens(variant['context']))))
+            self.variants[variant['id']] = variant
+
+    def __len__(self):
+        return len(self.variants)
+
+    def suggest(self, label, context='', limit=SUGGESTION_LIMIT):
+        """
+        Returns up to limit (variant dict, score) of variants whose label is similar to label, best first.
+        Score is 0-1, label similarity is the larger of trigram and word similarity, words of context found in label
+        or context of the variant add up to CONTEXT_WEIGHT of it.
+        """
+        label_words = normalize_tokens(label)
+        tokens = set(label_words)
+        trigrams = label_trigrams(label_words)
+        # shared trigrams of every label that has at least one
+        shared_trigrams = Counter()
+        for trigram in trigrams:
+            shared_trigrams.update(self.trigram_postings.get(trigram, ()))
+        # trigram similarity can only reach the threshold with at least this many shared trigrams
+        min_shared = SIMILARITY_THRESHOLD * len(trigrams)
+        candidates = {number for number, shared in shared_trigrams.items() if shared >= min_shared}
+        for token in tokens:
+            candidates.update(self.token_postings.get(token, ()))
+
+        context_tokens = set(normalize_tokens(context))
+        scored = []
+        for number in candidates:
+            label_tokens, trigram_count, label_variants = self.labels[number]
+            shared = shared_trigrams[number]
+            trigram_similarity = shared / (len(trigrams) + trigram_count - shared) if shared else 0
+            token_similarity = len(tokens & label_tokens) / len(tokens | label_tokens) if tokens else 0
+            label_similarity = max(trigram_similarity, token_similarity)
+            if label_similarity < SIMILARITY_THRESHOLD:
+                continue
+            label_score = (1 - CONTEXT_WEIGHT) * label_similarity
+            if context_tokens:
+                scored += [(label_score + CONTEXT_WEIGHT * len(context_tokens & variant_tokens) / len(context_tokens), variant_id) for variant_id, variant_tokens in label_variants]
+            else:
+                # every variant of the label has the same score, only the oldest ones can be suggested
+                scored += [(label_score, variant_id) for variant_id, _ in label_variants[:limit]]
+        # best score first, older variant first when equal
+        best = heapq.nsmallest(limit, scored, key=lambda item: (-item[0], item[1]))
+        return [(self.variants[variant_id], round(score, 3)) for score, variant_id in best]
+
+
+# user id -> ProfileVariantIndex, kept with profile variant list version (core.profile_variant_cache) it was built for,
+# version changes on every create, update, delete and import of variants of the user
+profile_variant_indexes = VersionedLRUCache(settings.PROFILE_VARIANT_INDEX_CACHE_SIZE)
+
+
+def get_profile_variant_index(user_id):
+    """
+    Returns index of profile identity variants of the user, built with one query when variants changed since it was built.
+    """
+    # version is read before the variants, a change in between makes the next call build the index again
+    version = get_profile_variant_version(user_id)
+    index = profile_variant_indexes.get(user_id, version)
+    if index is None:
+        index = ProfileVariantIndex(ProfileIdentityVariant.objects.filter(user_id=user_id).order_by('id').values('id', 'label', 'context', 'variant'))
+        profile_variant_indexes.set(user_id, version, index)
+    return index
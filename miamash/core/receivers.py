@@ -0,0 +1,60 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .lru import VersionedLRUCache
+
+
+RECEIVER_VERSION_KEY = 'receivers-version'
+
+
+def get_receiver_version_cache():
+    # alias from CACHES, shared by all processes when backend is, so a rename in one process reaches the others
+    return caches[settings.RECEIVER_CACHE]
+
+def get_receiver_version():
+    cache = get_receiver_version_cache()
+    version = cache.get(RECEIVER_VERSION_KEY)
+    if version is None:
+        # start from current time, not 1, so an evicted version never matches entries cached before eviction
+        cache.add(RECEIVER_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(RECEIVER_VERSION_KEY)
+    return version
+
+def bump_receiver_version():
+    """
+    Makes cached receivers of every process stale, now and again after commit,
+    so a username read by another request before the rename or delete is committed is not kept either.
+    """
+    def bump():
+        cache = get_receiver_version_cache()
+        try:
+            cache.incr(RECEIVER_VERSION_KEY)
+        except ValueError:
+            cache.add(RECEIVER_VERSION_KEY, time.time_ns(), None)
+    bump()
+    transaction.on_commit(bump)
+
+
+# username -> (user id, username) of existing users, only existing usernames are cached, so a new user is found right after signing up
+receiver_cache = VersionedLRUCache(settings.RECEIVER_CACHE_SIZE)
+
+
+def resolve_receiver(username):
+    """
+    Returns User with given username, with only id and username loaded, or None if there is no such user.
+    One query on cache miss, none on hit. Used by web RequestSendForm and API RequestSendListCreateSerializer.
+    """
+    # version is read before the user, a rename in between makes the next call read the user again
+    version = get_receiver_version()
+    user = receiver_cache.get(username, version)
+    if user is None:
+        user = User.objects.filter(username=username).values_list('id', 'username').first()
+        if user is None:
+            return None
+        receiver_cache.set(username, version, user)
+    # other fields are deferred, and loaded from database only if something reads them, username is the stored one
+    return User.from_db(DEFAULT_DB_ALIAS, ['id', 'username'], list(user))
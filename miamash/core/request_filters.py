@@ -0,0 +1,31 @@
+from django.db.models import Exists, OuterRef
+
+from .models import RequestIdentityVariant
+from .receivers import resolve_receiver
+
+
+def filter_requests(queryset, status=None, created_after=None, created_before=None, sender=None, receiver=None, has_unlinked_variants=None):
+    """
+    Filters sent or received Request list of a user, arguments that are None are not applied.
+    Status and created_at follow the (receiver / sender, status, created_at) indexes, counterparty username is resolved
+    to an id first, so the (sender / receiver, created_at) index of the other user can be used without a join.
+    created_after is inclusive, created_before exclusive.
+    """
+    if status is not None:
+        queryset = queryset.filter(status=status)
+    if created_after is not None:
+        queryset = queryset.filter(created_at__gte=created_after)
+    if created_before is not None:
+        queryset = queryset.filter(created_at__lt=created_before)
+    for field, username in [('sender', sender), ('receiver', receiver)]:
+        if username is not None:
+            # cached username -> id, same lookup as sending a request
+            user = resolve_receiver(username)
+            if user is None:
+                return queryset.none()
+            queryset = queryset.filter(**{f'{field}_id': user.id})
+    if has_unlinked_variants is not None:
+        # partial index reqvariant_unlinked_idx only has variants without profile link
+        unlinked_variants = RequestIdentityVariant.objects.filter(request=OuterRef('pk'), profile_link__isnull=True)
+        queryset = queryset.filter(Exists(unlinked_variants) if has_unlinked_variants else ~Exists(unlinked_variants))
+    return queryset
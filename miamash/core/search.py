@@ -0,0 +1,84 @@
+import re
+from collections import defaultdict
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import BooleanField, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Request, RequestIdentityVariant
+
+
+# FTS5 table on SQLite, rowid is the Request id, kept in sync from Python so it survives table rebuilds of core_request
+FTS_TABLE = 'core_request_fts'
+# PostgreSQL GIN index on to_tsvector('simple', search_document), from core migration 0009
+SEARCH_INDEX = 'core_request_search_idx'
+UPDATE_BATCH_SIZE = 500
+
+
+def build_search_document(request_reasoning, sender_username, receiver_username, variant_texts):
+    # everything ?q= searches, one line per part
+    return '\n'.join(part for part in [request_reasoning, sender_username, receiver_username, *variant_texts] if part)
+
+def update_search_documents(request_ids, request_model=Request, variant_model=RequestIdentityVariant, using=DEFAULT_DB_ALIAS):
+    """
+    Builds search_document of given requests again and writes it to the full-text index.
+    Ids of deleted requests are removed from the index. Models can be passed in, so migrations can use historical models.
+    """
+    request_ids = list(set(request_ids))
+    for start in range(0, len(request_ids), UPDATE_BATCH_SIZE):
+        batch_ids = request_ids[start:start + UPDATE_BATCH_SIZE]
+        variant_texts = defaultdict(list)
+        variants = variant_model._default_manager.using(using).filter(request_id__in=batch_ids).order_by('id')
+        for request_id, label, context in variants.values_list('request_id', 'label', 'context'):
+            variant_texts[request_id] += [label, context]
+        rows = request_model._default_manager.using(using).filter(id__in=batch_ids).values_list('id', 'request_reasoning', 'sender__username', 'receiver__username')
+        documents = {row[0]: build_search_document(*row[1:], variant_texts[row[0]]) for row in rows}
+
+        # bulk_update only writes search_document, updated_at stays as it is
+        request_model._default_manager.using(using).bulk_update([request_model(id=request_id, search_document=document) for request_id, document in documents.items()], ['search_document'])
+        connection = connections[using]
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(batch_ids))})", batch_ids)
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, search_document) VALUES (%s, %s)', list(documents.items()))
+
+def schedule_search_document_update(*request_ids):
+    # index is updated after the change is committed, outside the transaction of the request that changed it
+    transaction.on_commit(partial(update_search_documents, request_ids))
+
+def search_terms(query):
+    # words only, so user input can never be full-text query syntax, every word also matches as a prefix while typing
+    return re.findall(r'[^\W_]+', query)
+
+def search_requests(queryset, query):
+    """
+    Filters Request queryset to rows matching every word of query and annotates search_rank, higher is better.
+    SQLite uses FTS5 with bm25, PostgreSQL tsvector with ts_rank, other databases fall back to icontains without ranking.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    table = Request._meta.db_table
+    if vendor == 'sqlite':
+        # every term is a quoted FTS5 prefix query, terms are ANDed
+        match = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])
+        ).annotate(
+            # bm25 is lower for better matches
+            search_rank=RawSQL(f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id', [match], output_field=FloatField())
+        )
+    if vendor == 'postgresql':
+        # same expression as SEARCH_INDEX, so the GIN index is used
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        vector = f"to_tsvector('simple', {table}.search_document)"
+        return queryset.filter(
+            RawSQL(f"{vector} @@ to_tsquery('simple', %s)", [tsquery], output_field=BooleanField())
+        ).annotate(
+            search_rank=RawSQL(f"ts_rank({vector}, to_tsquery('simple', %s))", [tsquery], output_field=FloatField())
+        )
+    for term in terms:
+        queryset = queryset.filter(search_document__icontains=term)
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
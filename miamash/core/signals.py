@@ -0,0 +1,163 @@
+from functools import partial
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.contrib.auth.models import User
+from .counters import add_request_deltas, apply_counter_deltas, new_counter_deltas
+from .profile_variant_cache import bump_profile_variant_version
+from .receivers import bump_receiver_version
+from .user_search import invalidate_user_search, update_username_search_key
+from .search import schedule_search_document_update, update_search_documents
+from .events import publish_request_created, publish_request_status_changed
+from .models import ProfileIdentityVariant, Request, RequestIdentityVariant, Tombstone, UserCounters
+
+
+# request events for the event stream, sent only after the change is committed, and dashboard counters
+@receiver(post_save, sender=Request)
+def request_saved(sender, instance, created, **kwargs):
+    deltas = new_counter_deltas()
+    if created:
+        add_request_deltas(deltas, instance, instance.status, 1)
+        transaction.on_commit(partial(publish_request_created, instance))
+    else:
+        # status from Request.from_db, instances not loaded from database are treated as unchanged
+        loaded_status = getattr(instance, '_loaded_status', instance.status)
+        if loaded_status != instance.status:
+            add_request_deltas(deltas, instance, loaded_status, -1)
+            add_request_deltas(deltas, instance, instance.status, 1)
+            transaction.on_commit(partial(publish_request_status_changed, instance))
+    apply_counter_deltas(deltas)
+    instance._loaded_status = instance.status
+
+@receiver(post_delete, sender=Request)
+def request_deleted(sender, instance, **kwargs):
+    deltas = new_counter_deltas()
+    add_request_deltas(deltas, instance, instance.status, -1)
+    apply_counter_deltas(deltas)
+
+
+# dashboard counters of profile identity variants, every user gets counters row when created
+@receiver(post_save, sender=ProfileIdentityVariant)
+def profile_identity_variant_saved(sender, instance, created, **kwargs):
+    if created:
+        apply_counter_deltas({instance.user_id: {'profile_identity_variants': 1}})
+
+@receiver(post_delete, sender=ProfileIdentityVariant)
+def profile_identity_variant_deleted(sender, instance, **kwargs):
+    apply_counter_deltas({instance.user_id: {'profile_identity_variants': -1}})
+
+@receiver(post_save, sender=User)
+def create_user_counters(sender, instance, created, **kwargs):
+    if created:
+        UserCounters.objects.create(user=instance)
+        # new version for new user, lists cached for a reused user id are never served
+        bump_profile_variant_version(instance.id)
+
+
+# cached profile identity variant lists, for API, web views and admin
+@receiver(post_save, sender=ProfileIdentityVariant)
+@receiver(post_delete, sender=ProfileIdentityVariant)
+def invalidate_profile_variant_cache(sender, instance, **kwargs):
+    bump_profile_variant_version(instance.user_id)
+
+
+# tombstones for delta sync, also written for cascade deletes and deletes from admin
+@receiver(post_delete, sender=Request)
+def create_request_tombstone(sender, instance, **kwargs):
+    # sender and receiver ids are on the instance, no query needed
+    Tombstone.objects.create(
+        object_type=Tombstone.ObjectType.REQUEST,
+        object_id=instance.id,
+        request_id=instance.id,
+        sender_id=instance.sender_id,
+        receiver_id=instance.receiver_id,
+    )
+
+@receiver(post_delete, sender=RequestIdentityVariant)
+def create_request_identity_variant_tombstone(sender, instance, **kwargs):
+    # only request_id is stored, users are resolved through the request when changes are read
+    Tombstone.objects.create(
+        object_type=Tombstone.ObjectType.REQUEST_IDENTITY_VARIANT,
+        object_id=instance.id,
+        request_id=instance.request_id,
+    )
+
+@receiver(pre_delete, sender=ProfileIdentityVariant)
+def touch_linked_request_identity_variants(sender, instance, **kwargs):
+    # profile_link is set to NULL with a plain UPDATE that skips auto_now, mark linked variants as changed for sync
+    RequestIdentityVariant.objects.filter(profile_link=instance).update(updated_at=timezone.now())
+
+
+# user fields as loaded, like Request._loaded_status, so receivers below react to a rename or deactivation, not to every save()
+# of a password change or profile edit, deferred fields are not loaded for this
+USER_TRACKED_FIELDS = ['username', 'is_active']
+
+def get_tracked_user_fields(instance):
+    return {name: instance.__dict__.get(name) for name in USER_TRACKED_FIELDS}
+
+@receiver(post_init, sender=User)
+def remember_loaded_user_fields(sender, instance, **kwargs):
+    instance._loaded_fields = get_tracked_user_fields(instance)
+
+@receiver(pre_save, sender=User)
+def find_changed_user_fields(sender, instance, **kwargs):
+    # fields that are loaded and differ from the loaded value, a field loaded after init counts as changed
+    loaded_fields = getattr(instance, '_loaded_fields', {})
+    instance._changed_fields = {name for name, value in get_tracked_user_fields(instance).items() if name in instance.__dict__ and value != loaded_fields.get(name)}
+
+@receiver(post_save, sender=User)
+def reset_loaded_user_fields(sender, instance, **kwargs):
+    instance._loaded_fields = get_tracked_user_fields(instance)
+
+# username -> id cache of request receivers, only when username changed, not on every save
+@receiver(post_save, sender=User)
+def invalidate_receiver_cache_on_save(sender, instance, created, **kwargs):
+    # new user was not cached, only existing usernames are
+    if not created and 'username' in instance._changed_fields:
+        bump_receiver_version()
+
+@receiver(post_delete, sender=User)
+def invalidate_receiver_cache_on_delete(sender, instance, **kwargs):
+    bump_receiver_version()
+
+# username search keys and cached search results, only when username or is_active changed, not on every save
+@receiver(post_save, sender=User)
+def update_username_search_on_save(sender, instance, created, **kwargs):
+    if created or 'username' in instance._changed_fields:
+        update_username_search_key(instance)
+    # new users are found after cached results time out, every signup would drop results of every prefix otherwise
+    if not created and instance._changed_fields & {'username', 'is_active'}:
+        invalidate_user_search()
+
+@receiver(post_delete, sender=User)
+def invalidate_user_search_on_delete(sender, instance, **kwargs):
+    invalidate_user_search()
+
+# full-text search documents of requests, bulk_create of variants schedules the update itself
+@receiver(post_save, sender=Request)
+def update_request_search_document(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'request_reasoning' in update_fields:
+        schedule_search_document_update(instance.id)
+
+@receiver(post_delete, sender=Request)
+def remove_request_search_document(sender, instance, **kwargs):
+    schedule_search_document_update(instance.id)
+
+@receiver(post_save, sender=RequestIdentityVariant)
+def update_request_identity_variant_search_document(sender, instance, created, update_fields=None, **kwargs):
+    if created or update_fields is None or 'label' in update_fields or 'context' in update_fields:
+        schedule_search_document_update(instance.request_id)
+
+@receiver(post_delete, sender=RequestIdentityVariant)
+def remove_request_identity_variant_search_document(sender, instance, **kwargs):
+    schedule_search_document_update(instance.request_id)
+
+@receiver(post_save, sender=User)
+def update_user_requests_search_documents(sender, instance, created, **kwargs):
+    # usernames are part of the document, new user has no requests yet, password change and profile edits keep the username
+    if not created and 'username' in instance._changed_fields:
+        # ids are read after commit, when the queryset is evaluated
+        request_ids = Request.objects.filter(Q(sender=instance) | Q(receiver=instance)).values_list('id', flat=True)
+        transaction.on_commit(partial(update_search_documents, request_ids))
@@ -0,0 +1,83 @@
+import hashlib
+import sys
+import time
+import unicodedata
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Collate
+
+from .models import UsernameSearchKey
+
+
+# found usernames are cached per prefix, renamed, deactivated and deleted users start a new version,
+# new users are found by a cached prefix after this timeout
+USER_SEARCH_CACHE_TIMEOUT = 300
+USER_SEARCH_VERSION_KEY = 'user-search-version'
+# UTF-16 surrogates, not valid in strings sent to the database
+SURROGATES = range(0xD800, 0xE000)
+
+
+def username_search_key(value):
+    # same form of username and prefix, lowered in Python so non-ASCII letters are lowered on every database too
+    return unicodedata.normalize('NFKC', value).lower()
+
+def prefix_upper_bound(prefix):
+    """
+    Returns first string after all strings starting with prefix, 'mic' -> 'mid',
+    or None when there is none, when prefix is only the last code point.
+    """
+    # last code point can not be increased, strings starting with 'a' + U+10FFFF end before 'b'
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    next_code_point = ord(prefix[-1]) + 1
+    if next_code_point in SURROGATES:
+        next_code_point = SURROGATES.stop
+    return prefix[:-1] + chr(next_code_point)
+
+def search_usernames_query(prefix, limit):
+    """
+    Usernames of active users starting with prefix, case insensitive, in alphabetical order of their search keys.
+    Range scan key >= 'prefix' AND < next prefix over the key index from core migration 0011, read in index order,
+    so LIMIT stops after the first rows. PostgreSQL compares in "C" collation, as the index is built,
+    SQLite compares binary by default.
+    """
+    prefix = username_search_key(prefix)
+    search_key = Collate('key', 'C') if connection.vendor == 'postgresql' else F('key')
+    keys = UsernameSearchKey.objects.filter(user__is_active=True).annotate(search_key=search_key).filter(search_key__gte=prefix)
+    upper_bound = prefix_upper_bound(prefix)
+    if upper_bound is not None:
+        keys = keys.filter(search_key__lt=upper_bound)
+    return keys.order_by('search_key').values_list('user__username', flat=True)[:limit]
+
+def get_user_search_version():
+    version = cache.get(USER_SEARCH_VERSION_KEY)
+    if version is None:
+        # start from current time, not 1, so an evicted version never points to results cached before eviction
+        cache.add(USER_SEARCH_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(USER_SEARCH_VERSION_KEY)
+    return version
+
+def search_usernames(prefix, limit):
+    """
+    Returns list of up to limit usernames starting with prefix, from cache or with one indexed query.
+    """
+    prefix_hash = hashlib.md5(username_search_key(prefix).encode(), usedforsecurity=False).hexdigest()
+    key = f'user-search:{get_user_search_version()}:{limit}:{prefix_hash}'
+    usernames = cache.get(key)
+    if usernames is None:
+        usernames = list(search_usernames_query(prefix, limit))
+        cache.set(key, usernames, USER_SEARCH_CACHE_TIMEOUT)
+    return usernames
+
+def update_username_search_key(user):
+    # row of new and renamed user
+    UsernameSearchKey.objects.update_or_create(user_id=user.id, defaults={'key': username_search_key(user.username)})
+
+def invalidate_user_search():
+    try:
+        cache.incr(USER_SEARCH_VERSION_KEY)
+    except ValueError:
+        cache.add(USER_SEARCH_VERSION_KEY, time.time_ns(), None)
@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'miamash.settings')
 
+# async views, like the request event stream at /api/events/, run natively on the event loop here
+# run with an ASGI server, for example: uvicorn miamash.asgi:application
 application = get_asgi_application()
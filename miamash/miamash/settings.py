@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 from datetime import timedelta
 import os
+from importlib.util import find_spec
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -196,6 +197,12 @@ LOGOUT_REDIRECT_URL = '/'
 
 # REST framework settings
 REST_USE_JWT = True
+# orjson and msgpack are optional, without orjson DRF JSON renderer and parser are used, without msgpack it is not offered
+JSON_RENDERER_CLASS = 'api.renderers.ORJSONRenderer' if find_spec('orjson') else 'rest_framework.renderers.JSONRenderer'
+JSON_PARSER_CLASS = 'api.parsers.ORJSONParser' if find_spec('orjson') else 'rest_framework.parsers.JSONParser'
+MSGPACK_RENDERER_CLASSES = ['api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []
+MSGPACK_PARSER_CLASSES = ['api.parsers.MessagePackParser'] if find_spec('msgpack') else []
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
@@ -205,8 +212,45 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
-    'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',  
+    # drf-spectacular AutoSchema that also documents ?fields= / ?omit=
+    'DEFAULT_SCHEMA_CLASS': 'api.schema.SparseFieldsetAutoSchema',
+    # keyset (cursor) pagination for list endpoints, variant lists override it in api/views.py
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.RequestCursorPagination',
+    'PAGE_SIZE': 50,
+    # JSON first, it is the default when client does not ask for a format
+    'DEFAULT_RENDERER_CLASSES': [JSON_RENDERER_CLASS, 'rest_framework.renderers.BrowsableAPIRenderer', *MSGPACK_RENDERER_CLASSES],
+    'DEFAULT_PARSER_CLASSES': [JSON_PARSER_CLASS, 'rest_framework.parsers.FormParser', 'rest_framework.parsers.MultiPartParser', *MSGPACK_PARSER_CLASSES],
+}
+
+# cache for per-user dashboard counters, local memory cache is per process,
+# with more server processes use a shared cache (Redis, Memcached) so invalidation reaches all of them
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
 }
+# CACHES alias of cached profile identity variant lists
+PROFILE_VARIANT_CACHE = 'default'
+
+# receiver username -> id cache of request create paths, per process, checked against a version in this CACHES alias
+# that every rename and delete of a user changes, so other processes see them right away
+RECEIVER_CACHE = 'default'
+RECEIVER_CACHE_SIZE = 10000
+
+# per process indexes of profile identity variants for link suggestions, number of users kept, rebuilt when their variants change
+PROFILE_VARIANT_INDEX_CACHE_SIZE = 1000
+
+# delta sync (/api/changes/), tombstones of deleted rows are kept this long, older sync tokens need a full sync
+SYNC_TOMBSTONE_RETENTION = timedelta(days=30)
+# sync token is this much older than the read, rows stamped before their transaction commits, up to this long, are still sent next time
+SYNC_CLOCK_SKEW = timedelta(seconds=30)
+
+# request event stream (/api/events/), needs ASGI server, for example: uvicorn miamash.asgi:application
+# in-process broker only reaches streams of the same process, multi node setup needs a broker subclassing core.events.BaseEventBroker
+EVENT_BROKER = 'core.events.InProcessEventBroker'
+# seconds between keep-alive comments, and how long one stream stays open before client reconnects
+EVENT_STREAM_HEARTBEAT = 15
+EVENT_STREAM_TIMEOUT = 300
 
 # JWT settings
 SIMPLE_JWT = {
@@ -243,4 +287,9 @@ SPECTACULAR_SETTINGS = {
     'DESCRIPTION': 'Identity management API for Miamash',
     'VERSION': '1.0.0',
     'SERVE_INCLUDE_SCHEMA': False,
+    # Request status and bulk status (only accepted / denied) both have field named status, so name their enums
+    'ENUM_NAME_OVERRIDES': {
+        'RequestStatusEnum': 'core.models.Request.Status',
+        'BulkStatusEnum': ['accepted', 'denied'],
+    },
 }
\ No newline at end of file
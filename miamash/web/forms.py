@@ -1,5 +1,10 @@
 from django import forms
-from core.models import ProfileIdentityVariant, Request, RequestIdentityVariant, User
+from core.models import ProfileIdentityVariant, Request, RequestIdentityVariant
+from core.receivers import resolve_receiver
+from core.profile_variant_import import ImportFileError, get_import_format
+from django.utils import timezone
+from datetime import datetime, time
+from django.db.models import Case, Value, When
 
 # Profile Identity Variant forms 
 class ProfileIdentityVariantForm(forms.ModelForm):
@@ -7,6 +12,17 @@ class ProfileIdentityVariantForm(forms.ModelForm):
         model = ProfileIdentityVariant
         fields = ['label', 'context', 'variant']
 
+class ProfileIdentityVariantImportForm(forms.Form):
+    file = forms.FileField(label='File', help_text="CSV with label, context and variant columns, or NDJSON with one object per line.")
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        try:
+            get_import_format(file.name)
+        except ImportFileError as error:
+            raise forms.ValidationError(str(error))
+        return file
+
 
 # Request send forms
 class RequestSendForm(forms.ModelForm):
@@ -19,10 +35,11 @@ class RequestSendForm(forms.ModelForm):
 
     def clean_receiver(self):
         receiver = self.cleaned_data.get('receiver')
-        # check if such a user exists in users
-        if not User.objects.filter(username=receiver).exists():
+        # check if such a user exists in users, one lookup shared with API, cached by username
+        receiver_user = resolve_receiver(receiver)
+        if receiver_user is None:
             raise forms.ValidationError("User with this username does not exist.")
-        return User.objects.get(username=receiver)
+        return receiver_user
     
 class RequestSendUpdateForm(forms.ModelForm):
     class Meta:
@@ -34,6 +51,33 @@ class RequestSendRequestIdentityVariantForm(forms.ModelForm):
         model = RequestIdentityVariant
         fields = ['label', 'context']
 
+class RequestListFilterForm(forms.Form):
+    # GET form of sent and received request lists, empty fields are not applied
+    status = forms.ChoiceField(choices=[('', 'Any status')] + Request.Status.choices, required=False)
+    created_after = forms.DateField(label='Created from', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    created_before = forms.DateField(label='Created before', required=False, widget=forms.DateInput(attrs={'type': 'date'}))
+    username = forms.CharField(label='Username', max_length=150, required=False)
+    has_unlinked_variants = forms.NullBooleanField(label='Unlinked variants', required=False)
+
+    def __init__(self, *args, **kwargs):
+        # received list filters by sender, sent list by receiver
+        self.counterparty = kwargs.pop('counterparty')
+        super().__init__(*args, **kwargs)
+        self.fields['username'].label = f'{self.counterparty.capitalize()} username'
+
+    def get_filters(self):
+        """
+        Returns keyword arguments for core.request_filters.filter_requests, dates are whole days in current timezone.
+        """
+        data = self.cleaned_data
+        filters = {'status': data['status'] or None, 'has_unlinked_variants': data['has_unlinked_variants']}
+        for name in ['created_after', 'created_before']:
+            if data[name] is not None:
+                filters[name] = timezone.make_aware(datetime.combine(data[name], time.min))
+        if data['username']:
+            filters[self.counterparty] = data['username']
+        return filters
+
 
 # request receive forms
 class RequestReceiveRequestIdentityVariantForm(forms.ModelForm):
@@ -43,7 +87,23 @@ class RequestReceiveRequestIdentityVariantForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         self.request_object = kwargs.pop('request_object', None)
+        user = kwargs.pop('user', None)
+        # (profile variant dict, score) from core.profile_variant_suggestions, best first
+        suggestions = kwargs.pop('suggestions', None) or []
         super().__init__(*args, **kwargs)
+        # only logged in user's profile identity variants can be linked, not the whole table
+        if user is not None:
+            self.fields['profile_link'].queryset = ProfileIdentityVariant.objects.filter(user=user).select_related('user') # type: ignore
+        if suggestions:
+            field = self.fields['profile_link']
+            scores = {variant['id']: score for variant, score in suggestions}
+            # suggested variants first, best match first, then the rest in order they were created
+            ranks = [When(id=variant_id, then=Value(rank)) for rank, variant_id in enumerate(scores)]
+            field.queryset = field.queryset.order_by(Case(*ranks, default=Value(len(ranks))), 'id') # type: ignore
+            field.label_from_instance = lambda variant: f'{variant} ({scores[variant.id]:.0%} match)' if variant.id in scores else str(variant) # type: ignore
+            # best match is selected when variant is not linked yet
+            if not self.is_bound and self.instance.profile_link_id is None:
+                self.initial['profile_link'] = suggestions[0][0]['id']
 
     def clean(self):
         cleaned_data = super().clean()
@@ -61,10 +61,12 @@ class RequestReceiverPermissionMixin(LoginRequiredMixin, View):
         return self.model.objects.filter(receiver=self.request.user) # type: ignore
 
     # helper method to get the request object from the URL using pk, only from the set of requests that user is allowed to access
-    def get_secured_request(self):
+    # for_update locks the row until the surrounding transaction commits
+    def get_secured_request(self, for_update=False):
         pk = self.kwargs.get('pk') # request pk from the URL
+        queryset = self.get_queryset().select_for_update() if for_update else self.get_queryset()
         try:
-            return self.get_queryset().get(pk=pk)
+            return queryset.get(pk=pk)
         except self.model.DoesNotExist:
             raise Http404("There is no such request.")
 
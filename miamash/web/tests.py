@@ -1,5 +1,14 @@
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from unittest.mock import patch
+from core.events import get_event_broker
+from django.core.cache import cache
+from core.receivers import receiver_cache
+from django.utils import timezone
+from datetime import timedelta
 from django.urls import reverse
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.contrib.auth import get_user_model
 from core.models import ProfileIdentityVariant, Request, ProfileIdentityVariant, RequestIdentityVariant
 
@@ -1207,6 +1216,23 @@ class RequestsReceiveTests(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, self.profile_identity_variant1.variant)
 
+#     # user can not link request identity variant with profile identity variant of other user
+    def test_user_cannot_link_request_identity_variant_with_other_users_profile_identity_variant(self):
+        other_user_profile_identity_variant = ProfileIdentityVariant.objects.create(user=self.user3, label='Secret label', variant='Ezma secret')
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        self.client.post(self.request_receive_accept_url(1))
+        # form should not offer other users variant
+        response = self.client.get(self.request_receive_request_identity_variant_update_url(1, 1))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, self.profile_identity_variant1.variant)
+        self.assertNotContains(response, 'Ezma secret')
+        # and should not accept it when posted
+        response = self.client.post(self.request_receive_request_identity_variant_update_url(1, 1), {'profile_link': other_user_profile_identity_variant.pk})
+        self.assertEqual(response.status_code, 200)
+        self.request_identity_variant1.refresh_from_db()
+        self.assertIsNone(self.request_identity_variant1.profile_link)
+
+
 #     # user can not link other users request identity variant with profile identity variant for accepted request
     def test_user_cannot_link_other_users_request_identity_variant_with_profile_identity_variant_for_accepted_request(self):
         # Ezma will try to maliciusly link users2 request identity variant for request that is accepted
@@ -1376,4 +1402,385 @@ class RequestsReceiveTests(TestCase):
         response = self.client.post(self.request_receive_deny_url(1), follow=True)
         # response after follow to request detail should be 200, and variant should be no longer there
         self.assertEqual(response.status_code, 200)
-        self.assertNotContains(response, self.profile_identity_variant1.variant)
\ No newline at end of file
+        self.assertNotContains(response, self.profile_identity_variant1.variant)
+
+## QUERY COUNT ##
+class RequestDetailQueryCountTests(TestCase):
+    def setUp(self):
+        # sender and receiver of the request
+        self.valid_username1 = 'Johny'
+        self.valid_password1 = 'test123123'
+        self.user1 = User.objects.create_user(
+            username=self.valid_username1,
+            email='johny@example.com',
+            password=self.valid_password1,
+        )
+        self.valid_username2 = 'Michael'
+        self.valid_password2 = 'test123123'
+        self.user2 = User.objects.create_user(
+            username=self.valid_username2,
+            email='michael@example.com',
+            password=self.valid_password2,
+        )
+
+        # accepted request, so receiver detail page also renders detail links for every variant
+        self.request1 = Request.objects.create(
+            sender=self.user1,
+            receiver=self.user2,
+            request_reasoning='Dental office information',
+            status=Request.Status.ACCEPTED,
+        )
+        self.add_linked_variants(1)
+
+        self.request_send_detail_url = lambda pk: reverse('request-send-detail', args=[pk])
+        self.request_receive_detail_url = lambda pk: reverse('request-receive-detail', args=[pk])
+
+    # helper that adds variants to request1, each linked to its own profile variant of the receiver
+    def add_linked_variants(self, count):
+        for i in range(count):
+            profile_variant = ProfileIdentityVariant.objects.create(
+                user=self.user2,
+                label=f'Label {i}',
+                variant=f'Variant {i}',
+            )
+            RequestIdentityVariant.objects.create(
+                request=self.request1,
+                label=f'Label {i}',
+                context=f'Context {i}',
+                profile_link=profile_variant,
+            )
+
+    # helper that counts queries needed to render given url
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    # sender detail page runs the same number of queries no matter how many variants there are
+    def test_request_send_detail_query_count_does_not_grow_with_variants(self):
+        self.client.login(username=self.valid_username1, password=self.valid_password1)
+        url = self.request_send_detail_url(self.request1.pk)
+        # warm up session and user lookups, so only view queries are compared
+        self.client.get(url)
+        queries_with_one_variant = self.count_queries(url)
+        # add many more variants, query count should stay the same
+        self.add_linked_variants(20)
+        queries_with_many_variants = self.count_queries(url)
+        self.assertEqual(queries_with_one_variant, queries_with_many_variants)
+
+    # receiver detail page runs the same number of queries no matter how many variants there are
+    def test_request_receive_detail_query_count_does_not_grow_with_variants(self):
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        url = self.request_receive_detail_url(self.request1.pk)
+        self.client.get(url)
+        queries_with_one_variant = self.count_queries(url)
+        self.add_linked_variants(20)
+        queries_with_many_variants = self.count_queries(url)
+        self.assertEqual(queries_with_one_variant, queries_with_many_variants)
+
+    # detail page still shows shared variants of all linked cards
+    def test_request_receive_detail_shows_all_linked_variants(self):
+        self.add_linked_variants(5)
+        self.client.login(username=self.valid_username2, password=self.valid_password2)
+        response = self.client.get(self.request_receive_detail_url(self.request1.pk))
+        self.assertEqual(response.status_code, 200)
+        for variant in RequestIdentityVariant.objects.filter(request=self.request1).select_related('profile_link'):
+            self.assertContains(response, variant.profile_link.variant) # type: ignore
+
+
+class RequestEventPublishTests(TestCase):
+    def setUp(self):
+        self.user1 = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user1, receiver=self.user2, request_reasoning='Dental office information')
+
+        self.request_send_create_url = reverse('request-send-create')
+        self.request_receive_accept_url = lambda pk: reverse('request-receive-accept', args=[pk])
+        self.request_receive_deny_url = lambda pk: reverse('request-receive-deny', args=[pk])
+
+    # request sent from the web is published to its receiver
+    def test_created_request_is_published_to_receiver(self):
+        self.client.login(username='Johny', password='test123123')
+        with patch.object(get_event_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.request_send_create_url, {'receiver': 'Michael', 'request_reasoning': 'Gym information'})
+        publish.assert_called_once()
+        self.assertEqual(publish.call_args[0][0], self.user2.id)
+        self.assertEqual(publish.call_args[0][1]['type'], 'request.created')
+
+    # accept and deny from the web are published to the sender
+    def test_status_change_is_published_to_sender(self):
+        self.client.login(username='Michael', password='test123123')
+        with patch.object(get_event_broker(), 'publish') as publish, self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.request_receive_accept_url(self.request1.pk))
+            self.client.post(self.request_receive_deny_url(self.request1.pk))
+        self.assertEqual([(args[0], args[1]['type'], args[1]['request']['status']) for args, _ in publish.call_args_list], [
+            (self.user1.id, 'request.status_changed', Request.Status.ACCEPTED),
+            (self.user1.id, 'request.status_changed', Request.Status.DENIED),
+        ])
+
+
+class DashboardCountersTests(TestCase):
+    def setUp(self):
+        # cached counters of previous tests could belong to same user ids
+        cache.clear()
+        self.user1 = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user1, receiver=self.user2, request_reasoning='Dental office information')
+        Request.objects.create(sender=self.user1, receiver=self.user2, request_reasoning='Gym information', status=Request.Status.ACCEPTED)
+        ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+
+        self.dashboard_url = reverse('dashboard')
+        self.request_receive_deny_url = lambda pk: reverse('request-receive-deny', args=[pk])
+
+    # dashboard shows counts of received requests and profile identity variants
+    def test_dashboard_shows_counts(self):
+        self.client.login(username='Michael', password='test123123')
+        response = self.client.get(self.dashboard_url)
+        self.assertEqual(response.context['counters'], {
+            'pending_received': 1, 'accepted_received': 1, 'denied_received': 0, 'pending_sent': 0, 'profile_identity_variants': 1,
+        })
+        self.assertContains(response, 'Pending: <span class="badge bg-warning">1</span>', html=False)
+
+    # deny from the web changes counts on dashboard
+    def test_deny_changes_dashboard_counts(self):
+        self.client.login(username='Michael', password='test123123')
+        self.client.get(self.dashboard_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(self.request_receive_deny_url(self.request1.pk))
+        counters = self.client.get(self.dashboard_url).context['counters']
+        self.assertEqual((counters['pending_received'], counters['denied_received']), (0, 1))
+
+    # dashboard query count does not depend on how many requests user has
+    def test_dashboard_query_count_does_not_depend_on_request_count(self):
+        self.client.login(username='Michael', password='test123123')
+        self.client.get(self.dashboard_url)
+        with CaptureQueriesContext(connection) as small_inbox:
+            self.client.get(self.dashboard_url)
+        for _ in range(20):
+            Request.objects.create(sender=self.user1, receiver=self.user2)
+        with CaptureQueriesContext(connection) as large_inbox:
+            self.client.get(self.dashboard_url)
+        self.assertEqual(len(large_inbox), len(small_inbox))
+
+
+class ProfileIdentityVariantListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.admin = User.objects.create_superuser(username='admin', email='admin@example.com', password='test123123')
+        self.profile_identity_variant1 = ProfileIdentityVariant.objects.create(user=self.user1, label='First Name', variant='John')
+        self.profile_identity_variant2 = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michal')
+
+        self.profile_identity_variant_list_url = reverse('profile-identity-variant-list')
+        self.profile_identity_variant_create_url = reverse('profile-identity-variant-create')
+        self.profile_identity_variant_update_url = lambda pk: reverse('profile-identity-variant-update', args=[pk])
+        self.profile_identity_variant_delete_url = lambda pk: reverse('profile-identity-variant-delete', args=[pk])
+        self.admin_change_url = lambda pk: reverse('admin:core_profileidentityvariant_change', args=[pk])
+
+    # variants shown on list page of logged in user
+    def get_variants(self):
+        return [variant['variant'] for variant in self.client.get(self.profile_identity_variant_list_url).context['profile_identity_variants']]
+
+    # second load of the list does not query variants
+    def test_list_is_served_from_cache(self):
+        self.client.login(username='Johny', password='test123123')
+        self.client.get(self.profile_identity_variant_list_url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.profile_identity_variant_list_url)
+        self.assertFalse([query for query in queries if 'core_profileidentityvariant' in query['sql']])
+        self.assertContains(response, 'John')
+
+    # create, update and delete views change the cached list
+    def test_web_writes_invalidate_list(self):
+        self.client.login(username='Johny', password='test123123')
+        self.assertEqual(self.get_variants(), ['John'])
+        self.client.post(self.profile_identity_variant_create_url, {'label': 'Last Name', 'variant': 'Smith'})
+        self.assertEqual(self.get_variants(), ['John', 'Smith'])
+        self.client.post(self.profile_identity_variant_update_url(self.profile_identity_variant1.pk), {'label': 'First Name', 'variant': 'Johnny'})
+        self.assertEqual(self.get_variants(), ['Johnny', 'Smith'])
+        self.client.post(self.profile_identity_variant_delete_url(self.profile_identity_variant1.pk))
+        self.assertEqual(self.get_variants(), ['Smith'])
+
+    # change made in admin changes the cached list
+    def test_admin_write_invalidates_list(self):
+        self.client.login(username='Johny', password='test123123')
+        self.assertEqual(self.get_variants(), ['John'])
+        self.client.login(username='admin', password='test123123')
+        self.client.post(self.admin_change_url(self.profile_identity_variant1.pk), {'user': self.user1.pk, 'label': 'First Name', 'context': '', 'variant': 'Jan'})
+        self.client.login(username='Johny', password='test123123')
+        self.assertEqual(self.get_variants(), ['Jan'])
+
+    # cached list of one user is never shown to another user
+    def test_cached_list_is_not_served_to_other_user(self):
+        self.client.login(username='Johny', password='test123123')
+        self.assertEqual(self.get_variants(), ['John'])
+        self.client.login(username='Michael', password='test123123')
+        self.assertEqual(self.get_variants(), ['Michal'])
+
+
+class ReceiverResolverTests(TestCase):
+    def setUp(self):
+        receiver_cache.clear()
+        self.user1 = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.request_send_create_url = reverse('request-send-create')
+
+    # send request to given username from the web form
+    def send_request(self, receiver):
+        return self.client.post(self.request_send_create_url, {'receiver': receiver, 'request_reasoning': 'Dental office information'})
+
+    # form looks receiver up with one query, then from cache
+    def test_receiver_lookup_is_one_query_then_cached(self):
+        self.client.login(username='Johny', password='test123123')
+        receiver_queries = lambda queries: [query for query in queries if 'FROM "auth_user"' in query['sql'] and '"username" =' in query['sql']]
+        with CaptureQueriesContext(connection) as first:
+            self.send_request('Michael')
+        with CaptureQueriesContext(connection) as second:
+            self.send_request('Michael')
+        self.assertEqual(len(receiver_queries(first)), 1)
+        self.assertEqual(receiver_queries(second), [])
+        self.assertEqual(Request.objects.filter(sender=self.user1, receiver=self.user2).count(), 2)
+
+    # unknown receiver gives the same form error as before
+    def test_unknown_receiver_error(self):
+        self.client.login(username='Johny', password='test123123')
+        response = self.send_request('Nobody')
+        self.assertFormError(response.context['form'], 'receiver', 'User with this username does not exist.')
+
+    # renamed receiver is not found by old username anymore
+    def test_rename_invalidates_cached_receiver(self):
+        self.client.login(username='Johny', password='test123123')
+        self.send_request('Michael')
+        self.user2.username = 'Mike'
+        self.user2.save()
+        self.assertFormError(self.send_request('Michael').context['form'], 'receiver', 'User with this username does not exist.')
+
+
+class RequestListFilterTests(TestCase):
+    def setUp(self):
+        receiver_cache.clear()
+        self.user1 = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.user3 = User.objects.create_user(username='Anna', email='anna@example.com', password='test123123')
+        self.request1 = Request.objects.create(sender=self.user1, receiver=self.user2, request_reasoning='Dental office information')
+        self.request2 = Request.objects.create(sender=self.user3, receiver=self.user2, request_reasoning='Gym information', status=Request.Status.DENIED)
+        self.request3 = Request.objects.create(sender=self.user1, receiver=self.user3, request_reasoning='Bank information')
+        RequestIdentityVariant.objects.create(request=self.request2, label='Last Name')
+
+        self.request_send_list_url = reverse('request-send-list')
+        self.request_receive_list_url = reverse('request-receive-list')
+
+    # received list filtered by status, sender and unlinked variants, filter form is shown
+    def test_filter_received_list(self):
+        self.client.login(username='Michael', password='test123123')
+        response = self.client.get(self.request_receive_list_url, {'status': 'denied'})
+        self.assertEqual(list(response.context['received_requests']), [self.request2])
+        self.assertContains(response, 'Sender username')
+        response = self.client.get(self.request_receive_list_url, {'username': 'Johny'})
+        self.assertEqual(list(response.context['received_requests']), [self.request1])
+        response = self.client.get(self.request_receive_list_url, {'has_unlinked_variants': 'true'})
+        self.assertEqual(list(response.context['received_requests']), [self.request2])
+        response = self.client.get(self.request_receive_list_url)
+        self.assertEqual(set(response.context['received_requests']), {self.request1, self.request2})
+
+    # sent list filtered by receiver and days
+    def test_filter_sent_list(self):
+        Request.objects.filter(pk=self.request1.pk).update(created_at=timezone.now() - timedelta(days=10))
+        self.client.login(username='Johny', password='test123123')
+        response = self.client.get(self.request_send_list_url, {'username': 'Anna'})
+        self.assertEqual(list(response.context['send_requests']), [self.request3])
+        self.assertContains(response, 'Receiver username')
+        response = self.client.get(self.request_send_list_url, {'created_after': (timezone.localdate() - timedelta(days=7)).isoformat()})
+        self.assertEqual(list(response.context['send_requests']), [self.request3])
+        response = self.client.get(self.request_send_list_url, {'created_before': timezone.localdate().isoformat()})
+        self.assertEqual(list(response.context['send_requests']), [self.request1])
+
+    # invalid filter shows error and no requests
+    def test_invalid_filter(self):
+        self.client.login(username='Johny', password='test123123')
+        response = self.client.get(self.request_send_list_url, {'status': 'lost'})
+        self.assertEqual(list(response.context['send_requests']), [])
+        self.assertTrue(response.context['filter_form'].errors)
+        self.assertContains(response, 'No requests match the filters.')
+
+
+class ProfileIdentityVariantImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.profile_identity_variant_import_url = reverse('profile-identity-variant-import')
+        self.profile_identity_variant_list_url = reverse('profile-identity-variant-list')
+
+    # valid file creates every variant and redirects to the list, that shows them
+    def test_user_can_import_identity_variants(self):
+        self.client.login(username='Johny', password='test123123')
+        # list cached before the import
+        self.client.get(self.profile_identity_variant_list_url)
+        file = SimpleUploadedFile('variants.ndjson', b'{"label": "Email", "variant": "john@example.com"}\n{"label": "Handle", "context": "Forum", "variant": "@johny"}\n')
+        response = self.client.post(self.profile_identity_variant_import_url, {'file': file}, follow=True)
+        self.assertRedirects(response, self.profile_identity_variant_list_url)
+        self.assertContains(response, '2 identity variants imported.')
+        self.assertEqual([variant['variant'] for variant in response.context['profile_identity_variants']], ['john@example.com', '@johny'])
+
+    # invalid rows are listed by line and nothing is imported
+    def test_invalid_rows_are_shown(self):
+        self.client.login(username='Johny', password='test123123')
+        file = SimpleUploadedFile('variants.csv', b'label,context,variant\nEmail,,john@example.com\nPhone,,\n')
+        response = self.client.post(self.profile_identity_variant_import_url, {'file': file})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['row_errors'], [{'row': 3, 'errors': {'variant': ['This field may not be blank.']}}])
+        self.assertContains(response, 'Nothing was imported, 1 row of the file is not valid.')
+        self.assertFalse(ProfileIdentityVariant.objects.filter(user=self.user).exists())
+
+    # file that can not be read is a form error
+    def test_unknown_format_is_form_error(self):
+        self.client.login(username='Johny', password='test123123')
+        response = self.client.post(self.profile_identity_variant_import_url, {'file': SimpleUploadedFile('variants.xlsx', b'label')})
+        self.assertEqual(response.context['form'].errors['file'], ['Upload a .csv, .ndjson, .jsonl file.'])
+        response = self.client.post(self.profile_identity_variant_import_url, {'file': SimpleUploadedFile('variants.csv', b'name\nEmail\n')})
+        self.assertEqual(response.context['form'].errors['file'], ['CSV header is missing columns: label, variant.'])
+
+    # stranger is sent to login page
+    def test_stranger_cannot_import_identity_variants(self):
+        response = self.client.post(self.profile_identity_variant_import_url, {'file': SimpleUploadedFile('variants.csv', b'label,variant\nEmail,a\n')})
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(ProfileIdentityVariant.objects.exists())
+
+
+class ProfileVariantSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user1 = User.objects.create_user(username='Johny', email='johny@example.com', password='test123123')
+        self.user2 = User.objects.create_user(username='Michael', email='michael@example.com', password='test123123')
+        self.phone = ProfileIdentityVariant.objects.create(user=self.user2, label='Phone', variant='123 456 789')
+        self.last_name = ProfileIdentityVariant.objects.create(user=self.user2, label='Last Name', variant='Smith')
+        self.first_name = ProfileIdentityVariant.objects.create(user=self.user2, label='First Name', variant='Michael')
+        self.request1 = Request.objects.create(sender=self.user1, receiver=self.user2, request_reasoning='Dental office information', status=Request.Status.ACCEPTED)
+        self.request_identity_variant1 = RequestIdentityVariant.objects.create(request=self.request1, label='Firstname')
+        self.request_identity_variant_update_url = reverse('request-receive-request-identity-variant-update', args=[self.request1.pk, self.request_identity_variant1.pk])
+
+    # matching variants are offered first with their score, best one is selected
+    def test_update_form_offers_suggestions_first(self):
+        self.client.login(username='Michael', password='test123123')
+        response = self.client.get(self.request_identity_variant_update_url)
+        field = response.context['form'].fields['profile_link']
+        self.assertEqual(list(field.queryset), [self.first_name, self.last_name, self.phone])
+        self.assertEqual(field.label_from_instance(self.first_name), 'Michael / First Name / Michael (80% match)')
+        self.assertEqual(field.label_from_instance(self.phone), 'Michael / Phone / 123 456 789')
+        self.assertEqual(response.context['form'].initial['profile_link'], self.first_name.pk)
+        self.assertContains(response, '(80% match)')
+
+    # linked variant stays selected, suggestions are only ordered first
+    def test_linked_variant_stays_selected(self):
+        self.request_identity_variant1.profile_link = self.phone
+        self.request_identity_variant1.save()
+        self.client.login(username='Michael', password='test123123')
+        response = self.client.get(self.request_identity_variant_update_url)
+        self.assertEqual(response.context['form'].initial['profile_link'], self.phone.pk)
+        # suggested variant can be linked
+        response = self.client.post(self.request_identity_variant_update_url, {'profile_link': self.first_name.pk})
+        self.assertEqual(response.status_code, 302)
+        self.request_identity_variant1.refresh_from_db()
+        self.assertEqual(self.request_identity_variant1.profile_link, self.first_name)
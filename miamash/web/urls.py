@@ -15,6 +15,8 @@ urlpatterns = [
     path('profile/identity-variant/', ProfileIdentityVariantListView.as_view(), name='profile-identity-variant-list'),
     # add new variant
     path('profile/identity-variant/add/', ProfileIdentityVariantCreateView.as_view(), name='profile-identity-variant-create'),
+    # add many variants from CSV / NDJSON file
+    path('profile/identity-variant/import/', ProfileIdentityVariantImportView.as_view(), name='profile-identity-variant-import'),
     # # detail view of a variant
     path('profile/identity-variant/<int:pk>/', ProfileIdentityVariantDetailView.as_view(), name='profile-identity-variant-detail'),
     # # edit profile identity variant     
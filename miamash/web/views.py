@@ -1,10 +1,20 @@
 from core.models import *
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.views.generic import TemplateView, ListView, CreateView, DetailView, UpdateView, DeleteView
+from django.views.generic import TemplateView, ListView, CreateView, DetailView, UpdateView, DeleteView, FormView
+from django.contrib import messages
 from django.shortcuts import redirect
 from .forms import *
 from django.urls import reverse_lazy
+from django.utils import timezone
+from django.db import transaction
 from .permissions import * 
+from core.counters import get_user_counters
+from core.profile_variant_cache import get_or_set_profile_variant_data
+from core.request_filters import filter_requests
+from core.profile_variant_import import ImportFileError, import_profile_identity_variants
+from core.profile_variant_suggestions import get_profile_variant_index
+# same row validation as API import
+from api.serializers import validate_profile_identity_variant_rows
 
 
 # Home view 
@@ -27,6 +37,27 @@ class AccountView(LoginRequiredMixin,TemplateView):
     """
     template_name = 'account/account.html'
 
+# Request list filters
+class RequestListFilterMixin:
+    """
+    Filters request list with RequestListFilterForm from query string, counterparty is the other user of the request.
+    Invalid filters are shown on the form and the list is empty.
+    """
+    counterparty = None
+
+    def get_queryset(self):
+        queryset = super().get_queryset() # type: ignore
+        self.filter_form = RequestListFilterForm(self.request.GET or None, counterparty=self.counterparty) # type: ignore
+        if self.filter_form.is_bound:
+            if not self.filter_form.is_valid():
+                return queryset.none()
+            queryset = filter_requests(queryset, **self.filter_form.get_filters())
+        return queryset
+
+    def get_context_data(self, **kwargs):
+        kwargs['filter_form'] = self.filter_form
+        return super().get_context_data(**kwargs) # type: ignore
+
 # Dashboard view
 class DashboardView(LoginRequiredMixin, TemplateView):
     """
@@ -35,6 +66,12 @@ class DashboardView(LoginRequiredMixin, TemplateView):
     """
     template_name = 'private/dashboard.html'
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # denormalised counters, from cache or one query however many requests user has
+        context['counters'] = get_user_counters(self.request.user.id)
+        return context
+
 # Profile Identity variants views, list, create, detail, update, delete
 class ProfileIdentityVariantListView(ProfileIdentityVariantOwnerPermissionMixin, ListView):
     """
@@ -44,6 +81,11 @@ class ProfileIdentityVariantListView(ProfileIdentityVariantOwnerPermissionMixin,
     template_name = 'private/profile_identity_variant_list.html'
     context_object_name = 'profile_identity_variants'
 
+    def get_context_data(self, **kwargs):
+        # list of the user is cached until one of their variants is created, updated or deleted
+        kwargs['object_list'] = get_or_set_profile_variant_data(self.request.user.id, ('web-list',), lambda: list(self.object_list.order_by('id').values('id', 'label', 'context', 'variant'))) # type: ignore
+        return super().get_context_data(**kwargs)
+
 
 class ProfileIdentityVariantCreateView(ProfileIdentityVariantOwnerPermissionMixin, CreateView):
     """ 
@@ -62,6 +104,28 @@ class ProfileIdentityVariantCreateView(ProfileIdentityVariantOwnerPermissionMixi
         return super().form_valid(form)
 
 
+class ProfileIdentityVariantImportView(ProfileIdentityVariantOwnerPermissionMixin, FormView):
+    """
+    View renders HTML page with the form to upload CSV or NDJSON file of profile identity variants.
+    When every row is valid, all variants are created and user is redirected to the list view,
+    otherwise nothing is created and the page shows errors of the rows.
+    """
+    form_class = ProfileIdentityVariantImportForm
+    template_name = 'private/profile_identity_variant_import.html'
+    success_url = reverse_lazy('profile-identity-variant-list')
+
+    def form_valid(self, form):
+        try:
+            created, error_count, errors = import_profile_identity_variants(self.request.user, form.cleaned_data['file'], validate_profile_identity_variant_rows)
+        except ImportFileError as error:
+            form.add_error('file', str(error))
+            return self.form_invalid(form)
+        if error_count:
+            return self.render_to_response(self.get_context_data(form=form, error_count=error_count, row_errors=errors))
+        messages.success(self.request, f'{created} identity variants imported.')
+        return super().form_valid(form)
+
+
 class ProfileIdentityVariantDetailView(ProfileIdentityVariantOwnerPermissionMixin, DetailView):
     """
     View gets ProfileIdentityVariant pk from the URL, then queries the database filtering by 
@@ -98,13 +162,14 @@ class ProfileIdentityVariantDeleteView(ProfileIdentityVariantOwnerPermissionMixi
 
 
 # request send 
-class RequestSendListView(RequestSenderPermissionMixin, ListView):
+class RequestSendListView(RequestListFilterMixin, RequestSenderPermissionMixin, ListView):
     """
     View fetches Request objects from database where sever side user logged in credential
     match the sender field of the Request object. Then renders HTML page with that list. 
     """
     template_name = 'private/request_send_list.html'
     context_object_name = 'send_requests'
+    counterparty = 'receiver'
 
 class RequestSendCreateView(RequestSenderPermissionMixin, CreateView):
     """
@@ -136,14 +201,18 @@ class RequestSendDetailView(RequestSenderPermissionMixin, DetailView):
     template_name = 'private/request_send_detail.html'
     context_object_name = 'send_request'
 
+    def get_queryset(self):
+        # receiver is shown in the header, join it so it is not a separate query
+        return super().get_queryset().select_related('receiver')
+
     def get_context_data(self, **kwargs):
         """
         Override get_context_data to add RequestIdentityVariant objects
         """
         context = super().get_context_data(**kwargs) 
-        requestObject = self.get_object() # Request as model, not django request object 
-        # add to context, pylance does not know that passed object is Request, that has request_identity_variants, so type: ignore
-        context['request_identity_variants'] = requestObject.request_identity_variants.all() # type: ignore
+        # DetailView already fetched the Request in get(), reuse self.object instead of calling get_object() again
+        # join profile_link so cards showing shared variant do not run a query per variant
+        context['request_identity_variants'] = self.object.request_identity_variants.select_related('profile_link') # type: ignore
         return context
 
 class RequestSendUpdateView(RequestSenderPermissionMixin, UpdateView):
@@ -219,13 +288,14 @@ class RequestSendRequestIdentityVariantDeleteView(RequestSenderRequestIdentityVa
 
 # request receive
 
-class RequestReceiveListView(RequestReceiverPermissionMixin, ListView):
+class RequestReceiveListView(RequestListFilterMixin, RequestReceiverPermissionMixin, ListView):
     """
     View fetches Request objects from database where server side user logged in credential
     match the receiver field of the Request object. Then renders HTML page with that list. 
     """
     template_name = 'private/request_receive_list.html'
     context_object_name = 'received_requests'
+    counterparty = 'sender'
 
 class RequestReceiveDetailView(RequestReceiverPermissionMixin, DetailView):
     """
@@ -237,14 +307,18 @@ class RequestReceiveDetailView(RequestReceiverPermissionMixin, DetailView):
     template_name = 'private/request_receive_detail.html'
     context_object_name = 'receive_request'
 
+    def get_queryset(self):
+        # sender is shown in the header, join it so it is not a separate query
+        return super().get_queryset().select_related('sender')
+
     def get_context_data(self, **kwargs):
         """
         Override get_context_data to add RequestIdentityVariant objects
         """
         context = super().get_context_data(**kwargs) 
-        requestObject = self.get_object() # Request as model, not django request object 
-        # add to context, pylance does not know that passed object is Request, that has request_identity_variants, so type: ignore
-        context['request_identity_variants'] = requestObject.request_identity_variants.all() # type: ignore
+        # DetailView already fetched the Request in get(), reuse self.object instead of calling get_object() again
+        # join profile_link so cards showing shared variant do not run a query per variant
+        context['request_identity_variants'] = self.object.request_identity_variants.select_related('profile_link') # type: ignore
         return context
 
 class RequestReceiveRequestIdentityVariantDetailView(RequestReceiverRequestIdentityVariantPermissionMixin, DetailView):
@@ -264,6 +338,13 @@ class RequestReceiveRequestIdentityVariantUpdateView(RequestReceiverRequestIdent
     form_class = RequestReceiveRequestIdentityVariantForm
     template_name = 'private/request_receive_request_identity_variant_update.html'
 
+    def get_form_kwargs(self):
+        # form offers and accepts only logged in user's profile identity variants, the ones matching label and context first
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        kwargs['suggestions'] = get_profile_variant_index(self.request.user.id).suggest(self.object.label, self.object.context)
+        return kwargs
+
     def get_success_url(self):
         return reverse_lazy('request-receive-detail', kwargs={'pk': self.request_receive.pk})
     
@@ -273,9 +354,11 @@ class RequestReceiveAcceptView(RequestReceiverPermissionMixin, View):
     After that it redirects to the RequestReceiveDetailView.
     """
     def post(self, request, *args, **kwargs):
-        request_receive_object = self.get_secured_request()  
-        request_receive_object.status = 'accepted'  # type: ignore
-        request_receive_object.save()  # type: ignore
+        # status is read locked, so counters of concurrent accept / deny calls do not drift
+        with transaction.atomic():
+            request_receive_object = self.get_secured_request(for_update=True)
+            request_receive_object.status = 'accepted'  # type: ignore
+            request_receive_object.save()  # type: ignore
         return redirect('request-receive-detail', pk=request_receive_object.pk)
 
 class RequestReceiveDenyView(RequestReceiverPermissionMixin, View):
@@ -284,11 +367,14 @@ class RequestReceiveDenyView(RequestReceiverPermissionMixin, View):
     After that it redirects to the RequestReceiveDetailView.
     """
     def post(self, request, *args, **kwargs):
-        request_receive_object = self.get_secured_request()  
-        # wipe the links 
-        RequestIdentityVariant.objects.filter(request=request_receive_object).update(profile_link=None)
-        request_receive_object.status = 'denied'  # type: ignore
-        request_receive_object.save()  # type: ignore
+        # status is read locked, so counters of concurrent accept / deny calls do not drift
+        with transaction.atomic():
+            request_receive_object = self.get_secured_request(for_update=True)
+            # wipe the links 
+            # update() skips auto_now, so set updated_at explicitly
+            RequestIdentityVariant.objects.filter(request=request_receive_object).update(profile_link=None, updated_at=timezone.now())
+            request_receive_object.status = 'denied'  # type: ignore
+            request_receive_object.save()  # type: ignore
         return redirect('request-receive-detail', pk=request_receive_object.pk)  # type: ignore
 
 